@@ -0,0 +1,143 @@
+"""
+Diferenças entre coletas sucessivas de cada switch e eventos de mudança.
+
+O `FleetTracker` guarda o último estado conhecido por switch (FDB e tabela
+de portas) e, a cada coleta, calcula o delta: MACs que apareceram, mudaram
+de porta ou sumiram, e portas cujo estado operacional/administrativo mudou.
+Os eventos são publicados no `bus`, onde outros componentes podem se
+inscrever:
+
+    from app.changes import bus
+    bus.subscribe(lambda ev: print(ev), kinds={'mac_moved'})
+"""
+import logging
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from .mac import MAC
+
+logger = logging.getLogger(__name__)
+
+MAC_APPEARED = 'mac_appeared'
+MAC_MOVED = 'mac_moved'
+MAC_DISAPPEARED = 'mac_disappeared'
+PORT_OPER = 'port_oper'
+PORT_ADMIN = 'port_admin'
+
+
+@dataclass
+class ChangeEvent:
+    kind: str
+    id_switch: str
+    port: Optional[int] = None
+    mac: str = ''
+    old: object = None
+    new: object = None
+    timestamp: float = field(default_factory=time.time)
+
+
+@dataclass
+class SwitchState:
+    fdb: Dict[MAC, int] = field(default_factory=dict)
+    ports: Dict[int, Tuple[object, object]] = field(default_factory=dict)
+
+    @classmethod
+    def from_poll(cls, result) -> 'SwitchState':
+        """Estado a partir de um `poller.SwitchPollResult`."""
+        fdb = {}
+        for port, macs in (result.macs_by_port or {}).items():
+            for mac in macs:
+                mac = MAC.parse(mac)
+                if mac is not None:
+                    fdb[mac] = port
+        ports = {s.get('port'): (s.get('operational'), s.get('administrative')) for s in result.statuses}
+        return cls(fdb=fdb, ports=ports)
+
+
+def diff_switch(id_switch: str, prev: SwitchState, curr: SwitchState) -> List[ChangeEvent]:
+    """Eventos que levam de `prev` a `curr`."""
+    events = []
+    for mac, port in curr.fdb.items():
+        old = prev.fdb.get(mac)
+        if old is None:
+            events.append(ChangeEvent(MAC_APPEARED, id_switch, port, str(mac), None, port))
+        elif old != port:
+            events.append(ChangeEvent(MAC_MOVED, id_switch, port, str(mac), old, port))
+    for mac, port in prev.fdb.items():
+        if mac not in curr.fdb:
+            events.append(ChangeEvent(MAC_DISAPPEARED, id_switch, port, str(mac), port, None))
+    for port, (oper, admin) in curr.ports.items():
+        old_oper, old_admin = prev.ports.get(port, (None, None))
+        if oper != old_oper:
+            events.append(ChangeEvent(PORT_OPER, id_switch, port, '', old_oper, oper))
+        if admin != old_admin:
+            events.append(ChangeEvent(PORT_ADMIN, id_switch, port, '', old_admin, admin))
+    return events
+
+
+class FleetTracker:
+    """Último estado conhecido de cada switch."""
+
+    def __init__(self):
+        self._states: Dict[str, SwitchState] = {}
+        self._lock = threading.Lock()
+
+    def has_baseline(self, id_switch: str) -> bool:
+        return str(id_switch) in self._states
+
+    def update(self, results: Iterable) -> List[ChangeEvent]:
+        """Incorpora uma rodada de coleta e retorna o delta. Switches que
+        falharam mantêm o estado anterior (sem eventos de desaparecimento)."""
+        events = []
+        with self._lock:
+            for res in results:
+                if not res.ok:
+                    continue
+                key = str(res.id_switch)
+                curr = SwitchState.from_poll(res)
+                prev = self._states.get(key)
+                events.extend(diff_switch(key, prev or SwitchState(), curr))
+                self._states[key] = curr
+        return events
+
+    def forget(self, id_switch: str) -> None:
+        with self._lock:
+            self._states.pop(str(id_switch), None)
+
+
+class EventBus:
+    """Publicação/assinatura de `ChangeEvent` no processo."""
+
+    def __init__(self):
+        self._subs: List[Tuple[Callable[[ChangeEvent], None], Optional[Set[str]]]] = []
+        self._lock = threading.Lock()
+
+    def subscribe(self, callback: Callable[[ChangeEvent], None], kinds: Optional[Iterable[str]] = None) -> Callable[[], None]:
+        """Inscreve `callback` (opcionalmente só para alguns tipos).
+        Retorna uma função que cancela a inscrição."""
+        entry = (callback, set(kinds) if kinds else None)
+        with self._lock:
+            self._subs.append(entry)
+
+        def unsubscribe():
+            with self._lock:
+                if entry in self._subs:
+                    self._subs.remove(entry)
+        return unsubscribe
+
+    def publish(self, events: Iterable[ChangeEvent]) -> None:
+        with self._lock:
+            subs = list(self._subs)
+        for ev in events:
+            for callback, kinds in subs:
+                if kinds is not None and ev.kind not in kinds:
+                    continue
+                try:
+                    callback(ev)
+                except Exception:
+                    logger.exception("Falha em assinante de eventos (%s)", ev.kind)
+
+
+bus = EventBus()
@@ -0,0 +1,164 @@
+"""
+Cache de descoberta por switch: dados que praticamente só mudam quando o
+switch reinicia.
+
+- dot1dBasePortIfIndex: porta da bridge (a numeração da FDB e de
+  `status_portas`) -> ifIndex (o índice usado em ifOperStatus/ifAdminStatus);
+- lista de ifIndex, ifPhysAddress e MAC da bridge; número de portas.
+
+As entradas ficam em memória e em um JSON (`config.DISCOVERY_CACHE_FILE`),
+de modo que um processo recém-iniciado não repete esses walks. Cada entrada
+guarda o instante estimado do boot do switch (relógio local menos
+sysUpTime); quando um sysUpTime lido depois indica outro boot, a entrada é
+descartada e o switch é redescoberto.
+"""
+import json
+import os
+import threading
+from dataclasses import asdict, dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+import config
+from . import storage
+
+# diferença (s) entre instantes de boot estimados a partir da qual se
+# considera que o switch reiniciou (absorve atraso da rede e ajustes de relógio)
+BOOT_TOLERANCE = 60.0
+
+
+@dataclass
+class SwitchDiscovery:
+    host: str
+    boot_time: Optional[float] = None
+    discovered_at: float = 0.0
+    bridge_mac: str = ""
+    base_port_ifindex: Dict[int, int] = field(default_factory=dict)
+    if_indexes: List[int] = field(default_factory=list)
+    if_phys: Dict[int, str] = field(default_factory=dict)
+
+    def __post_init__(self):
+        self._port_of = {ifindex: port for port, ifindex in self.base_port_ifindex.items()}
+
+    @property
+    def port_count(self) -> int:
+        return len(self.base_port_ifindex) or len(self.if_indexes)
+
+    def ifindex(self, port: int) -> int:
+        """ifIndex da porta da bridge `port` (a própria porta se o agente
+        não publica dot1dBasePortIfIndex)."""
+        return self.base_port_ifindex.get(int(port), int(port))
+
+    def port_for_ifindex(self, ifindex: int) -> Optional[int]:
+        """Porta da bridge de um ifIndex; None para interfaces que não são
+        portas da bridge (VLANs, CPU, agregados...)."""
+        if not self.base_port_ifindex:
+            return ifindex
+        return self._port_of.get(ifindex)
+
+    def to_dict(self) -> dict:
+        d = asdict(self)
+        # JSON só tem chaves texto
+        d['base_port_ifindex'] = {str(k): v for k, v in self.base_port_ifindex.items()}
+        d['if_phys'] = {str(k): v for k, v in self.if_phys.items()}
+        return d
+
+    @classmethod
+    def from_dict(cls, d: dict) -> 'SwitchDiscovery':
+        return cls(host=d['host'], boot_time=d.get('boot_time'), discovered_at=d.get('discovered_at', 0.0),
+                   bridge_mac=d.get('bridge_mac', ''),
+                   base_port_ifindex={int(k): int(v) for k, v in (d.get('base_port_ifindex') or {}).items()},
+                   if_indexes=[int(i) for i in d.get('if_indexes') or []],
+                   if_phys={int(k): v for k, v in (d.get('if_phys') or {}).items()})
+
+
+def boot_time(uptime_ticks, read_at: float) -> Optional[float]:
+    """Instante (epoch) do boot a partir de sysUpTime (centésimos de s)
+    lido em `read_at`; None se o valor não for numérico."""
+    try:
+        return read_at - int(uptime_ticks) / 100.0
+    except (TypeError, ValueError):
+        return None
+
+
+class DiscoveryCache:
+    """Entradas por host, carregadas do disco na primeira consulta e relidas
+    quando o arquivo muda (mesmo (mtime, tamanho) de `storage._cached`): o
+    receptor de traps usa as entradas gravadas pelo coletor e pela API."""
+
+    def __init__(self, path: Optional[str] = None):
+        self._path = path
+        self._entries: Optional[Dict[str, SwitchDiscovery]] = None
+        self._stamp: Optional[tuple] = None
+        self._lock = threading.Lock()
+
+    @property
+    def path(self) -> str:
+        return self._path or getattr(config, 'DISCOVERY_CACHE_FILE', None) or \
+            os.path.join(storage.BASE_DIR, 'discovery_cache.json')
+
+    def _read(self) -> Tuple[Dict[str, SwitchDiscovery], tuple]:
+        # carimbo tomado antes da leitura: uma gravação no meio força nova leitura
+        stamp = storage._stamp(self.path)
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                raw = json.load(f)
+        except (FileNotFoundError, ValueError):
+            return {}, stamp
+        entries = {}
+        for host, d in raw.items():
+            try:
+                entries[host] = SwitchDiscovery.from_dict(d)
+            except (KeyError, TypeError, ValueError):
+                continue
+        return entries, stamp
+
+    def lookup(self, host: str, boot: Optional[float] = None) -> Optional[SwitchDiscovery]:
+        """Entrada de `host`, ou None se não houver ou se `boot` (instante
+        do boot observado agora) mostrar que o switch reiniciou."""
+        with self._lock:
+            if self._entries is None or storage._stamp(self.path) != self._stamp:
+                self._entries, self._stamp = self._read()
+            entry = self._entries.get(host)
+            if entry is None:
+                return None
+            if boot is not None and entry.boot_time is not None and abs(boot - entry.boot_time) > BOOT_TOLERANCE:
+                del self._entries[host]
+                return None
+            return entry
+
+    def store(self, entry: SwitchDiscovery) -> None:
+        """Guarda a entrada e regrava o arquivo (mesclando com o que outros
+        processos tenham gravado)."""
+        with self._lock:
+            entries, stamp = self._read()
+            entries[entry.host] = entry
+            self._entries, self._stamp = entries, stamp
+            path = self.path
+            tmp = f"{path}.{os.getpid()}.tmp"
+            try:
+                with open(tmp, 'w', encoding='utf-8') as f:
+                    json.dump({h: e.to_dict() for h, e in entries.items()}, f)
+                os.replace(tmp, path)
+                self._stamp = storage._stamp(path)
+            except OSError:
+                pass
+
+    def invalidate(self, host: Optional[str] = None) -> None:
+        """Descarta as entradas em memória (pedidas para `host` ou para
+        todos); a próxima consulta relê o disco."""
+        with self._lock:
+            self._entries = None
+            self._stamp = None
+
+
+_cache: Optional[DiscoveryCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_cache() -> DiscoveryCache:
+    """Cache de descoberta compartilhado pelo processo."""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = DiscoveryCache()
+        return _cache
@@ -0,0 +1,76 @@
+"""
+Tabela de encaminhamento (dot1dTpFdbTable) em formato colunar.
+
+Em uplinks a FDB tem dezenas de milhares de entradas; em vez de um dict por
+entrada, `FdbTable` guarda dois `array` paralelos (MAC como inteiro de 48
+bits e porta da bridge) e oferece visões por iteração e agrupadas por porta.
+
+    table = FdbTable.from_varbinds(sess.bulkwalk(FDB_PORT_OID))
+    for mac, port in table: ...
+    table.by_port()    # {porta: [MAC, ...]}
+"""
+from array import array
+from collections import Counter
+from typing import Dict, Iterable, Iterator, List, Tuple
+
+from .mac import MAC
+
+FDB_PORT_OID = '.1.3.6.1.2.1.17.4.3.1.2'    # dot1dTpFdbPort.<mac em 6 octetos decimais>
+
+
+class FdbTable:
+    __slots__ = ('macs', 'ports')
+
+    def __init__(self):
+        self.macs = array('Q')      # MAC como inteiro
+        self.ports = array('H')     # dot1dBasePort (1..65535)
+
+    @classmethod
+    def from_varbinds(cls, varbinds: Iterable, base: str = FDB_PORT_OID) -> 'FdbTable':
+        """Decodifica as variáveis de um walk de `base` à medida que chegam.
+        Entradas com índice ou porta inválidos são ignoradas."""
+        table = cls()
+        add_mac = table.macs.append
+        add_port = table.ports.append
+        prefix = base + '.'
+        cut = len(prefix)
+        for v in varbinds:
+            oid = v.oid or ''
+            suffix = oid[cut:] if oid.startswith(prefix) else (v.oid_index or '')
+            try:
+                # bytes() recusa octetos fora de 0..255
+                octets = bytes(map(int, suffix.split('.')))
+                port = int(v.value)
+            except (TypeError, ValueError):
+                continue
+            if len(octets) != 6 or not 0 <= port <= 0xFFFF:
+                continue
+            add_mac(int.from_bytes(octets, 'big'))
+            add_port(port)
+        return table
+
+    def __len__(self) -> int:
+        return len(self.macs)
+
+    def __iter__(self) -> Iterator[Tuple[MAC, int]]:
+        return zip(map(MAC, self.macs), self.ports)
+
+    def as_dict(self) -> Dict[MAC, int]:
+        return dict(self)
+
+    def by_port(self) -> Dict[int, List[MAC]]:
+        """Porta -> MACs aprendidas nela, na ordem do walk."""
+        groups: Dict[int, List[MAC]] = {}
+        for mac, port in zip(self.macs, self.ports):
+            group = groups.get(port)
+            if group is None:
+                groups[port] = group = []
+            group.append(MAC(mac))
+        return groups
+
+    def port_counts(self) -> Dict[int, int]:
+        """Porta -> número de MACs aprendidas (sem materializar os MACs)."""
+        return dict(Counter(self.ports))
+
+    def macs_on(self, port: int) -> List[MAC]:
+        return [MAC(m) for m, p in zip(self.macs, self.ports) if p == port]
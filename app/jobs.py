@@ -0,0 +1,184 @@
+"""
+Execução assíncrona das operações SNMP demoradas pedidas pela API.
+
+Um job é dividido em partes por switch e `submit` o devolve na hora (a API
+responde 202 com o id). As partes rodam num pool limitado
+(`config.JOBS_MAX_WORKERS`) e, para cada switch, uma de cada vez e na ordem
+de chegada: um switch lento ou inacessível ocupa no máximo uma thread, e
+as demais continuam atendendo os outros switches. Quando todas as partes
+terminam, a função de conclusão do job consolida os resultados (ex.: grava
+as conexões numa única alteração).
+
+Os jobs ficam em memória do processo por `config.JOBS_RETENTION` segundos
+depois de terminados (`GET /jobs/<id>`).
+"""
+import logging
+import threading
+import time
+import uuid
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Deque, Dict, Optional, Tuple
+
+import config
+
+logger = logging.getLogger(__name__)
+
+PENDING = "pendente"
+RUNNING = "executando"
+DONE = "concluido"
+FAILED = "falhou"
+
+
+class JobQueueFull(RuntimeError):
+    pass
+
+
+class Job:
+    def __init__(self, kind: str, parts: Dict[str, Callable[[], object]], finish: Callable[[Dict[str, object]], object]):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.status = PENDING
+        self.created = time.time()
+        self.started: Optional[float] = None
+        self.finished: Optional[float] = None
+        self.result = None
+        self.error: Optional[str] = None
+        self.parts = parts
+        self._finish = finish
+        self._results: Dict[str, object] = {}
+        self._lock = threading.Lock()
+        self._done = threading.Event()
+
+    def _part_started(self) -> None:
+        with self._lock:
+            if self.status == PENDING:
+                self.status = RUNNING
+                self.started = time.time()
+
+    def _part_done(self, id_switch: str, result) -> None:
+        with self._lock:
+            self._results[id_switch] = result
+            last = len(self._results) == len(self.parts)
+        if last:
+            self._complete()
+
+    def _complete(self) -> None:
+        try:
+            self.result = self._finish(dict(self._results))
+            self.status = DONE
+        except Exception as e:
+            logger.exception("Falha ao concluir job %s (%s)", self.id, self.kind)
+            self.error = str(e)
+            self.status = FAILED
+        self.finished = time.time()
+        self._done.set()
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """Espera o job terminar; False se `timeout` expirar antes."""
+        return self._done.wait(timeout)
+
+    def as_dict(self) -> dict:
+        with self._lock:
+            done = len(self._results)
+        return {
+            "id": self.id,
+            "tipo": self.kind,
+            "status": self.status,
+            "criado": self.created,
+            "iniciado": self.started,
+            "concluido": self.finished,
+            "switches": list(self.parts),
+            "progresso": f"{done}/{len(self.parts)}",
+            "resultado": self.result,
+            "erro": self.error,
+        }
+
+
+class JobRunner:
+    """Pool limitado com uma fila por switch."""
+
+    def __init__(self, max_workers: Optional[int] = None, max_pending: Optional[int] = None,
+                 retention: Optional[float] = None):
+        self.max_pending = max_pending or getattr(config, 'JOBS_MAX_PENDING', 1000)
+        self.retention = retention if retention is not None else getattr(config, 'JOBS_RETENTION', 3600)
+        self._executor = ThreadPoolExecutor(max_workers=max_workers or getattr(config, 'JOBS_MAX_WORKERS', 16),
+                                            thread_name_prefix="job")
+        self._jobs: Dict[str, Job] = {}
+        # partes por switch; a primeira da fila é a que está rodando
+        self._queues: Dict[str, Deque[Tuple[Job, Callable[[], object]]]] = {}
+        self._pending = 0
+        self._lock = threading.Lock()
+
+    def submit(self, kind: str, parts: Dict[str, Callable[[], object]],
+               finish: Callable[[Dict[str, object]], object]) -> Job:
+        """Enfileira um job com uma parte por switch (`parts`: id_switch ->
+        função). `finish` recebe id_switch -> resultado (ou a exceção) e
+        produz o resultado do job."""
+        job = Job(kind, dict(parts), finish)
+        start = []
+        with self._lock:
+            self._prune()
+            if self._pending + len(job.parts) > self.max_pending:
+                raise JobQueueFull("fila de jobs cheia")
+            self._jobs[job.id] = job
+            for id_switch, fn in job.parts.items():
+                queue = self._queues.setdefault(id_switch, deque())
+                queue.append((job, fn))
+                self._pending += 1
+                if len(queue) == 1:
+                    start.append(id_switch)
+        if not job.parts:
+            job._complete()
+        for id_switch in start:
+            self._executor.submit(self._run, id_switch)
+        return job
+
+    def _run(self, id_switch: str) -> None:
+        with self._lock:
+            job, fn = self._queues[id_switch][0]
+        job._part_started()
+        try:
+            result = fn()
+        except Exception as e:
+            logger.exception("Falha no job %s, switch %s", job.id, id_switch)
+            result = e
+        job._part_done(id_switch, result)
+        with self._lock:
+            queue = self._queues[id_switch]
+            queue.popleft()
+            self._pending -= 1
+            more = bool(queue)
+            if not more:
+                del self._queues[id_switch]
+        if more:
+            self._executor.submit(self._run, id_switch)
+
+    def _prune(self) -> None:
+        limit = time.time() - self.retention
+        for job_id in [j.id for j in self._jobs.values() if j.finished is not None and j.finished < limit]:
+            del self._jobs[job_id]
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+
+_runner: Optional[JobRunner] = None
+_runner_lock = threading.Lock()
+
+
+def get_runner() -> JobRunner:
+    global _runner
+    with _runner_lock:
+        if _runner is None:
+            _runner = JobRunner()
+        return _runner
+
+
+def submit(kind: str, parts: Dict[str, Callable[[], object]], finish: Callable[[Dict[str, object]], object]) -> Job:
+    return get_runner().submit(kind, parts, finish)
+
+
+def get(job_id: str) -> Optional[Job]:
+    return get_runner().get(job_id)
@@ -0,0 +1,128 @@
+"""
+Endereço MAC como inteiro de 48 bits.
+
+`MAC` é um `int` (hash e comparação baratos, pouca memória em FDBs grandes)
+que se formata como "AA:BB:CC:DD:EE:FF". A conversão de/para texto aceita
+os formatos que aparecem nos CSVs e nos switches — "aa:bb:...", "0:11:..."
+(octetos sem zero à esquerda), "aa-bb-...", "aabb.ccdd.eeff", "aabbccddeeff"
+e o sufixo decimal de OID da FDB ("170.187.204.221.238.255") — e é
+memorizada, já que os mesmos MACs se repetem a cada coleta.
+"""
+from functools import lru_cache
+from typing import Dict, Iterable, Optional, Union
+
+_HEX = set('0123456789abcdefABCDEF')
+
+
+class MAC(int):
+    __slots__ = ()
+
+    def __new__(cls, value: int):
+        if not 0 <= value < 1 << 48:
+            raise ValueError(f"MAC fora do intervalo: {value}")
+        return super().__new__(cls, value)
+
+    @classmethod
+    def parse(cls, value) -> Optional['MAC']:
+        """MAC a partir de texto, inteiro ou 6 octetos; None se inválido."""
+        if value is None:
+            return None
+        if isinstance(value, MAC):
+            return value
+        if isinstance(value, int):
+            return cls(value) if 0 <= value < 1 << 48 else None
+        if isinstance(value, (bytes, bytearray)):
+            return cls.from_octets(value)
+        n = _parse_text(str(value))
+        return cls(n) if n is not None else None
+
+    @classmethod
+    def from_octets(cls, raw: Union[bytes, bytearray, str]) -> Optional['MAC']:
+        """Valor OCTET STRING do easysnmp (bytes ou str latin-1 com 6 caracteres)."""
+        if isinstance(raw, str):
+            if len(raw) != 6 or any(ord(c) > 0xFF for c in raw):
+                return None
+            raw = raw.encode('latin-1')
+        if len(raw) != 6:
+            return None
+        return cls(int.from_bytes(raw, 'big'))
+
+    @classmethod
+    def from_oid_suffix(cls, suffix: str) -> Optional['MAC']:
+        """Índice de dot1dTpFdbTable: seis octetos decimais separados por ponto."""
+        n = _parse_oid_suffix(str(suffix).strip('.'))
+        return cls(n) if n is not None else None
+
+    def __str__(self) -> str:
+        return _format(int(self))
+
+    def __repr__(self) -> str:
+        return f"MAC('{_format(int(self))}')"
+
+    @property
+    def octets(self) -> bytes:
+        return int(self).to_bytes(6, 'big')
+
+    @property
+    def dashed(self) -> str:
+        return _format(int(self)).replace(':', '-')
+
+    @property
+    def oid_suffix(self) -> str:
+        return '.'.join(str(b) for b in self.octets)
+
+
+@lru_cache(maxsize=65536)
+def _format(value: int) -> str:
+    return ':'.join(f'{b:02X}' for b in value.to_bytes(6, 'big'))
+
+
+@lru_cache(maxsize=65536)
+def _parse_oid_suffix(suffix: str) -> Optional[int]:
+    parts = suffix.split('.')
+    if len(parts) != 6:
+        return None
+    n = 0
+    for p in parts:
+        if not p.isdigit() or int(p) > 0xFF:
+            return None
+        n = (n << 8) | int(p)
+    return n
+
+
+@lru_cache(maxsize=65536)
+def _parse_text(text: str) -> Optional[int]:
+    text = text.strip()
+    for sep in (':', '-'):
+        if sep in text:
+            parts = text.split(sep)
+            if len(parts) != 6 or not all(1 <= len(p) <= 2 and set(p) <= _HEX for p in parts):
+                return None
+            return int(''.join(p.zfill(2) for p in parts), 16)
+    if '.' in text:
+        parts = text.split('.')
+        if len(parts) == 3 and all(len(p) == 4 and set(p) <= _HEX for p in parts):
+            return int(''.join(parts), 16)
+        return _parse_oid_suffix(text)
+    if len(text) == 12 and set(text) <= _HEX:
+        return int(text, 16)
+    return None
+
+
+def normalize(value) -> str:
+    """Forma canônica "AA:BB:CC:DD:EE:FF"; valores que não são MAC voltam
+    apenas sem espaços e em maiúsculas."""
+    mac = MAC.parse(value)
+    if mac is not None:
+        return str(mac)
+    return str(value or '').strip().upper()
+
+
+def index(rows: Iterable[dict], field: str = 'mac') -> Dict[MAC, dict]:
+    """Índice MAC -> linha (linhas sem MAC válido ficam de fora)."""
+    out = {}
+    for r in rows:
+        mac = MAC.parse(r.get(field))
+        if mac is not None:
+            out[mac] = r
+    return out
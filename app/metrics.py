@@ -0,0 +1,308 @@
+"""
+Métricas no formato texto do Prometheus, sem dependências externas.
+
+Contadores e histogramas com rótulos ficam em um `Registry` por processo.
+As operações SNMP (por switch), o armazenamento (por entidade) e o ciclo de
+sincronização são instrumentados nos próprios módulos; a rota `/metrics` da
+API devolve `render_all()`.
+
+Como coletor, agendador e API rodam em processos separados, cada processo
+pode gravar um instantâneo (`export`) em `config.METRICS_DIR`; a rota junta
+os instantâneos dos outros processos aos números locais, com o rótulo
+`process`.
+"""
+import json
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import config
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# nome do processo usado no rótulo `process` e no arquivo exportado
+PROCESS = os.path.splitext(os.path.basename(sys.argv[0] or 'python'))[0] or 'python'
+
+
+class _Metric:
+    def __init__(self, name: str, kind: str, help: str, labels: Tuple[str, ...], buckets=None):
+        self.name = name
+        self.kind = kind
+        self.help = help
+        self.labels = labels
+        self.buckets = tuple(buckets) if buckets else None
+        # rótulos -> valor (contador) ou [contagens por bucket, soma, total] (histograma)
+        self.series: Dict[Tuple[str, ...], object] = {}
+
+    def key(self, labels: Dict[str, object]) -> Tuple[str, ...]:
+        return tuple(str(labels.get(l, '')) for l in self.labels)
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def counter(self, name: str, help: str, labels: Iterable[str] = ()) -> _Metric:
+        return self._register(name, 'counter', help, tuple(labels))
+
+    def gauge(self, name: str, help: str, labels: Iterable[str] = ()) -> _Metric:
+        return self._register(name, 'gauge', help, tuple(labels))
+
+    def histogram(self, name: str, help: str, labels: Iterable[str] = (), buckets=DEFAULT_BUCKETS) -> _Metric:
+        return self._register(name, 'histogram', help, tuple(labels), buckets)
+
+    def _register(self, name, kind, help, labels, buckets=None) -> _Metric:
+        with self._lock:
+            m = self._metrics.get(name)
+            if m is None:
+                m = self._metrics[name] = _Metric(name, kind, help, labels, buckets)
+            return m
+
+    def inc(self, metric: _Metric, amount: float = 1, **labels) -> None:
+        key = metric.key(labels)
+        with self._lock:
+            metric.series[key] = metric.series.get(key, 0) + amount
+
+    def set(self, metric: _Metric, value: float, **labels) -> None:
+        with self._lock:
+            metric.series[metric.key(labels)] = value
+
+    def observe(self, metric: _Metric, value: float, **labels) -> None:
+        key = metric.key(labels)
+        with self._lock:
+            h = metric.series.get(key)
+            if h is None:
+                h = metric.series[key] = [[0] * len(metric.buckets), 0.0, 0]
+            for i, bound in enumerate(metric.buckets):
+                if value <= bound:
+                    h[0][i] += 1
+            h[1] += value
+            h[2] += 1
+
+    def total(self, metric: _Metric) -> float:
+        """Soma de todas as séries (contagem de observações, em histogramas)."""
+        with self._lock:
+            if metric.kind == 'histogram':
+                return sum(h[2] for h in metric.series.values())
+            return sum(metric.series.values())
+
+    def snapshot(self) -> dict:
+        """Cópia serializável em JSON."""
+        with self._lock:
+            return {
+                m.name: {'kind': m.kind, 'help': m.help, 'labels': list(m.labels),
+                         'buckets': list(m.buckets) if m.buckets else None,
+                         'series': [[list(k), v] for k, v in m.series.items()]}
+                for m in self._metrics.values()
+            }
+
+    @classmethod
+    def from_snapshot(cls, data: dict) -> 'Registry':
+        reg = cls()
+        for name, d in data.items():
+            m = reg._register(name, d['kind'], d['help'], tuple(d['labels']), d.get('buckets'))
+            m.series = {tuple(k): v for k, v in d['series']}
+        return reg
+
+
+REGISTRY = Registry()
+
+snmp_request_seconds = REGISTRY.histogram(
+    'ogmr_snmp_request_seconds', 'Duração das requisições SNMP (get/walk/bulkwalk/set)', ('switch', 'method'))
+snmp_operation_seconds = REGISTRY.histogram(
+    'ogmr_snmp_operation_seconds', 'Duração das operações do SNMPManager', ('switch', 'operation'))
+snmp_errors = REGISTRY.counter(
+    'ogmr_snmp_errors_total', 'Requisições SNMP com falha', ('switch', 'method', 'kind'))
+snmp_retries = REGISTRY.counter(
+    'ogmr_snmp_retries_total', 'Repetições feitas pela aplicação (SET porta a porta, walk sem GETBULK)', ('switch', 'reason'))
+snmp_bytes = REGISTRY.counter(
+    'ogmr_snmp_response_bytes_total', 'Tamanho estimado (OIDs + valores) das respostas SNMP', ('switch',))
+snmp_varbinds = REGISTRY.counter(
+    'ogmr_snmp_varbinds_total', 'Varbinds recebidos/enviados', ('switch', 'method'))
+storage_seconds = REGISTRY.histogram(
+    'ogmr_storage_seconds', 'Duração das operações de armazenamento', ('entity', 'operation'))
+storage_rows_read = REGISTRY.counter(
+    'ogmr_storage_rows_read_total', 'Linhas devolvidas pelo armazenamento', ('entity',))
+storage_rows_written = REGISTRY.counter(
+    'ogmr_storage_rows_written_total', 'Linhas gravadas pelo armazenamento', ('entity',))
+storage_bytes_read = REGISTRY.counter(
+    'ogmr_storage_bytes_read_total', 'Bytes lidos do disco (recarga do cache)', ('entity',))
+sync_cycle_seconds = REGISTRY.histogram(
+    'ogmr_sync_cycle_seconds', 'Duração do ciclo de sincronização', (),
+    buckets=(0.5, 1, 2.5, 5, 10, 30, 60, 120, 300))
+sync_events = REGISTRY.counter('ogmr_sync_events_total', 'Eventos de mudança detectados', ())
+sync_errors = REGISTRY.counter('ogmr_sync_errors_total', 'Erros nos ciclos de sincronização', ())
+sync_last_cycle = REGISTRY.gauge('ogmr_sync_last_cycle_timestamp_seconds', 'Horário do último ciclo concluído', ())
+
+
+def _is_timeout(exc: BaseException) -> bool:
+    return 'timeout' in type(exc).__name__.lower() or 'timed out' in str(exc).lower()
+
+
+def _response_size(result) -> Tuple[int, int]:
+    """(bytes estimados, varbinds) de um retorno do easysnmp."""
+    items = result if isinstance(result, list) else [result]
+    size = 0
+    n = 0
+    for v in items:
+        if hasattr(v, 'value'):
+            size += len(str(getattr(v, 'oid', '') or '')) + len(str(getattr(v, 'oid_index', '') or '')) + len(str(v.value))
+            n += 1
+    return size, n
+
+
+def record_snmp_call(host: str, method: str, fn, *args, **kwargs):
+    """Executa uma chamada da sessão easysnmp medindo duração, falhas e volume."""
+    inicio = time.perf_counter()
+    try:
+        result = fn(*args, **kwargs)
+    except Exception as e:
+        REGISTRY.observe(snmp_request_seconds, time.perf_counter() - inicio, switch=host, method=method)
+        REGISTRY.inc(snmp_errors, switch=host, method=method, kind='timeout' if _is_timeout(e) else 'error')
+        raise
+    REGISTRY.observe(snmp_request_seconds, time.perf_counter() - inicio, switch=host, method=method)
+    if method in ('set', 'set_multiple'):
+        n = len(args[0]) if method == 'set_multiple' and args else 1
+        REGISTRY.inc(snmp_varbinds, n, switch=host, method=method)
+    else:
+        size, n = _response_size(result)
+        REGISTRY.inc(snmp_bytes, size, switch=host)
+        REGISTRY.inc(snmp_varbinds, n, switch=host, method=method)
+    return result
+
+
+def snmp_operation(fn):
+    """Decorador dos métodos do SNMPManager: histograma por switch/operação."""
+    @wraps(fn)
+    def wrapper(self, *args, **kwargs):
+        inicio = time.perf_counter()
+        try:
+            return fn(self, *args, **kwargs)
+        finally:
+            REGISTRY.observe(snmp_operation_seconds, time.perf_counter() - inicio,
+                             switch=getattr(self, 'host', ''), operation=fn.__name__)
+    return wrapper
+
+
+_storage_depth = threading.local()
+
+
+def storage_operation(fn):
+    """Decorador das funções públicas de `app.storage`. Só a chamada mais
+    externa é observada: as internas (`save_all` -> `apply_changes` ->
+    `load_all`) já estão no tempo dela."""
+    @wraps(fn)
+    def wrapper(entity, *args, **kwargs):
+        depth = getattr(_storage_depth, 'value', 0)
+        if depth:
+            _storage_depth.value = depth + 1
+            try:
+                return fn(entity, *args, **kwargs)
+            finally:
+                _storage_depth.value = depth
+        _storage_depth.value = 1
+        inicio = time.perf_counter()
+        try:
+            return fn(entity, *args, **kwargs)
+        finally:
+            _storage_depth.value = 0
+            REGISTRY.observe(storage_seconds, time.perf_counter() - inicio, entity=entity, operation=fn.__name__)
+    return wrapper
+
+
+@contextmanager
+def timer(metric: _Metric, **labels):
+    inicio = time.perf_counter()
+    try:
+        yield
+    finally:
+        REGISTRY.observe(metric, time.perf_counter() - inicio, **labels)
+
+
+# --- exposição --------------------------------------------------------------
+
+def _fmt_labels(names, values, extra: Dict[str, str]) -> str:
+    pairs = list(zip(names, values)) + list(extra.items())
+    if not pairs:
+        return ''
+    body = ','.join('{}="{}"'.format(k, str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+                    for k, v in pairs)
+    return '{' + body + '}'
+
+
+def _fmt_value(v: float) -> str:
+    return repr(float(v)) if isinstance(v, float) else str(v)
+
+
+def render_all(registries: Optional[List[Tuple[Registry, Dict[str, str]]]] = None) -> str:
+    """Texto no formato de exposição do Prometheus. Cada registro recebe os
+    rótulos extras indicados (ex.: `process`)."""
+    if registries is None:
+        registries = [(REGISTRY, {'process': PROCESS})] + _exported_registries()
+    families: Dict[str, List[Tuple[_Metric, Dict[str, str]]]] = {}
+    snapshots = [(Registry.from_snapshot(reg.snapshot()), extra) for reg, extra in registries]
+    for reg, extra in snapshots:
+        for m in reg._metrics.values():
+            families.setdefault(m.name, []).append((m, extra))
+
+    lines = []
+    for name in sorted(families):
+        first = families[name][0][0]
+        lines.append(f"# HELP {name} {first.help}")
+        lines.append(f"# TYPE {name} {first.kind}")
+        for m, extra in families[name]:
+            for key, value in sorted(m.series.items()):
+                if m.kind != 'histogram':
+                    lines.append(f"{name}{_fmt_labels(m.labels, key, extra)} {_fmt_value(value)}")
+                    continue
+                counts, total, n = value
+                for bound, count in zip(m.buckets, counts):
+                    lines.append(f"{name}_bucket{_fmt_labels(m.labels + ('le',), key + (repr(float(bound)),), extra)} {count}")
+                lines.append(f"{name}_bucket{_fmt_labels(m.labels + ('le',), key + ('+Inf',), extra)} {n}")
+                lines.append(f"{name}_sum{_fmt_labels(m.labels, key, extra)} {_fmt_value(float(total))}")
+                lines.append(f"{name}_count{_fmt_labels(m.labels, key, extra)} {n}")
+    return '\n'.join(lines) + '\n'
+
+
+def _metrics_dir() -> str:
+    return getattr(config, 'METRICS_DIR', None) or getattr(config, 'CSV_DATA_DIR', '.')
+
+
+def export(process: Optional[str] = None) -> None:
+    """Grava o instantâneo deste processo para a rota `/metrics` de outro."""
+    process = process or PROCESS
+    path = os.path.join(_metrics_dir(), f"metrics_{process}.json")
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump({'timestamp': time.time(), 'metrics': REGISTRY.snapshot()}, f)
+    os.replace(tmp, path)
+
+
+def _exported_registries() -> List[Tuple[Registry, Dict[str, str]]]:
+    out = []
+    directory = _metrics_dir()
+    oldest = time.time() - getattr(config, 'METRICS_MAX_AGE', 300)
+    try:
+        names = sorted(os.listdir(directory))
+    except OSError:
+        return out
+    for name in names:
+        if not (name.startswith('metrics_') and name.endswith('.json')):
+            continue
+        process = name[len('metrics_'):-len('.json')]
+        if process == PROCESS:
+            continue
+        try:
+            with open(os.path.join(directory, name), encoding='utf-8') as f:
+                data = json.load(f)
+            if data.get('timestamp', 0) < oldest:
+                continue
+            out.append((Registry.from_snapshot(data['metrics']), {'process': process}))
+        except (OSError, ValueError, KeyError):
+            continue
+    return out
@@ -0,0 +1,248 @@
+"""
+Coleta concorrente do estado dos switches.
+
+Cada switch é consultado em uma thread própria (pool limitado por
+`config.POLL_MAX_WORKERS`), de modo que uma atualização completa leva
+aproximadamente o tempo do switch mais lento e não a soma de todos.
+Os resultados são devolvidos por switch, com latência e erros, para que o
+chamador grave tudo em `status_portas` de uma só vez.
+
+Antes dos walks, um GET de marcadores (sysUpTime, ifTableLastChange e
+contadores da FDB) indica se as tabelas do switch mudaram. O `PollGate`
+guarda a coleta anterior de cada switch e só repete os walks quando os
+marcadores mudaram; a cada `config.POLL_FULL_EVERY` ciclos a coleta é
+completa, para limitar o atraso de mudanças que os marcadores não mostram
+(ex.: ifOperStatus de uma porta). Switches com SET (ou trap) desde a última
+coleta, em qualquer processo, são sempre coletados por completo
+(`snmp.mark_ports_changed`).
+"""
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional, TypeVar
+
+import config
+from .mac import MAC, index as mac_index
+from .snmp import manager_for_switch, ports_changed
+
+T = TypeVar('T')
+
+
+@dataclass
+class SwitchPollResult:
+    id_switch: str
+    ip: str
+    statuses: List[dict] = field(default_factory=list)
+    macs_by_port: Dict[int, List[MAC]] = field(default_factory=dict)
+    bridge_mac: str = ""
+    latency: float = 0.0
+    errors: List[str] = field(default_factory=list)
+    markers: Dict[str, Optional[str]] = field(default_factory=dict)
+    reused: bool = False
+
+    @property
+    def ok(self) -> bool:
+        return not self.errors
+
+
+PORT_MARKERS = ('if_table_last_change',)
+FDB_MARKERS = ('fdb_discards', 'fdb_count')
+
+
+def _ticks(value) -> Optional[int]:
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _unchanged(prev: dict, curr: dict, names) -> bool:
+    """Verdadeiro se algum dos marcadores existe e nenhum deles mudou."""
+    pairs = [(prev.get(n), curr.get(n)) for n in names if curr.get(n) is not None]
+    return bool(pairs) and all(old == new for old, new in pairs)
+
+
+def poll_switch(sw: dict, previous: Optional[SwitchPollResult] = None) -> SwitchPollResult:
+    """Consulta um switch (status das portas, FDB e MAC da bridge).
+
+    Com `previous` (coleta anterior bem-sucedida), os walks de portas e de FDB
+    só são refeitos se os marcadores de mudança indicarem alteração.
+    Nunca levanta exceção: falhas ficam registradas em `errors`."""
+    ip = sw.get('ip')
+    id_switch = sw.get('id_switch')
+    result = SwitchPollResult(id_switch=id_switch, ip=ip)
+    inicio = time.monotonic()
+    try:
+        snmp = manager_for_switch(sw)
+    except Exception as e:
+        result.errors.append(f"Falha conectar switch {id_switch} ({ip}): {e}")
+        result.latency = time.monotonic() - inicio
+        return result
+
+    try:
+        result.markers = snmp.get_change_markers()
+    except Exception:
+        result.markers = {}
+
+    skip_ports = skip_fdb = False
+    if previous is not None and previous.ok and result.markers:
+        old_up = _ticks(previous.markers.get('sys_uptime'))
+        new_up = _ticks(result.markers.get('sys_uptime'))
+        # sysUpTime voltou: o switch reiniciou e os marcadores recomeçaram
+        if old_up is not None and new_up is not None and new_up >= old_up:
+            skip_ports = _unchanged(previous.markers, result.markers, PORT_MARKERS)
+            skip_fdb = _unchanged(previous.markers, result.markers, FDB_MARKERS)
+
+    if skip_ports:
+        result.statuses = previous.statuses
+    else:
+        try:
+            result.statuses = snmp.fetch_port_status(0)
+        except Exception as e:
+            result.errors.append(f"Falha ao obter status portas {id_switch} ({ip}): {e}")
+
+    if skip_fdb:
+        result.macs_by_port = previous.macs_by_port
+    else:
+        try:
+            result.macs_by_port = snmp.get_macs_by_port() or {}
+        except Exception:
+            result.macs_by_port = {}
+
+    # vem do cache de descoberta (sem PDU, exceto após um reboot)
+    try:
+        result.bridge_mac = snmp.get_bridge_mac() or ""
+    except Exception:
+        result.bridge_mac = ""
+
+    result.reused = skip_ports and skip_fdb
+    result.latency = time.monotonic() - inicio
+    return result
+
+
+def map_switches(fn: Callable[[dict], T], switches: List[dict], max_workers: Optional[int] = None) -> List[T]:
+    """Aplica `fn` a cada switch em paralelo (pool limitado) e devolve os
+    resultados na mesma ordem da lista de entrada."""
+    if not switches:
+        return []
+    if max_workers is None:
+        max_workers = getattr(config, 'POLL_MAX_WORKERS', 32)
+    max_workers = max(1, min(int(max_workers), len(switches)))
+
+    results: List[Optional[T]] = [None] * len(switches)
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="poll") as pool:
+        futures = {pool.submit(fn, sw): i for i, sw in enumerate(switches)}
+        for fut in as_completed(futures):
+            results[futures[fut]] = fut.result()
+    return results
+
+
+def poll_switches(switches: List[dict], max_workers: Optional[int] = None) -> List[SwitchPollResult]:
+    """Consulta todos os switches em paralelo."""
+    return map_switches(poll_switch, switches, max_workers)
+
+
+class PollGate:
+    """Guarda a última coleta bem-sucedida de cada switch e a passa para
+    `poll_switch`, que decide pelos marcadores se repete os walks."""
+
+    def __init__(self, full_every: Optional[int] = None):
+        if full_every is None:
+            full_every = getattr(config, 'POLL_FULL_EVERY', 10)
+        self.full_every = max(1, int(full_every))
+        self._last: Dict[str, SwitchPollResult] = {}
+        # instante (epoch) em que começou a coleta guardada em _last
+        self._polled_at: Dict[str, float] = {}
+        self._cycle = 0
+        self._lock = threading.Lock()
+
+    def poll(self, switches: List[dict], max_workers: Optional[int] = None) -> List[SwitchPollResult]:
+        marks = ports_changed()
+        started = time.time()
+        with self._lock:
+            full = self._cycle % self.full_every == 0
+            self._cycle += 1
+            # coletas anteriores a um SET/trap no switch não são reaproveitadas
+            last = {} if full else {i: res for i, res in self._last.items()
+                                    if marks.get(res.ip, 0.0) < self._polled_at.get(i, 0.0)}
+
+        results = map_switches(lambda sw: poll_switch(sw, last.get(str(sw.get('id_switch')))),
+                               switches, max_workers)
+        with self._lock:
+            for res in results:
+                if res.ok:
+                    self._last[str(res.id_switch)] = res
+                    self._polled_at[str(res.id_switch)] = started
+        return results
+
+    def invalidate(self, id_switch: Optional[str] = None) -> None:
+        """Força a coleta completa de um switch (ou de todos) no próximo ciclo
+        deste processo (para os demais, `snmp.mark_ports_changed`)."""
+        with self._lock:
+            if id_switch is None:
+                self._last.clear()
+            else:
+                self._last.pop(str(id_switch), None)
+
+
+def summarize(results: List[SwitchPollResult]) -> dict:
+    """Resumo de uma rodada de coleta: total, falhas e latências."""
+    latencies = [r.latency for r in results]
+    return {
+        'switches': len(results),
+        'falhas': sum(1 for r in results if not r.ok),
+        'reaproveitados': sum(1 for r in results if r.reused),
+        'latencia_max': max(latencies) if latencies else 0.0,
+        'latencia_soma': sum(latencies),
+        'por_switch': [
+            {'id_switch': r.id_switch, 'ip': r.ip, 'latencia': round(r.latency, 3), 'erros': len(r.errors)}
+            for r in results
+        ],
+    }
+
+
+def build_status_rows(results: List[SwitchPollResult], maquinas: List[dict], conexoes: List[dict]) -> List[dict]:
+    """Monta as linhas de `status_portas` a partir dos resultados da coleta.
+
+    Só entram portas com uma MAC conhecida aprendida ou com conexão prévia
+    registrada em `maquinas_conectadas_switch`."""
+    mac_to_machine = mac_index(maquinas)
+    machine_mac = {str(m.get('id_maquina')): MAC.parse(m.get('mac')) for m in maquinas}
+    conex_map = {f"{c.get('id_switch')}|{c.get('porta')}": c for c in conexoes}
+
+    rows = []
+    for res in results:
+        for s in res.statuses:
+            port = s.get('port')
+            learned = res.macs_by_port.get(port) or res.macs_by_port.get(str(port)) or []
+            learned_norm = [m for m in (MAC.parse(x) for x in learned) if m is not None]
+
+            # procurar por macs conhecidas entre as aprendidas
+            matched_mac = None
+            for lm in learned_norm:
+                if lm in mac_to_machine:
+                    matched_mac = lm
+                    break
+
+            # se não há mac conhecida aprendida, usar a máquina da conexão prévia
+            prior_mac = None
+            prior_conn = conex_map.get(f"{res.id_switch}|{port}")
+            if prior_conn:
+                prior_mac = machine_mac.get(str(prior_conn.get('id_maquina')))
+
+            chosen_mac = matched_mac if matched_mac is not None else prior_mac
+            if chosen_mac is None:
+                # pular portas que não correspondem a máquinas conhecidas
+                continue
+
+            rows.append({
+                "id_switch": res.id_switch,
+                "switch_ip": res.ip,
+                "port": port,
+                "operational": s.get('operational'),
+                "administrative": s.get('administrative'),
+                "mac": str(chosen_mac),
+                "bridge_mac": res.bridge_mac,
+            })
+    return rows
@@ -0,0 +1,161 @@
+"""
+Alteração de estado de portas em lote, compartilhada pela API
+(`POST /portas/batch`, `POST /porta`) e pelo agendador.
+
+As operações (switch, porta, estado) são agrupadas por switch — se a mesma
+porta aparece mais de uma vez, vale a última —, os switches são atendidos
+em paralelo com SETs de vários varbinds por PDU e o status das conexões
+afetadas (`maquinas_conectadas_switch`) é gravado numa única alteração.
+`submit_operations` faz o mesmo em um job assíncrono (`app.jobs`).
+"""
+import logging
+from dataclasses import dataclass
+from functools import partial
+from typing import Dict, List, Optional
+
+from . import jobs, storage
+from .poller import map_switches
+from .snmp import PortState, manager_for_switch
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class PortOperation:
+    id_switch: str
+    port: int
+    state: PortState
+    id_maquina: str = ""
+
+
+def parse_state(value) -> PortState:
+    """1 habilita; 0 ou 2 desabilita (mesma convenção de `POST /porta`)."""
+    try:
+        n = int(value)
+    except (TypeError, ValueError):
+        raise ValueError("status inválido")
+    if n == PortState.ENABLED.value:
+        return PortState.ENABLED
+    if n in (0, PortState.DISABLED.value):
+        return PortState.DISABLED
+    raise ValueError("status inválido")
+
+
+def parse_operation(item) -> PortOperation:
+    """Operação a partir de {"id_switch", "porta", "status"[, "id_maquina"]}."""
+    if not isinstance(item, dict):
+        raise ValueError("operação inválida")
+    if item.get("id_switch") in (None, ""):
+        raise ValueError("id_switch ausente")
+    try:
+        port = int(item.get("porta"))
+    except (TypeError, ValueError):
+        raise ValueError("porta inválida")
+    if port < 1:
+        raise ValueError("porta inválida")
+    return PortOperation(str(item["id_switch"]), port, parse_state(item.get("status")),
+                         str(item.get("id_maquina") or ""))
+
+
+def set_switch_ports(id_switch: str, states: Dict[int, PortState]) -> Dict[int, bool]:
+    """SET em lote das portas de um switch. Retorna {porta: sucesso}."""
+    sw = storage.get_by_key('switches', id_switch)
+    if not sw:
+        logger.error("Switch %s não encontrado", id_switch)
+        return {p: False for p in states}
+    try:
+        results = manager_for_switch(sw).set_port_states(states)
+    except Exception as e:
+        logger.error("Falha no switch %s (%s): %s", id_switch, sw.get('ip'), e)
+        return {p: False for p in states}
+    failed = [p for p, ok in results.items() if not ok]
+    if failed:
+        logger.warning("Switch %s (%s): falha nas portas %s", id_switch, sw.get('ip'), failed)
+    else:
+        logger.info("Switch %s (%s): %d portas alteradas", id_switch, sw.get('ip'), len(results))
+    return results
+
+
+def execute_plan(plan: Dict[str, Dict[int, PortState]], max_workers: Optional[int] = None) -> Dict[str, Dict[int, bool]]:
+    """Uma operação em lote por switch (switches em paralelo).
+    Retorna id_switch -> {porta: sucesso}."""
+    ids = list(plan)
+    return dict(zip(ids, map_switches(lambda i: set_switch_ports(i, plan[i]), ids, max_workers)))
+
+
+def _connection_changes(ops: List[PortOperation], results: Dict[str, Dict[int, bool]]) -> List[dict]:
+    """Conexões cujo status muda com as operações bem-sucedidas."""
+    changed: Dict[tuple, dict] = {}
+    for op in ops:
+        if not results.get(op.id_switch, {}).get(op.port):
+            continue
+        status = "True" if op.state == PortState.ENABLED else "False"
+        if op.id_maquina:
+            row = storage.get_by_key('maquinas_conectadas_switch', (op.id_maquina, op.id_switch))
+            rows = [row] if row is not None else []
+        else:
+            rows = storage.find_by('maquinas_conectadas_switch', id_switch=op.id_switch, porta=str(op.port))
+        for r in rows:
+            key = (str(r.get('id_maquina')), str(r.get('id_switch')))
+            r = changed.get(key, r)
+            if r.get('status') != status:
+                r['status'] = status
+                changed[key] = r
+    return list(changed.values())
+
+
+class OperationBatch:
+    """Operações validadas e agrupadas: `plan` (id_switch -> {porta: estado})
+    é executado por `execute_plan` (ou em partes, por `submit_operations`) e
+    `finish` grava as conexões e monta o resultado de cada operação."""
+
+    def __init__(self, ops: List[PortOperation]):
+        self.ops = list(ops)
+        self.known = {i: storage.get_by_key('switches', i) is not None for i in {op.id_switch for op in self.ops}}
+        # última operação de cada porta (a ordem dos dicts preserva a chegada)
+        self.final: Dict[tuple, PortOperation] = {}
+        for op in self.ops:
+            if self.known[op.id_switch]:
+                self.final[(op.id_switch, op.port)] = op
+        self.plan: Dict[str, Dict[int, PortState]] = {}
+        for op in self.final.values():
+            self.plan.setdefault(op.id_switch, {})[op.port] = op.state
+
+    def finish(self, results: Dict[str, Dict[int, bool]]) -> List[dict]:
+        changes = _connection_changes(list(self.final.values()), results)
+        if changes:
+            storage.apply_changes('maquinas_conectadas_switch', changes)
+        out = []
+        for op in self.ops:
+            r = {"id_switch": op.id_switch, "porta": op.port, "status": op.state.value}
+            if not self.known[op.id_switch]:
+                r.update(sucesso=False, erro="switch não encontrado")
+            elif self.final[(op.id_switch, op.port)] is not op:
+                r.update(sucesso=False, erro="substituída por operação posterior na mesma porta")
+            else:
+                r["sucesso"] = bool(results.get(op.id_switch, {}).get(op.port))
+            out.append(r)
+        return out
+
+
+def apply_operations(ops: List[PortOperation], max_workers: Optional[int] = None) -> List[dict]:
+    """Executa as operações e grava o status das conexões afetadas.
+    Retorna um resultado por operação, na ordem recebida."""
+    batch = OperationBatch(ops)
+    return batch.finish(execute_plan(batch.plan, max_workers) if batch.plan else {})
+
+
+def submit_operations(ops: List[PortOperation], extra: Optional[dict] = None) -> jobs.Job:
+    """Como `apply_operations`, mas em um job assíncrono (uma parte por switch).
+    `extra` é acrescentado ao resultado do job."""
+    batch = OperationBatch(ops)
+    parts = {i: partial(set_switch_ports, i, states) for i, states in batch.plan.items()}
+
+    def finish(results: Dict[str, object]) -> dict:
+        # parte que levantou exceção: todas as portas do switch falharam
+        results = {i: r if isinstance(r, dict) else {} for i, r in results.items()}
+        resultados = batch.finish(results)
+        ok = sum(1 for r in resultados if r["sucesso"])
+        return dict(extra or {}, resultados=resultados, sucesso=ok, falhas=len(resultados) - ok)
+
+    return jobs.submit("portas", parts, finish)
@@ -0,0 +1,188 @@
+"""
+Perfil por fases (opcional) da interface e do pipeline de sincronização.
+
+Ativado por `config.PROFILE` ou pela variável de ambiente `OGMR_PROFILE`
+(`1`/`0`, tem precedência). Desativado, todas as funções são no-ops.
+
+    with profiling.session("streamlit") as prof:
+        ...
+        profiling.lap("sidebar")        # tempo desde a marca anterior
+        with profiling.phase("abas"):   # bloco medido (aninhável)
+            ...
+
+Funções decoradas com `@profiled()` viram fases quando chamadas dentro de
+uma sessão. A sessão também conta chamadas ao armazenamento (só as de fora:
+`save_all` conta uma vez, não também o `apply_changes` interno) e requisições
+SNMP (diferença dos totais de `app.metrics`; inclui outras threads do
+processo). Ao final, o resumo vai para um log rotativo
+(`config.PROFILE_LOG`) e fica disponível em `last()`.
+"""
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+from logging.handlers import RotatingFileHandler
+from typing import List, Optional
+
+import config
+from . import metrics
+
+logger = logging.getLogger('ogmr.profile')
+
+_local = threading.local()
+_last: Optional[dict] = None
+_handler_lock = threading.Lock()
+_handler_ready = False
+
+
+def enabled() -> bool:
+    env = os.environ.get('OGMR_PROFILE')
+    if env is not None:
+        return env.strip().lower() in ('1', 'true', 'yes', 'on')
+    return bool(getattr(config, 'PROFILE', False))
+
+
+def _counts() -> tuple:
+    return (metrics.REGISTRY.total(metrics.storage_seconds),
+            metrics.REGISTRY.total(metrics.snmp_request_seconds))
+
+
+class Profile:
+    def __init__(self, name: str):
+        self.name = name
+        self.phases: List[dict] = []
+        self.started = time.perf_counter()
+        self.total = 0.0
+        self.storage_calls = 0
+        self.snmp_requests = 0
+        self._base = _counts()
+        # pilha de fases abertas: [registro da fase, início, última marca]
+        self._stack = [[None, self.started, self.started]]
+
+    def _record(self, name: str, seconds: float) -> dict:
+        entry = {'fase': name, 'segundos': round(seconds, 4), 'nivel': len(self._stack) - 1}
+        self.phases.append(entry)
+        return entry
+
+    def lap(self, name: str) -> None:
+        now = time.perf_counter()
+        frame = self._stack[-1]
+        self._record(name, now - frame[2])
+        frame[2] = now
+
+    def push(self, name: str) -> None:
+        now = time.perf_counter()
+        # registrada já na abertura, para as fases internas aparecerem depois dela
+        entry = self._record(name, 0.0)
+        self._stack.append([entry, now, now])
+
+    def pop(self) -> None:
+        entry, start, _ = self._stack.pop()
+        now = time.perf_counter()
+        entry['segundos'] = round(now - start, 4)
+        # o bloco conta como uma marca para o próximo lap do nível de cima
+        self._stack[-1][2] = now
+
+    def finish(self) -> None:
+        self.total = time.perf_counter() - self.started
+        storage, snmp = _counts()
+        self.storage_calls = storage - self._base[0]
+        self.snmp_requests = snmp - self._base[1]
+
+    def as_dict(self) -> dict:
+        return {
+            'nome': self.name,
+            'total': round(self.total, 4),
+            'chamadas_storage': self.storage_calls,
+            'requisicoes_snmp': self.snmp_requests,
+            'fases': list(self.phases),
+        }
+
+    def summary(self) -> str:
+        parts = [f"{'  ' * p['nivel']}{p['fase']}={p['segundos']:.3f}s" for p in self.phases]
+        return (f"{self.name}: {self.total:.3f}s, {self.storage_calls} chamadas storage, "
+                f"{self.snmp_requests} requisições SNMP | " + ' '.join(parts))
+
+
+def _current() -> Optional[Profile]:
+    return getattr(_local, 'profile', None)
+
+
+def _ensure_handler() -> None:
+    global _handler_ready
+    with _handler_lock:
+        if _handler_ready:
+            return
+        path = getattr(config, 'PROFILE_LOG', None)
+        if path:
+            os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+            handler = RotatingFileHandler(path, maxBytes=getattr(config, 'PROFILE_LOG_MAX_BYTES', 1_000_000),
+                                          backupCount=getattr(config, 'PROFILE_LOG_BACKUPS', 3), encoding='utf-8')
+            handler.setFormatter(logging.Formatter("%(asctime)s %(message)s"))
+            logger.addHandler(handler)
+            logger.setLevel(logging.INFO)
+        _handler_ready = True
+
+
+@contextmanager
+def session(name: str):
+    """Perfil de uma execução completa (rerun do Streamlit, ciclo do coletor).
+    Produz o `Profile`, ou None se o perfil estiver desativado."""
+    global _last
+    if not enabled() or _current() is not None:
+        yield None
+        return
+    prof = Profile(name)
+    _local.profile = prof
+    try:
+        yield prof
+    finally:
+        _local.profile = None
+        prof.finish()
+        _last = prof.as_dict()
+        try:
+            _ensure_handler()
+            logger.info(prof.summary())
+        except OSError:
+            pass
+
+
+@contextmanager
+def phase(name: str):
+    prof = _current()
+    if prof is None:
+        yield
+        return
+    prof.push(name)
+    try:
+        yield
+    finally:
+        prof.pop()
+
+
+def lap(name: str) -> None:
+    prof = _current()
+    if prof is not None:
+        prof.lap(name)
+
+
+def profiled(name: Optional[str] = None):
+    """Decorador: a chamada vira uma fase da sessão em andamento."""
+    def decorator(fn):
+        label = name or fn.__name__
+
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            if _current() is None:
+                return fn(*args, **kwargs)
+            with phase(label):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def last() -> Optional[dict]:
+    """Resumo da última sessão concluída neste processo."""
+    return _last
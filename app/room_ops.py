@@ -0,0 +1,86 @@
+"""
+Bloqueio/desbloqueio de salas inteiras (ou de um bloco de salas).
+
+Uma sala é resolvida em portas assim: máquinas da sala (`maquinas.id_sala`),
+exceto as do professor (`tipo_maquina` verdadeiro) -> conexões
+(`maquinas_conectadas_switch`) em switches ligados à sala
+(`ligacao_sala_switch`) -> porta, exceto a de uplink do switch. As portas
+resultantes são alteradas por `port_ops` (switches em paralelo, SETs em lote
+e uma única gravação das conexões).
+"""
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+from . import jobs, port_ops, storage
+from .port_ops import PortOperation
+from .snmp import PortState
+
+
+def is_teacher(machine: dict) -> bool:
+    return str(machine.get('tipo_maquina', '')).strip().lower() == 'true'
+
+
+@dataclass
+class RoomPlan:
+    salas: List[str]
+    operations: List[PortOperation] = field(default_factory=list)
+    # máquinas não alteradas e o motivo
+    skipped: List[dict] = field(default_factory=list)
+
+
+def rooms_in_block(bloco: str) -> List[str]:
+    return [str(s.get('id_sala')) for s in storage.find_by('salas', bloco=bloco)]
+
+
+def plan_rooms(salas: List[str], state: PortState) -> RoomPlan:
+    """Operações de porta que levam as salas `salas` ao estado `state`."""
+    plan = RoomPlan([str(s) for s in salas])
+    switches: Dict[str, Optional[dict]] = {}
+    seen = set()
+    for id_sala in plan.salas:
+        linked = {str(l.get('id_switch')) for l in storage.find_by('ligacao_sala_switch', id_sala=id_sala)}
+        for m in storage.find_by('maquinas', id_sala=id_sala):
+            id_maquina = str(m.get('id_maquina'))
+            if is_teacher(m):
+                plan.skipped.append({'id_maquina': id_maquina, 'motivo': 'professor'})
+                continue
+            conexoes = [c for c in storage.find_by('maquinas_conectadas_switch', id_maquina=id_maquina)
+                        if str(c.get('id_switch')) in linked and str(c.get('porta') or '').isdigit()]
+            if not conexoes:
+                plan.skipped.append({'id_maquina': id_maquina, 'motivo': 'sem conexão em switch da sala'})
+                continue
+            for c in conexoes:
+                id_switch = str(c.get('id_switch'))
+                if id_switch not in switches:
+                    switches[id_switch] = storage.get_by_key('switches', id_switch)
+                sw = switches[id_switch]
+                port = int(c['porta'])
+                if sw is not None and str(sw.get('porta_uplink') or '') == str(port):
+                    plan.skipped.append({'id_maquina': id_maquina, 'motivo': 'porta de uplink'})
+                    continue
+                if (id_switch, port) in seen:
+                    continue
+                seen.add((id_switch, port))
+                plan.operations.append(PortOperation(id_switch, port, state, id_maquina))
+    return plan
+
+
+def apply_rooms(salas: List[str], state: PortState, max_workers: Optional[int] = None) -> dict:
+    """Aplica `state` às salas e devolve o resumo (resultados por porta e
+    máquinas ignoradas)."""
+    plan = plan_rooms(salas, state)
+    resultados = port_ops.apply_operations(plan.operations, max_workers) if plan.operations else []
+    ok = sum(1 for r in resultados if r['sucesso'])
+    return {
+        'salas': plan.salas,
+        'resultados': resultados,
+        'ignoradas': plan.skipped,
+        'sucesso': ok,
+        'falhas': len(resultados) - ok,
+    }
+
+
+def submit_rooms(salas: List[str], state: PortState) -> jobs.Job:
+    """Como `apply_rooms`, mas em um job assíncrono (`app.jobs`)."""
+    plan = plan_rooms(salas, state)
+    return port_ops.submit_operations(plan.operations, {'salas': plan.salas, 'ignoradas': plan.skipped})
@@ -1,7 +1,15 @@
-from flask import Blueprint, request, jsonify
+import base64
+import binascii
+import hashlib
+import json
+import uuid
+from typing import Iterator
+from urllib.parse import urlencode
+
+import config
+from flask import Blueprint, Response, request, jsonify
 from .. import snmp as snmp_mod
-from .. import storage
-from ..snmp import SNMPManager
+from .. import jobs, metrics, port_ops, room_ops, storage, sync
 
 """
 Este módulo agora usa CSVs via `app.storage` em vez de SQLAlchemy.
@@ -10,10 +18,127 @@ As funções de storage oferecem load_all(entity), append(entity,data), save_all
 
 api = Blueprint("api", __name__)
 
+
+# --- listagens -------------------------------------------------------------
+#
+# GET /salas, /switches, /maquinas, /ligacoes e /agendamentos aceitam:
+#   ?<campo>=<valor>   filtros de igualdade (ex.: ?id_sala=3, ?mac=00:11:..)
+#   ?fields=a,b        só essas colunas
+#   ?limit=N           página de até N linhas, em ordem de chave; a próxima
+#   ?cursor=<token>    página vem no cabeçalho Link (rel="next") e em X-Next-Cursor
+# Sem limit/cursor a lista inteira é devolvida (em blocos, sem montar o JSON
+# todo em memória). O ETag depende da versão da entidade no armazenamento e
+# dos parâmetros; If-None-Match igual responde 304 sem corpo.
+
+LIST_PARAMS = ("fields", "limit", "cursor")
+
+
+class _BadRequest(ValueError):
+    pass
+
+
+def _order(value) -> tuple:
+    # IDs numéricos em ordem numérica; os demais em ordem de texto
+    s = "" if value is None else str(value)
+    return (0, int(s), "") if s.isdigit() else (1, 0, s)
+
+
+def _encode_cursor(values) -> str:
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode().rstrip("=")
+
+
+def _decode_cursor(token: str, size: int) -> tuple:
+    try:
+        values = json.loads(base64.urlsafe_b64decode(token + "=" * (-len(token) % 4)))
+    except (binascii.Error, ValueError):
+        raise _BadRequest("cursor inválido")
+    if not isinstance(values, list) or len(values) != size:
+        raise _BadRequest("cursor inválido")
+    return tuple(_order(v) for v in values)
+
+
+def _list_query(entity: str):
+    """Valida os parâmetros da listagem: (filtros, colunas, limite, cursor)."""
+    fields = storage.ENTITIES[entity]["fields"]
+    args = request.args
+    criteria = {}
+    for name in args:
+        if name in LIST_PARAMS:
+            continue
+        if name not in fields:
+            raise _BadRequest(f"filtro desconhecido: {name}")
+        criteria[name] = args.get(name)
+    columns = None
+    if args.get("fields"):
+        columns = [c.strip() for c in args["fields"].split(",") if c.strip()]
+        unknown = [c for c in columns if c not in fields]
+        if unknown:
+            raise _BadRequest(f"campos desconhecidos: {', '.join(unknown)}")
+    limit = None
+    if "limit" in args or "cursor" in args:
+        try:
+            limit = int(args.get("limit") or getattr(config, "API_PAGE_SIZE", 500))
+        except ValueError:
+            raise _BadRequest("limit inválido")
+        limit = max(1, min(limit, getattr(config, "API_MAX_PAGE_SIZE", 5000)))
+    cursor = None
+    if args.get("cursor"):
+        cursor = _decode_cursor(args["cursor"], len(storage.ENTITIES[entity]["key"]))
+    return criteria, columns, limit, cursor
+
+
+def _stream_json(rows, columns) -> Iterator[str]:
+    """Lista JSON gerada em blocos de `config.API_PAGE_SIZE` linhas."""
+    size = getattr(config, "API_PAGE_SIZE", 500)
+    yield "["
+    for i in range(0, len(rows), size):
+        chunk = rows[i:i + size]
+        if columns is not None:
+            chunk = [{c: r.get(c, "") for c in columns} for r in chunk]
+        yield ("," if i else "") + json.dumps(chunk)[1:-1]
+    yield "]"
+
+
+def listar(entity: str):
+    """Resposta de uma listagem (ver comentário acima)."""
+    try:
+        criteria, columns, limit, cursor = _list_query(entity)
+    except _BadRequest as e:
+        return jsonify({"erro": str(e)}), 400
+
+    # versão lida antes das linhas: se mudar no meio, o próximo pedido não casa
+    raw = f"{entity}:{storage.version(entity)}:{request.query_string.decode()}"
+    etag = hashlib.sha1(raw.encode()).hexdigest()[:20]
+    if request.if_none_match.contains(etag):
+        resp = Response(status=304)
+        resp.set_etag(etag)
+        return resp
+
+    rows = storage.find_by(entity, **criteria) if criteria else storage.load_all(entity)
+    headers = {}
+    if limit is not None:
+        key_fields = storage.ENTITIES[entity]["key"]
+        sort_key = lambda r: tuple(_order(r.get(f)) for f in key_fields)  # noqa: E731
+        rows.sort(key=sort_key)
+        if cursor is not None:
+            rows = [r for r in rows if sort_key(r) > cursor]
+        if len(rows) > limit:
+            rows = rows[:limit]
+            token = _encode_cursor([rows[-1].get(f, "") for f in key_fields])
+            args = request.args.to_dict()
+            args["cursor"] = token
+            args.setdefault("limit", str(limit))
+            headers["Link"] = f'<{request.path}?{urlencode(args)}>; rel="next"'
+            headers["X-Next-Cursor"] = token
+
+    resp = Response(_stream_json(rows, columns), mimetype="application/json", headers=headers)
+    resp.set_etag(etag)
+    return resp
+
+
 @api.route("/salas", methods=["GET"])
 def listar_salas():
-    salas = storage.load_all("salas")
-    return jsonify(salas)
+    return listar("salas")
 
 
 @api.route("/salas", methods=["POST"])
@@ -31,8 +156,7 @@ def criar_sala():
 
 @api.route("/switches", methods=["GET"])
 def listar_switches():
-    switches = storage.load_all("switches")
-    return jsonify(switches)
+    return listar("switches")
 
 
 @api.route("/switches", methods=["POST"])
@@ -58,8 +182,7 @@ def criar_switch():
 
 @api.route("/maquinas", methods=["GET"])
 def listar_maquinas():
-    maquinas = storage.load_all("maquinas")
-    return jsonify(maquinas)
+    return listar("maquinas")
 
 
 @api.route("/maquinas", methods=["POST"])
@@ -87,20 +210,25 @@ def criar_ligacao():
 
 @api.route("/ligacoes", methods=["GET"])
 def listar_ligacoes():
-    ligacoes = storage.load_all("ligacao_sala_switch")
-    return jsonify(ligacoes)
+    return listar("ligacao_sala_switch")
 
 @api.route("/agendamentos", methods=["POST"])
 def criar_agendamento():
     dados = request.json
-    # gravar também o mac e id_maquina caso fornecidos
+    portas = dados.get("portas", "")
+    if isinstance(portas, list):
+        portas = ",".join(str(p) for p in portas)
+    # gravar também o mac e id_maquina caso fornecidos; o uid identifica os
+    # jobs criados pelo agendador (run_scheduler.py)
     row = {
+        "uid": uuid.uuid4().hex,
         "id_sala": dados.get("id_sala", ""),
         "id_switch": dados.get("id_switch", ""),
         "mac": dados.get("mac", ""),
         "id_maquina": dados.get("id_maquina", ""),
         "data_inicio": dados.get("data_inicio"),
-        "data_fim": dados.get("data_fim")
+        "data_fim": dados.get("data_fim"),
+        "portas": portas
     }
     storage.append("agendamento_sala_switch", row)
     return jsonify({"mensagem": "Agendamento criado"}), 201
@@ -108,61 +236,218 @@ def criar_agendamento():
 
 @api.route("/agendamentos", methods=["GET"])
 def listar_agendamentos():
-    agends = storage.load_all("agendamento_sala_switch")
-    return jsonify(agends)
+    return listar("agendamento_sala_switch")
+
+# --- alteração de portas ------------------------------------------------------
+#
+# /porta, /portas/batch e /salas|/blocos/<..>/<acao> rodam como jobs
+# (app.jobs): respondem 202 com o job na hora e o resultado sai em
+# GET /jobs/<id>. Com ?sync=1 a resposta espera o job e traz o resultado,
+# como antes; de todo modo o SET passa pela fila do switch e não se
+# intercala com outros jobs no mesmo switch.
+
+def _sincrono() -> bool:
+    return request.args.get("sync", "").lower() in ("1", "true", "sim")
+
+
+def _resultado_job(job: jobs.Job):
+    """Resultado do job terminado, ou (None, resposta de erro)."""
+    job.wait()
+    if job.status != jobs.DONE:
+        return None, (jsonify({"erro": job.error or "falha no job"}), 500)
+    return job.result, None
+
 
 @api.route("/porta", methods=["POST"])
 def alterar_porta():
-    dados = request.json
+    dados = request.get_json(silent=True) or {}
 
-    id_switch = dados["id_switch"]
-    id_maquina = dados["id_maquina"]
-    porta = dados["porta"]
+    id_switch = dados.get("id_switch")
+    id_maquina = dados.get("id_maquina")
+    porta = dados.get("porta")
     # garantir que status seja um inteiro (1 para ligado, 0 para desligado)
     try:
         status = int(dados["status"])
+        porta = int(porta)
     except Exception:
-        return jsonify({"erro": "status inválido"}), 400
+        return jsonify({"erro": "status ou porta inválidos"}), 400
 
-    switches = storage.load_all("switches")
-    switch = None
-    for s in switches:
-        try:
-            if int(s.get("id_switch")) == int(id_switch):
-                switch = s
-                break
-        except Exception:
-            continue
+    switch = storage.get_by_key("switches", id_switch)
 
     if not switch:
         return jsonify({"erro": "switch não encontrado"}), 404
 
-    snmp = SNMPManager(
-        hostname=switch.get("ip"),
-        community_read=switch.get("chave_community"),
-        community_write=switch.get("chave_community"),
-        version=int(switch.get("versao_snmp") or 2)
-    )
-
-    snmp_sucesso = snmp.alterar_estado_porta(porta, status)
-
-    # atualizar CSV de maquinas_conectadas_switch
-    regs = storage.load_all("maquinas_conectadas_switch")
-    updated = False
-    for r in regs:
-        try:
-            if int(r.get("id_maquina")) == int(id_maquina) and int(r.get("id_switch")) == int(id_switch):
-                r["status"] = "True" if status == 1 else "False"
-                updated = True
-                break
-        except Exception:
-            continue
-
-    if updated:
-        storage.save_all("maquinas_conectadas_switch", regs)
+    estado = snmp_mod.PortState.ENABLED if status == 1 else snmp_mod.PortState.DISABLED
+    op = port_ops.PortOperation(str(id_switch), porta, estado, str(id_maquina or ""))
+    try:
+        job = port_ops.submit_operations([op])
+    except jobs.JobQueueFull as e:
+        return jsonify({"erro": str(e)}), 503
+    if not _sincrono():
+        return _job_aceito(job)
 
+    resultado, erro = _resultado_job(job)
+    if erro:
+        return erro
     return jsonify({
-        "sucesso": snmp_sucesso,
+        "sucesso": resultado["resultados"][0]["sucesso"],
         "porta": porta,
         "status": status
     })
+
+
+def _operacoes_do_corpo():
+    """Lista de operações do corpo (lista ou {"operacoes": [...]}), ou
+    uma resposta de erro."""
+    dados = request.get_json(silent=True)
+    itens = dados.get("operacoes") if isinstance(dados, dict) else dados
+    if not isinstance(itens, list) or not itens:
+        return None, (jsonify({"erro": "lista de operações vazia ou inválida"}), 400)
+    limite = getattr(config, "API_MAX_BATCH_OPERATIONS", 5000)
+    if len(itens) > limite:
+        return None, (jsonify({"erro": f"máximo de {limite} operações por requisição"}), 400)
+    return itens, None
+
+
+def _parse_operacoes(itens):
+    """(resultados com os erros de validação nas posições inválidas,
+    [(posição, PortOperation)] das válidas)."""
+    resultados = [None] * len(itens)
+    validas = []
+    for i, item in enumerate(itens):
+        try:
+            validas.append((i, port_ops.parse_operation(item)))
+        except ValueError as e:
+            resultados[i] = {"sucesso": False, "erro": str(e)}
+    return resultados, validas
+
+
+def _job_aceito(job: jobs.Job):
+    resp = jsonify(job.as_dict())
+    resp.status_code = 202
+    resp.headers["Location"] = f"/jobs/{job.id}"
+    return resp
+
+
+@api.route("/portas/batch", methods=["POST"])
+def alterar_portas_lote():
+    """Várias alterações de porta em uma requisição: uma lista de
+    {"id_switch", "porta", "status"[, "id_maquina"]} (ou {"operacoes": [...]}).
+    Os switches são atendidos em paralelo e cada operação recebe o seu
+    resultado. Sem ?sync=1, operações inválidas recusam o lote (400)."""
+    itens, erro = _operacoes_do_corpo()
+    if erro:
+        return erro
+
+    sincrono = _sincrono()
+    resultados, validas = _parse_operacoes(itens)
+    invalidas = [dict(r, indice=i) for i, r in enumerate(resultados) if r is not None]
+    if invalidas and not sincrono:
+        return jsonify({"erro": "operações inválidas", "resultados": invalidas}), 400
+    try:
+        job = port_ops.submit_operations([op for _, op in validas])
+    except jobs.JobQueueFull as e:
+        return jsonify({"erro": str(e)}), 503
+    if not sincrono:
+        return _job_aceito(job)
+
+    resultado, erro = _resultado_job(job)
+    if erro:
+        return erro
+    for (i, _), r in zip(validas, resultado["resultados"]):
+        resultados[i] = r
+    for i, r in enumerate(resultados):
+        r["indice"] = i
+
+    ok = sum(1 for r in resultados if r["sucesso"])
+    return jsonify({"resultados": resultados, "sucesso": ok, "falhas": len(resultados) - ok})
+
+
+# --- salas e blocos inteiros (app.room_ops) -----------------------------------
+
+ACOES_SALA = {"bloquear": snmp_mod.PortState.DISABLED, "desbloquear": snmp_mod.PortState.ENABLED}
+
+
+@api.route("/salas/<id_sala>/<acao>", methods=["POST"])
+def alterar_sala(id_sala, acao):
+    """Bloqueia/desbloqueia todas as máquinas da sala (exceto a do professor
+    e as portas de uplink)."""
+    if acao not in ACOES_SALA:
+        return jsonify({"erro": "ação inválida (bloquear ou desbloquear)"}), 404
+    if storage.get_by_key("salas", id_sala) is None:
+        return jsonify({"erro": "sala não encontrada"}), 404
+    return _alterar_salas([id_sala], ACOES_SALA[acao])
+
+
+@api.route("/blocos/<bloco>/<acao>", methods=["POST"])
+def alterar_bloco(bloco, acao):
+    """Como `POST /salas/<id>/<acao>`, para todas as salas do bloco."""
+    if acao not in ACOES_SALA:
+        return jsonify({"erro": "ação inválida (bloquear ou desbloquear)"}), 404
+    salas = room_ops.rooms_in_block(bloco)
+    if not salas:
+        return jsonify({"erro": "bloco sem salas"}), 404
+    return _alterar_salas(salas, ACOES_SALA[acao])
+
+
+def _alterar_salas(salas, estado):
+    try:
+        job = room_ops.submit_rooms(salas, estado)
+    except jobs.JobQueueFull as e:
+        return jsonify({"erro": str(e)}), 503
+    if not _sincrono():
+        return _job_aceito(job)
+    resultado, erro = _resultado_job(job)
+    return erro or jsonify(resultado)
+
+
+# --- jobs assíncronos (app.jobs) ---------------------------------------------
+
+@api.route("/jobs/portas", methods=["POST"])
+def criar_job_portas():
+    """Mesmo que `POST /portas/batch` sem ?sync=1."""
+    itens, erro = _operacoes_do_corpo()
+    if erro:
+        return erro
+    resultados, validas = _parse_operacoes(itens)
+    invalidas = [dict(r, indice=i) for i, r in enumerate(resultados) if r is not None]
+    if invalidas:
+        return jsonify({"erro": "operações inválidas", "resultados": invalidas}), 400
+    try:
+        job = port_ops.submit_operations([op for _, op in validas])
+    except jobs.JobQueueFull as e:
+        return jsonify({"erro": str(e)}), 503
+    return _job_aceito(job)
+
+
+@api.route("/jobs/atualizacao", methods=["POST"])
+def criar_job_atualizacao():
+    """Coleta sob demanda de status/FDB: {"id_switch": [..]} (todos se omitido)."""
+    dados = request.get_json(silent=True) or {}
+    switches = storage.load_all("switches")
+    ids = dados.get("id_switch") if isinstance(dados, dict) else None
+    if ids is not None:
+        ids = {str(i) for i in (ids if isinstance(ids, list) else [ids])}
+        switches = [sw for sw in switches if str(sw.get("id_switch")) in ids]
+        faltando = ids - {str(sw.get("id_switch")) for sw in switches}
+        if faltando:
+            return jsonify({"erro": f"switch não encontrado: {', '.join(sorted(faltando))}"}), 404
+    try:
+        job = sync.submit_refresh(switches)
+    except jobs.JobQueueFull as e:
+        return jsonify({"erro": str(e)}), 503
+    return _job_aceito(job)
+
+
+@api.route("/jobs/<job_id>", methods=["GET"])
+def consultar_job(job_id):
+    job = jobs.get(job_id)
+    if job is None:
+        return jsonify({"erro": "job não encontrado"}), 404
+    return jsonify(job.as_dict())
+
+
+@api.route("/metrics", methods=["GET"])
+def exportar_metricas():
+    # métricas deste processo + instantâneos publicados pelo coletor/agendador
+    return Response(metrics.render_all(), mimetype="text/plain; version=0.0.4; charset=utf-8")
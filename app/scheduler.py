@@ -0,0 +1,256 @@
+"""
+Agendador de bloqueio/desbloqueio executado dentro de um processo de longa
+duração (`run_scheduler.py`), em substituição às entradas de crontab.
+
+A fonte persistente dos agendamentos é a entidade `agendamento_sala_switch`:
+cada linha gera dois jobs do APScheduler (bloqueio em `data_inicio`,
+desbloqueio em `data_fim`). O agendador relê a entidade periodicamente,
+adiciona/remove jobs conforme as linhas mudam e apaga agendamentos já
+encerrados. As ações rodam no próprio processo, com sessões SNMP do pool.
+
+Ações que disparam juntas (ex.: início de aula) não são executadas uma a
+uma: o `ActionCoalescer` as acumula por `config.SCHEDULER_COALESCE_WINDOW`
+segundos, resolve conflitos por porta e faz um SET em lote por switch.
+"""
+import logging
+import threading
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+import config
+from . import metrics, storage
+from .port_ops import execute_plan
+from .snmp import PortState
+
+logger = logging.getLogger(__name__)
+
+
+def parse_ports(text: str) -> List[int]:
+    """Converte "1,2, 3" em [1, 2, 3] (ignora itens inválidos)."""
+    ports = []
+    for part in str(text or '').split(','):
+        part = part.strip()
+        if part.isdigit():
+            ports.append(int(part))
+    return ports
+
+
+def _parse_dt(value: str) -> Optional[datetime]:
+    try:
+        return datetime.fromisoformat(str(value))
+    except (TypeError, ValueError):
+        return None
+
+
+def planned_actions(row: dict) -> List[Tuple[str, datetime, PortState]]:
+    """Ações de um agendamento: (id do job, horário, estado).
+    Linhas sem switch, portas ou datas válidas não geram ações."""
+    uid = row.get('uid')
+    if not uid or not row.get('id_switch') or not parse_ports(row.get('portas')):
+        return []
+    actions = []
+    inicio = _parse_dt(row.get('data_inicio'))
+    fim = _parse_dt(row.get('data_fim'))
+    if inicio:
+        actions.append((f"{uid}_start", inicio, PortState.DISABLED))
+    if fim:
+        actions.append((f"{uid}_end", fim, PortState.ENABLED))
+    return actions
+
+
+@dataclass
+class PendingAction:
+    uid: str
+    id_switch: str
+    ports: List[int]
+    state: PortState
+    when: datetime
+    seq: int = 0
+
+
+def resolve_conflicts(actions: List[PendingAction], policy: str = 'last') -> Dict[str, Dict[int, PortState]]:
+    """Agrupa as ações por switch e decide o estado final de cada porta.
+
+    `policy='last'`: vale a ação com horário mais recente (empate: a que
+    chegou por último). `policy='priority'`: bloqueio (DISABLED) vence
+    desbloqueio; entre ações de mesmo estado vale a mais recente."""
+    winners: Dict[Tuple[str, int], PendingAction] = {}
+    for a in actions:
+        for port in a.ports:
+            key = (str(a.id_switch), port)
+            cur = winners.get(key)
+            if cur is None or _rank(a, policy) >= _rank(cur, policy):
+                winners[key] = a
+    plan: Dict[str, Dict[int, PortState]] = {}
+    for (id_switch, port), a in winners.items():
+        plan.setdefault(id_switch, {})[port] = a.state
+    return plan
+
+
+def _rank(a: PendingAction, policy: str):
+    if policy == 'priority':
+        return (a.state == PortState.DISABLED, a.when, a.seq)
+    return (a.when, a.seq)
+
+
+# id do job do APScheduler que executa as ações acumuladas
+FLUSH_JOB = 'ogmr_flush'
+
+
+class ActionCoalescer:
+    """Junta as ações que disparam dentro de uma janela de tempo e as executa
+    como uma operação em lote por switch (ex.: início de aula)."""
+
+    def __init__(self, scheduler, window: Optional[float] = None, policy: Optional[str] = None):
+        self.scheduler = scheduler
+        self.window = window if window is not None else getattr(config, 'SCHEDULER_COALESCE_WINDOW', 5)
+        self.policy = policy or getattr(config, 'SCHEDULER_CONFLICT_POLICY', 'last')
+        self._pending: List[PendingAction] = []
+        self._seq = 0
+        self._lock = threading.Lock()
+
+    def submit(self, uid: str, id_switch: str, portas: str, state_value: int, when: str) -> None:
+        action = PendingAction(uid, str(id_switch), parse_ports(portas), PortState(state_value),
+                               _parse_dt(when) or datetime.now())
+        with self._lock:
+            self._seq += 1
+            action.seq = self._seq
+            self._pending.append(action)
+        if self.window <= 0:
+            self.flush()
+        else:
+            self._arm()
+
+    def _arm(self, force: bool = False) -> None:
+        """Agenda o flush se não houver um à espera no APScheduler (`force`
+        o reagenda mesmo assim). Sem prazo de misfire: um flush atrasado (ex.:
+        o anterior esperando timeouts de SNMP) ainda roda, em vez de ser
+        descartado com ações pendentes."""
+        if not force and self.scheduler.get_job(FLUSH_JOB) is not None:
+            return
+        self.scheduler.add_job(self.flush, 'date', id=FLUSH_JOB, replace_existing=True,
+                               run_date=datetime.now() + timedelta(seconds=self.window),
+                               misfire_grace_time=None, coalesce=True)
+
+    def flush(self) -> Dict[str, Dict[int, bool]]:
+        with self._lock:
+            actions, self._pending = self._pending, []
+        if not actions:
+            return {}
+        plan = resolve_conflicts(actions, self.policy)
+        logger.info("Executando %d ações agendadas em %d switches", len(actions), len(plan))
+        try:
+            results = execute_plan(plan)
+            try:
+                metrics.export()
+            except OSError:
+                pass
+        finally:
+            # ações que chegaram durante a execução: o job agendado por elas
+            # pode disparar antes de este terminar e ser pulado (uma instância
+            # por vez), então o flush é reagendado daqui
+            with self._lock:
+                again = bool(self._pending)
+            if again and self.window > 0:
+                self._arm(force=True)
+        return results
+
+
+class AgendamentoScheduler:
+    """Mantém os jobs do APScheduler sincronizados com `agendamento_sala_switch`."""
+
+    def __init__(self, scheduler=None, misfire_grace: Optional[int] = None):
+        if scheduler is None:
+            from apscheduler.schedulers.blocking import BlockingScheduler
+            scheduler = BlockingScheduler()
+        self.scheduler = scheduler
+        self.misfire_grace = misfire_grace if misfire_grace is not None else getattr(config, 'SCHEDULER_MISFIRE_GRACE', 300)
+        self.coalescer = ActionCoalescer(scheduler)
+        self._jobs: Dict[str, Tuple[datetime, str, str]] = {}
+        # jobs que dispararam neste processo
+        self._fired: set = set()
+
+    def _add_job(self, job_id: str, when: datetime, row: dict, state: PortState) -> None:
+        self.scheduler.add_job(
+            self._fire, 'date', run_date=when, id=job_id, replace_existing=True,
+            args=[job_id, row.get('uid'), row.get('id_switch'), row.get('portas'), state.value, when.isoformat()],
+            misfire_grace_time=self.misfire_grace,
+        )
+
+    def _fire(self, job_id: str, *args) -> None:
+        self._fired.add(job_id)
+        self.coalescer.submit(*args)
+
+    def _overdue_unblock(self, row: dict, active: List[dict]) -> None:
+        """Desbloqueio de um agendamento encerrado cujo job não disparou neste
+        processo (ex.: agendador parado). Portas cobertas por outro
+        agendamento ativo no mesmo switch continuam bloqueadas."""
+        busy = {p for a in active if str(a.get('id_switch')) == str(row.get('id_switch'))
+                for p in parse_ports(a.get('portas'))}
+        ports = [p for p in parse_ports(row.get('portas')) if p not in busy]
+        if not ports:
+            return
+        logger.warning("Agendamento %s encerrado sem desbloqueio: desbloqueando switch %s, portas %s",
+                       row.get('uid'), row.get('id_switch'), ports)
+        self.coalescer.submit(row.get('uid'), row.get('id_switch'), ','.join(map(str, ports)),
+                              PortState.ENABLED.value, row.get('data_fim'))
+
+    def reconcile(self, now: Optional[datetime] = None) -> dict:
+        """Relê os agendamentos: cria/atualiza jobs pendentes, remove jobs de
+        linhas apagadas e apaga da entidade os agendamentos já encerrados
+        (desbloqueando antes os que não tiveram o desbloqueio executado)."""
+        now = now or datetime.now()
+        grace = timedelta(seconds=self.misfire_grace)
+        rows = storage.load_all('agendamento_sala_switch')
+        wanted: Dict[str, Tuple[datetime, str, str]] = {}
+        expired = []
+        active = []
+        for row in rows:
+            actions = planned_actions(row)
+            fim = _parse_dt(row.get('data_fim'))
+            if fim is not None and fim + grace < now:
+                # encerrado (desbloqueio já passou do prazo de tolerância)
+                if row.get('uid'):
+                    expired.append(row)
+                continue
+            inicio = _parse_dt(row.get('data_inicio'))
+            if actions and inicio is not None and inicio <= now:
+                active.append(row)
+            for job_id, when, state in actions:
+                if when + grace < now:
+                    continue
+                spec = (when, row.get('id_switch'), row.get('portas'))
+                wanted[job_id] = spec
+                if self._jobs.get(job_id) != spec:
+                    self._add_job(job_id, when, row, state)
+
+        removed = 0
+        for job_id in set(self._jobs) - set(wanted):
+            try:
+                self.scheduler.remove_job(job_id)
+            except Exception:
+                # job já executado e descartado pelo APScheduler
+                pass
+            removed += 1
+        self._jobs = wanted
+
+        for row in expired:
+            if planned_actions(row) and f"{row.get('uid')}_end" not in self._fired:
+                self._overdue_unblock(row, active)
+            self._fired.difference_update({f"{row.get('uid')}_start", f"{row.get('uid')}_end"})
+        if expired:
+            # só as linhas encerradas: agendamentos criados enquanto isso são mantidos
+            storage.apply_changes('agendamento_sala_switch', deletes=[(row.get('uid'),) for row in expired])
+        try:
+            # mantém o instantâneo recente para a rota /metrics (config.METRICS_MAX_AGE)
+            metrics.export()
+        except OSError:
+            pass
+        return {'jobs': len(wanted), 'removidos': removed, 'expirados': len(expired)}
+
+    def start(self) -> None:
+        self.reconcile()
+        self.scheduler.add_job(self.reconcile, 'interval', id='ogmr_reconcile', replace_existing=True,
+                               seconds=getattr(config, 'SCHEDULER_RELOAD_INTERVAL', 30))
+        self.scheduler.start()
@@ -1,6 +1,17 @@
+import os
+import threading
+import time
+from collections import OrderedDict
 from easysnmp import Session
 from enum import Enum
-from typing import List
+from typing import Dict, List, Optional, Tuple
+
+import config
+from . import metrics, storage
+from .discovery import SwitchDiscovery, boot_time, get_cache
+from .fdb import FdbTable
+from .mac import MAC
+from .metrics import snmp_operation
 
 
 class PortState(Enum):
@@ -14,9 +25,124 @@ MIB_PORT_STATUS = {
     "FDB_PORT": ".1.3.6.1.2.1.17.4.3.1.2"
 }
 
+# estimativa (bytes BER) para dimensionar SETs com vários varbinds:
+# cabeçalho da mensagem/PDU e um varbind ifAdminStatus.<ifIndex> = INTEGER
+SET_PDU_OVERHEAD = 48
+SET_VARBIND_SIZE = 24
+
+def _marks_dir() -> str:
+    return getattr(config, 'POLL_MARKS_DIR', None) or os.path.join(storage.BASE_DIR, 'poll_marks')
+
+
+def mark_ports_changed(host: str) -> None:
+    """Registra, para todos os processos, que as portas de `host` mudaram
+    por fora da coleta (SET, trap): o coletor refaz os walks desse switch no
+    próximo ciclo em vez de reaproveitar a coleta anterior."""
+    if not host:
+        return
+    path = os.path.join(_marks_dir(), str(host))
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'a'):
+            pass
+        os.utime(path, None)
+    except OSError:
+        pass
+
+
+def ports_changed() -> Dict[str, float]:
+    """host -> instante (epoch) da última marca de `mark_ports_changed`."""
+    directory = _marks_dir()
+    try:
+        names = os.listdir(directory)
+    except OSError:
+        return {}
+    marks = {}
+    for name in names:
+        try:
+            marks[name] = os.stat(os.path.join(directory, name)).st_mtime
+        except OSError:
+            continue
+    return marks
+
+
+# nomes textuais devolvidos pelo easysnmp quando use_numeric=False
+MIB_NAMES = {
+    "OPER": "ifOperStatus",
+    "ADMIN": "ifAdminStatus",
+}
+
+
+def _oid_index(var, base: str) -> str:
+    """Sufixo do OID de uma variável em relação a `base` (ou `oid_index`)."""
+    oid = getattr(var, 'oid', '') or ''
+    prefix = base + '.'
+    if oid.startswith(prefix):
+        return oid[len(prefix):]
+    return getattr(var, 'oid_index', '') or ''
+
+
+def _int_column(vars, base: str) -> Dict[int, object]:
+    """Valores de uma coluna indexados pelo ifIndex (pela posição se o
+    agente não devolve o índice numérico)."""
+    out = {}
+    for pos, v in enumerate(vars, start=1):
+        idx = _oid_index(v, base)
+        out[int(idx) if idx.isdigit() else pos] = getattr(v, 'value', None)
+    return out
+
+
+def _in_column(var, base: str, name: str = None) -> bool:
+    """Indica se a variável pertence à coluna de OID `base` (ou de nome `name`)."""
+    oid = getattr(var, 'oid', '') or ''
+    return oid == base or oid.startswith(base + '.') or (name is not None and oid == name)
+
+
+def _is_column(var, column: str) -> bool:
+    """Indica se a variável pertence à coluna `column` de MIB_PORT_STATUS."""
+    return _in_column(var, MIB_PORT_STATUS[column], MIB_NAMES.get(column))
+
+
+SYS_UPTIME_OID = '.1.3.6.1.2.1.1.3.0'
+
+# descoberta (ver app.discovery)
+BASE_PORT_IFINDEX_OID = '.1.3.6.1.2.1.17.1.4.1.2'    # dot1dBasePortIfIndex
+IF_INDEX_OID = '.1.3.6.1.2.1.2.2.1.1'
+IF_PHYS_OID = '.1.3.6.1.2.1.2.2.1.6'
+BRIDGE_ADDRESS_OID = '.1.3.6.1.2.1.17.1.1'
+
+# escalares baratos que indicam se as tabelas mudaram desde a última coleta
+CHANGE_MARKER_OIDS = {
+    'sys_uptime': SYS_UPTIME_OID,
+    'if_table_last_change': '.1.3.6.1.2.1.31.1.5.0',       # IF-MIB ifTableLastChange
+    'fdb_discards': '.1.3.6.1.2.1.17.4.1.0',               # dot1dTpLearnedEntryDiscards
+    'fdb_count': '.1.3.6.1.2.1.17.7.1.2.1.1.2.1',          # dot1qFdbDynamicCount (FDB 1)
+}
+
+
+class _SerializedSession:
+    """Envolve uma `easysnmp.Session` serializando as chamadas: uma mesma
+    sessão pode ser compartilhada (pool) por várias threads. Cada chamada é
+    registrada em `app.metrics` (duração, falhas e volume por switch)."""
+
+    def __init__(self, sess, host: str = ''):
+        self._sess = sess
+        self._host = host
+        self._lock = threading.RLock()
+
+    def __getattr__(self, name):
+        attr = getattr(self._sess, name)
+        if not callable(attr):
+            return attr
+
+        def call(*args, **kwargs):
+            with self._lock:
+                return metrics.record_snmp_call(self._host, name, attr, *args, **kwargs)
+        return call
+
 
 class SNMPManager:
-    def __init__(self, host: str = None, community_read: str = None, community_write: str = None, version: int = 2, timeout: int = 2, retries: int = 1, hostname: str = None, community: str = None):
+    def __init__(self, host: str = None, community_read: str = None, community_write: str = None, version: int = 2, timeout: int = 2, retries: int = 1, hostname: str = None, community: str = None, max_repetitions: int = None):
         # compatibilidade: aceitar hostname/community alternativos
         if hostname and not host:
             host = hostname
@@ -32,162 +158,288 @@ class SNMPManager:
         if community_write is None:
             community_write = community_read
 
+        self.host = host
+        self.version = int(version)
+        # GETBULK só existe a partir do SNMPv2c; em v1 os walks usam GETNEXT
+        self.max_repetitions = max_repetitions or getattr(config, 'SNMP_MAX_REPETITIONS', 25)
+        self.use_bulk = self.version != 1 and getattr(config, 'SNMP_USE_BULK', True)
+
         # criar sessões com timeout/retries (easysnmp aceita esses parâmetros)
         try:
-            self.read_sess = Session(hostname=host, community=community_read, version=version, timeout=timeout, retries=retries)
-            self.write_sess = Session(hostname=host, community=community_write, version=version, timeout=timeout, retries=retries)
+            read_sess = Session(hostname=host, community=community_read, version=version, timeout=timeout, retries=retries)
+            write_sess = Session(hostname=host, community=community_write, version=version, timeout=timeout, retries=retries)
         except Exception:
             # fallback sem timeout/retries se a opção não for suportada
-            self.read_sess = Session(hostname=host, community=community_read, version=version)
-            self.write_sess = Session(hostname=host, community=community_write, version=version)
+            read_sess = Session(hostname=host, community=community_read, version=version)
+            write_sess = Session(hostname=host, community=community_write, version=version)
+        self.read_sess = _SerializedSession(read_sess, host)
+        self.write_sess = _SerializedSession(write_sess, host)
+
+        # último sysUpTime lido (valor, instante) e descoberta validada com ele
+        self._uptime: Optional[Tuple[object, float]] = None
+        self._discovery: Optional[SwitchDiscovery] = None
+        self._discovery_checked: Optional[Tuple[object, float]] = None
+        self._discovery_lock = threading.Lock()
+
+    def _note_uptime(self, value) -> Tuple[object, float]:
+        self._uptime = (value, time.time())
+        return self._uptime
+
+    def discovery(self) -> SwitchDiscovery:
+        """Mapa porta da bridge -> ifIndex, ifIndex, ifPhysAddress e MAC da
+        bridge, do cache de descoberta. O switch só é redescoberto quando o
+        sysUpTime mostra um reboot; um sysUpTime lido há menos de
+        `config.DISCOVERY_CHECK_INTERVAL` s (ex.: pelos marcadores) é
+        reaproveitado, senão é feito um GET."""
+        seen = self._uptime
+        if seen is None or time.time() - seen[1] > getattr(config, 'DISCOVERY_CHECK_INTERVAL', 300):
+            v = self.read_sess.get(SYS_UPTIME_OID)
+            seen = self._note_uptime(getattr(v, 'value', None))
+        with self._discovery_lock:
+            if self._discovery is not None and self._discovery_checked is seen:
+                return self._discovery
+            boot = boot_time(seen[0], seen[1])
+            cache = get_cache()
+            entry = cache.lookup(self.host, boot)
+            if entry is None:
+                entry = self._discover(boot)
+                cache.store(entry)
+            self._discovery, self._discovery_checked = entry, seen
+            return entry
+
+    @snmp_operation
+    def _discover(self, boot: Optional[float]) -> SwitchDiscovery:
+        base_port_ifindex = {}
+        for port, ifindex in _int_column(self._walk(BASE_PORT_IFINDEX_OID), BASE_PORT_IFINDEX_OID).items():
+            try:
+                base_port_ifindex[port] = int(ifindex)
+            except (TypeError, ValueError):
+                continue
+        # ifIndex e ifPhysAddress têm as mesmas linhas: uma só sequência de walk
+        rows = self._walk([IF_INDEX_OID, IF_PHYS_OID])
+        if_indexes = sorted(_int_column([v for v in rows if _in_column(v, IF_INDEX_OID, 'ifIndex')], IF_INDEX_OID))
+        if_phys = {}
+        for ifindex, value in _int_column([v for v in rows if _in_column(v, IF_PHYS_OID, 'ifPhysAddress')],
+                                          IF_PHYS_OID).items():
+            mac = MAC.from_octets(value or b'')
+            if_phys[ifindex] = str(mac) if mac is not None else ''
+        bridge_mac = ''
+        try:
+            v = self.read_sess.get(BRIDGE_ADDRESS_OID)
+            mac = MAC.from_octets(getattr(v, 'value', None) or b'')
+            bridge_mac = str(mac) if mac is not None else ''
+        except Exception:
+            pass
+        return SwitchDiscovery(host=self.host, boot_time=boot, discovered_at=time.time(), bridge_mac=bridge_mac,
+                               base_port_ifindex=base_port_ifindex, if_indexes=if_indexes, if_phys=if_phys)
+
+    def _ifindexes(self, ports) -> Dict[int, int]:
+        """ifIndex de cada porta da bridge (a própria porta se a descoberta falhar)."""
+        try:
+            disc = self.discovery()
+        except Exception:
+            return {int(p): int(p) for p in ports}
+        return {int(p): disc.ifindex(p) for p in ports}
+
+    def _ifindex(self, port: int) -> int:
+        return self._ifindexes([port])[int(port)]
+
+    @snmp_operation
+    def ping(self) -> bool:
+        """Verifica se o agente responde (GET de sysUpTime)."""
+        try:
+            v = self.read_sess.get(SYS_UPTIME_OID)
+            self._note_uptime(getattr(v, 'value', None))
+            return getattr(v, 'snmp_type', '') not in ('NOSUCHOBJECT', 'NOSUCHINSTANCE')
+        except Exception:
+            return False
+
+    @snmp_operation
+    def get_change_markers(self) -> Dict[str, Optional[str]]:
+        """Lê em um único GET os marcadores de `CHANGE_MARKER_OIDS`.
+        Objetos não suportados pelo agente ficam como None."""
+        names = list(CHANGE_MARKER_OIDS)
+        values = self.read_sess.get([CHANGE_MARKER_OIDS[n] for n in names])
+        markers = {}
+        for name, v in zip(names, values):
+            if getattr(v, 'snmp_type', '') in ('NOSUCHOBJECT', 'NOSUCHINSTANCE', 'ENDOFMIBVIEW'):
+                markers[name] = None
+            else:
+                markers[name] = v.value
+        if markers.get('sys_uptime') is not None:
+            self._note_uptime(markers['sys_uptime'])
+        return markers
+
+    def _walk(self, oids):
+        """Percorre uma ou mais colunas de tabela.
+        Usa GETBULK (várias linhas por PDU) em v2c/v3 e GETNEXT em v1."""
+        if self.use_bulk:
+            try:
+                return self.read_sess.bulkwalk(oids, non_repeaters=0, max_repetitions=self.max_repetitions)
+            except AttributeError:
+                # versão do easysnmp sem bulkwalk
+                self.use_bulk = False
+                metrics.REGISTRY.inc(metrics.snmp_retries, switch=self.host, reason='sem_getbulk')
+        return self.read_sess.walk(oids)
 
     def get_ports_by_mac(self, mac: str = ""):
         if mac != "":
             # buscar porta por mac
             return self.read_sess.get(f"{MIB_PORT_STATUS['FDB_PORT']}.{mac}")
         # retorna todas se vazio
-        return self.read_sess.walk(MIB_PORT_STATUS['FDB_PORT'])
+        return self._walk(MIB_PORT_STATUS['FDB_PORT'])
+
+    @snmp_operation
+    def get_fdb_table(self) -> FdbTable:
+        """FDB do switch em formato colunar (dot1dTpFdbPort; o MAC vem do sufixo do OID)."""
+        return FdbTable.from_varbinds(self._walk(MIB_PORT_STATUS['FDB_PORT']), MIB_PORT_STATUS['FDB_PORT'])
+
+    def get_fdb(self) -> Dict[MAC, int]:
+        """FDB do switch: MAC -> porta."""
+        return self.get_fdb_table().as_dict()
 
     def get_fdb_entries(self) -> List[dict]:
-        """Retorna lista de entradas FDB com campos {'mac': 'AA:BB:CC:DD:EE:FF', 'port': int}.
-        Usa o MIB dot1dTpFdbPort e converte o sufixo do OID em endereço MAC legível."""
-        entries = []
+        """Retorna lista de entradas FDB com campos {'mac': 'AA:BB:CC:DD:EE:FF', 'port': int}."""
         try:
-            vars = self.read_sess.walk(MIB_PORT_STATUS['FDB_PORT'])
-            for v in vars:
-                try:
-                    # v.oid example: .1.3.6.1.2.1.17.4.3.1.2.170.187.204.221.238.255
-                    oid = getattr(v, 'oid', '')
-                    prefix = MIB_PORT_STATUS['FDB_PORT'] + '.'
-                    if oid.startswith(prefix):
-                        suffix = oid[len(prefix):]
-                    else:
-                        # fallback: try oid_index if available
-                        suffix = getattr(v, 'oid_index', '')
-                    parts = [p for p in str(suffix).split('.') if p]
-                    # convert decimals to hex bytes
-                    mac_bytes = []
-                    for p in parts:
-                        try:
-                            n = int(p)
-                            mac_bytes.append('%02X' % n)
-                        except Exception:
-                            break
-                    if not mac_bytes:
-                        continue
-                    mac = ':'.join(mac_bytes)
-                    port = None
-                    try:
-                        port = int(getattr(v, 'value', None))
-                    except Exception:
-                        port = None
-                    entries.append({'mac': mac, 'port': port})
-                except Exception:
-                    continue
+            return [{'mac': str(mac), 'port': port} for mac, port in self.get_fdb_table()]
         except Exception:
-            return entries
-        return entries
-
-    def get_macs_by_port(self) -> dict:
-        """Retorna dicionário port -> [macs]
-        Útil para listar quais MACs estão aprendidas em cada porta."""
-        mapping = {}
-        entries = self.get_fdb_entries()
-        for e in entries:
-            p = e.get('port')
-            mac = e.get('mac')
-            if p is None:
-                continue
-            mapping.setdefault(p, []).append(mac)
-        return mapping
+            return []
 
+    def get_macs_by_port(self) -> Dict[int, List[MAC]]:
+        """Retorna dicionário porta -> [MACs aprendidas]."""
+        try:
+            return self.get_fdb_table().by_port()
+        except Exception:
+            return {}
+
+    @snmp_operation
     def get_bridge_mac(self) -> str:
-        """Tenta obter o MAC do switch (dot1dBaseBridgeAddress .1.3.6.1.2.1.17.1.1)."""
-        BRIDGE_OID = '.1.3.6.1.2.1.17.1.1'
+        """MAC do switch (dot1dBaseBridgeAddress, do cache de descoberta); '' se indisponível."""
         try:
-            v = self.read_sess.get(BRIDGE_OID)
-            raw = getattr(v, 'value', None)
-            if raw is None:
-                return ''
-            # raw may be a str of bytes; convert to hex pairs
-            try:
-                if isinstance(raw, bytes):
-                    mac_bytes = ['%02X' % b for b in raw]
-                else:
-                    mac_bytes = ['%02X' % ord(c) for c in raw]
-                return ':'.join(mac_bytes)
-            except Exception:
-                return str(raw)
+            return self.discovery().bridge_mac
         except Exception:
             return ''
 
+    @snmp_operation
     def get_if_phys_addresses(self) -> dict:
-        """Retorna mapping ifIndex -> mac (ifPhysAddress .1.3.6.1.2.1.2.2.1.6)"""
-        IF_PHYS = '.1.3.6.1.2.1.2.2.1.6'
-        mapping = {}
+        """Retorna mapping ifIndex -> mac (ifPhysAddress, do cache de descoberta)."""
         try:
-            vars = self.read_sess.walk(IF_PHYS)
-            for v in vars:
-                try:
-                    oid = getattr(v, 'oid', '')
-                    prefix = IF_PHYS + '.'
-                    if oid.startswith(prefix):
-                        idx = oid[len(prefix):]
-                    else:
-                        idx = getattr(v, 'oid_index', '')
-                    val = getattr(v, 'value', None)
-                    if val is None:
-                        continue
-                    try:
-                        if isinstance(val, bytes):
-                            mac_bytes = ['%02X' % b for b in val]
-                        else:
-                            mac_bytes = ['%02X' % ord(c) for c in val]
-                        mac = ':'.join(mac_bytes)
-                    except Exception:
-                        mac = str(val)
-                    mapping[int(idx)] = mac
-                except Exception:
-                    continue
+            return dict(self.discovery().if_phys)
         except Exception:
-            return mapping
-        return mapping
+            return {}
+
+    def _by_port(self, values: Dict[int, object]) -> Dict[int, object]:
+        """Converte um mapping ifIndex -> valor em porta da bridge -> valor,
+        descartando interfaces que não são portas da bridge."""
+        disc = self.discovery()
+        out = {}
+        for ifindex, value in values.items():
+            port = disc.port_for_ifindex(ifindex)
+            if port is not None:
+                out[port] = value
+        return out
+
+    @snmp_operation
+    def get_admin_status(self) -> dict:
+        """Retorna mapping porta da bridge -> ifAdminStatus com um único walk.
+        Permite cruzar em memória as portas da FDB sem um GET por porta."""
+        return self._by_port(_int_column(self._walk(MIB_PORT_STATUS['ADMIN']), MIB_PORT_STATUS['ADMIN']))
 
     # altera o estado de uma porta aqui
+    @snmp_operation
     def set_port_state(self, port: int, state: PortState) -> bool:
         try:
-            self.write_sess.set(f"{MIB_PORT_STATUS['ADMIN']}.{port}", state.value, 'i')
+            self.write_sess.set(f"{MIB_PORT_STATUS['ADMIN']}.{self._ifindex(port)}", state.value, 'i')
             return True
         except Exception as e:
             print(f"Erro ao alterar porta {port}: {e}")
             return False
+        finally:
+            mark_ports_changed(self.host)
 
 
+    @snmp_operation
     def fetch_port_status(self, port: int = 0) -> List[dict]:
         # retorna status de uma porta
         if port > 0:
-                oper = self.read_sess.get(f"{MIB_PORT_STATUS['OPER']}.{port}").value
-                admin = self.read_sess.get(f"{MIB_PORT_STATUS['ADMIN']}.{port}").value
+                ifindex = self._ifindex(port)
+                oper = self.read_sess.get(f"{MIB_PORT_STATUS['OPER']}.{ifindex}").value
+                admin = self.read_sess.get(f"{MIB_PORT_STATUS['ADMIN']}.{ifindex}").value
                 return [{"port": port, "operational": oper, "administrative": admin}]
 
         statuses = []
-        oper_list = self.read_sess.walk(MIB_PORT_STATUS['OPER'])
-        admin_list = self.read_sess.walk(MIB_PORT_STATUS['ADMIN'])
-
-        # retorna status de várias portas
-        for idx, (oper, admin) in enumerate(zip(oper_list, admin_list), start=1):
-            statuses.append({
-                "port": idx,
-                "operational": oper.value,
-                "administrative": admin.value
-            })
+        if self.use_bulk and getattr(config, 'SNMP_COMBINED_STATUS', True):
+            # ifOperStatus e ifAdminStatus na mesma sequência de GETBULK
+            oper_list, admin_list = [], []
+            for v in self._walk([MIB_PORT_STATUS['OPER'], MIB_PORT_STATUS['ADMIN']]):
+                if _is_column(v, 'OPER'):
+                    oper_list.append(v)
+                elif _is_column(v, 'ADMIN'):
+                    admin_list.append(v)
+        else:
+            oper_list = self._walk(MIB_PORT_STATUS['OPER'])
+            admin_list = self._walk(MIB_PORT_STATUS['ADMIN'])
+
+        # retorna status de várias portas, numeradas como na FDB (porta da bridge)
+        oper = self._by_port(_int_column(oper_list, MIB_PORT_STATUS['OPER']))
+        admin = self._by_port(_int_column(admin_list, MIB_PORT_STATUS['ADMIN']))
+        for port in sorted(oper):
+            if port in admin:
+                statuses.append({
+                    "port": port,
+                    "operational": oper[port],
+                    "administrative": admin[port]
+                })
         return statuses
 
+    def _set_chunk_size(self) -> int:
+        """Quantos varbinds de ifAdminStatus cabem em uma PDU de SET, dado o
+        tamanho máximo de mensagem aceito pelo agente."""
+        max_msg = getattr(config, 'SNMP_MAX_MSG_SIZE', 1472)
+        community = len(getattr(self.write_sess, 'community', '') or '')
+        n = (max_msg - SET_PDU_OVERHEAD - community) // SET_VARBIND_SIZE
+        limit = getattr(config, 'SNMP_MAX_SET_VARBINDS', 0)
+        if limit:
+            n = min(n, limit)
+        return max(1, n)
+
+    def set_ports_batch(self, ports: List[int], state: PortState) -> Dict[int, bool]:
+        """Altera várias portas enviando vários varbinds por PDU de SET.
+        Retorna dicionário porta -> sucesso."""
+        return self.set_port_states({int(p): state for p in ports})
+
+    @snmp_operation
+    def set_port_states(self, states: Dict[int, PortState]) -> Dict[int, bool]:
+        """Como `set_ports_batch`, mas cada porta pode ter um estado diferente
+        (os varbinds de estados distintos vão nas mesmas PDUs)."""
+        results: Dict[int, bool] = {}
+        pending = list(states)
+        ifindex = self._ifindexes(pending)
+        size = self._set_chunk_size()
+        for i in range(0, len(pending), size):
+            chunk = pending[i:i + size]
+            varbinds = [(f"{MIB_PORT_STATUS['ADMIN']}.{ifindex[int(p)]}", states[p].value, 'i') for p in chunk]
+            try:
+                ok = self.write_sess.set_multiple(varbinds) is not False
+            except Exception as e:
+                print(f"Erro ao alterar portas {chunk}: {e}")
+                ok = False
+            if ok:
+                for p in chunk:
+                    results[p] = True
+            elif len(chunk) == 1:
+                results[chunk[0]] = False
+            else:
+                # o SET é atômico por PDU: repetir porta a porta para saber quais falham
+                metrics.REGISTRY.inc(metrics.snmp_retries, len(chunk), switch=self.host, reason='set_porta_a_porta')
+                for p in chunk:
+                    results[p] = self.set_port_state(p, states[p])
+        mark_ports_changed(self.host)
+        return results
+
     def set_ports(self, ports: List[int], state: PortState) -> bool:
-        for p in ports:
-            if not self.set_port_state(p, state):
-                return False
-        return True
+        results = self.set_ports_batch(ports, state)
+        return all(results.values())
 
     def alterar_estado_porta(self, porta: int, estado: int) -> bool:
         """Compatibilidade: recebe porta e estado (1 para ligado/enable, 2 para desligado/disable).
@@ -210,7 +462,98 @@ class SNMPManager:
                 estado_enum = PortState.ENABLED
             else:
                 estado_enum = PortState.DISABLED
-            return self.set_ports(portas, estado_enum)
+            return all(self.set_ports_batch(portas, estado_enum).values())
         except Exception as e:
             print(f"Erro alterar_estado_portas: {e}")
             return False
+
+
+PoolKey = Tuple[str, int, str, str, int, int]
+
+
+class SessionPool:
+    """Pool de `SNMPManager` compartilhado pelo processo.
+
+    As entradas são indexadas por (host, versão, credenciais, timeout,
+    retries). Entradas ociosas há mais de `idle_timeout` segundos são
+    descartadas, o tamanho é limitado a `max_size` (removendo a menos usada)
+    e uma entrada ociosa há mais de `health_interval` segundos é verificada
+    com um GET de sysUpTime antes de ser reutilizada."""
+
+    def __init__(self, max_size: int = 256, idle_timeout: float = 300.0, health_interval: float = 60.0):
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self.health_interval = health_interval
+        self._entries: "OrderedDict[PoolKey, list]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, host: str, community_read: str = None, community_write: str = None, version: int = 2,
+            timeout: int = 2, retries: int = 1) -> SNMPManager:
+        community_read = community_read or 'public'
+        community_write = community_write or community_read
+        key = (host, int(version), community_read, community_write, int(timeout), int(retries))
+        now = time.monotonic()
+        with self._lock:
+            self._evict_idle(now)
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+        if entry is not None:
+            manager, last_used = entry
+            if now - last_used < self.health_interval or manager.ping():
+                entry[1] = now
+                return manager
+        manager = SNMPManager(host=host, community_read=community_read, community_write=community_write,
+                              version=version, timeout=timeout, retries=retries)
+        with self._lock:
+            self._entries[key] = [manager, now]
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+        return manager
+
+    def _evict_idle(self, now: float) -> None:
+        expired = [k for k, (_, last) in self._entries.items() if now - last > self.idle_timeout]
+        for k in expired:
+            del self._entries[k]
+
+    def discard(self, host: str) -> None:
+        """Remove do pool todas as sessões de um host (ex.: credenciais alteradas)."""
+        with self._lock:
+            for k in [k for k in self._entries if k[0] == host]:
+                del self._entries[k]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+_pool: Optional[SessionPool] = None
+_pool_lock = threading.Lock()
+
+
+def get_pool() -> SessionPool:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = SessionPool(
+                max_size=getattr(config, 'SNMP_POOL_MAX_SIZE', 256),
+                idle_timeout=getattr(config, 'SNMP_POOL_IDLE_TIMEOUT', 300),
+                health_interval=getattr(config, 'SNMP_POOL_HEALTH_INTERVAL', 60),
+            )
+        return _pool
+
+
+def get_manager(host: str, community_read: str = None, community_write: str = None, version: int = 2,
+                timeout: int = 2, retries: int = 1) -> SNMPManager:
+    """Fábrica de `SNMPManager` reaproveitando sessões do pool do processo."""
+    return get_pool().get(host, community_read, community_write, version, timeout, retries)
+
+
+def manager_for_switch(sw: dict) -> SNMPManager:
+    """`SNMPManager` (do pool) para uma linha de `switches`."""
+    community = sw.get('chave_community') or None
+    return get_manager(sw.get('ip'), community, community, int(sw.get('versao_snmp') or 2))
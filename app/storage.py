@@ -1,43 +1,90 @@
+import copy
 import csv
 import os
-from typing import List, Dict
+import threading
+from contextlib import contextmanager
+from typing import Iterable, List, Dict, Optional, Tuple, Union
+
+try:
+    import fcntl
+except ImportError:  # Windows: sem trava entre processos
+    fcntl = None
+
+import config
+from . import mac, metrics
+from .metrics import storage_operation
 
 BASE_DIR = os.path.join(os.path.dirname(__file__), "data")
 
 ENTITIES = {
     "salas": {
         "file": "salas.csv",
-        "fields": ["id_sala", "numero", "bloco", "numero_pcs"]
+        "fields": ["id_sala", "numero", "bloco", "numero_pcs"],
+        "key": ["id_sala"],
+        "indexes": [["bloco"]]
     },
     "switches": {
         "file": "switches.csv",
-        "fields": ["id_switch", "numero_portas", "ip", "mac", "versao_snmp", "porta_uplink", "chave_community", "protocolo_autenticacao", "protocolo_criptografia", "chave_autenticacao", "chave_privada", "nivel_seguranca"]
+        "fields": ["id_switch", "numero_portas", "ip", "mac", "versao_snmp", "porta_uplink", "chave_community", "protocolo_autenticacao", "protocolo_criptografia", "chave_autenticacao", "chave_privada", "nivel_seguranca"],
+        "key": ["id_switch"],
+        "indexes": [["ip"]]
     },
     "maquinas": {
         "file": "maquinas.csv",
-        "fields": ["id_maquina", "nome", "ip", "tipo_maquina", "id_sala", "mac", "access_allowed"]
+        "fields": ["id_maquina", "nome", "ip", "tipo_maquina", "id_sala", "mac", "access_allowed"],
+        "key": ["id_maquina"],
+        "indexes": [["mac"], ["id_sala"]]
     },
     "ligacao_sala_switch": {
         "file": "ligacao_sala_switch.csv",
-        "fields": ["id_sala", "id_switch"]
+        "fields": ["id_sala", "id_switch"],
+        "key": ["id_sala", "id_switch"],
+        "indexes": [["id_sala"], ["id_switch"]]
     },
     "agendamento_sala_switch": {
         "file": "agendamento_sala_switch.csv",
-        "fields": ["uid", "id_sala", "id_switch", "mac", "id_maquina", "data_inicio", "data_fim"]
+        # portas: lista separada por vírgula das portas do switch afetadas
+        "fields": ["uid", "id_sala", "id_switch", "mac", "id_maquina", "data_inicio", "data_fim", "portas"],
+        "key": ["uid"],
+        "indexes": [["id_switch"], ["id_maquina"], ["mac"]]
     },
     "maquinas_conectadas_switch": {
         "file": "maquinas_conectadas_switch.csv",
-        "fields": ["id_maquina", "id_switch", "status", "porta"]
+        "fields": ["id_maquina", "id_switch", "status", "porta"],
+        "key": ["id_maquina", "id_switch"],
+        "indexes": [["id_maquina"], ["id_switch"], ["id_switch", "porta"]],
+        "journal": "maquinas_conectadas_switch.journal.csv"
     }
     ,
     "status_portas": {
         "file": "status_portas.csv",
-        # armazenar apenas o estado atual por porta: um único MAC (se houver)
-        "fields": ["id_switch", "switch_ip", "port", "operational", "administrative", "mac", "bridge_mac", "access_allowed"]
+        # armazenar apenas o estado atual por porta: um único MAC (se houver).
+        # Alterações vão para um diário (append-only) compactado periodicamente
+        # no arquivo principal; o estado atual é snapshot + diário.
+        "journal": "status_portas.journal.csv",
+        "fields": ["id_switch", "switch_ip", "port", "operational", "administrative", "mac", "bridge_mac", "access_allowed"],
+        "key": ["id_switch", "port"],
+        "indexes": [["id_switch"], ["switch_ip"], ["mac"]]
     }
 }
 
 
+def _rows_read(entity: str, n: int) -> None:
+    metrics.REGISTRY.inc(metrics.storage_rows_read, n, entity=entity)
+
+
+def _rows_written(entity: str, n: int) -> None:
+    metrics.REGISTRY.inc(metrics.storage_rows_written, n, entity=entity)
+
+
+def _sqlite():
+    """Módulo do backend SQLite quando `config.STORAGE_BACKEND == 'sqlite'`."""
+    if getattr(config, "STORAGE_BACKEND", "csv") != "sqlite":
+        return None
+    from . import storage_sqlite
+    return storage_sqlite
+
+
 def ensure_data_dir():
     if not os.path.exists(BASE_DIR):
         os.makedirs(BASE_DIR)
@@ -50,7 +97,168 @@ def _get_path(entity: str) -> str:
     return os.path.join(BASE_DIR, ENTITIES[entity]["file"])
 
 
-def load_all(entity: str) -> List[Dict[str, str]]:
+def _journal_path(entity: str) -> Optional[str]:
+    name = ENTITIES[entity].get("journal")
+    return os.path.join(BASE_DIR, name) if name else None
+
+
+@contextmanager
+def _file_lock(path: str):
+    """Trava exclusiva entre processos (flock em `<path>.lock`)."""
+    if fcntl is None:
+        yield
+        return
+    with open(path + ".lock", "a") as lf:
+        fcntl.flock(lf, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lf, fcntl.LOCK_UN)
+
+
+def _stored(fields: List[str], r: Dict) -> Dict[str, str]:
+    # garantir todas as chaves
+    return {k: (str(r.get(k)) if r.get(k) is not None else "") for k in fields}
+
+
+def _read_csv(f) -> List[Dict[str, str]]:
+    """Lê um CSV com cabeçalho, ignorando linhas em branco antes dele."""
+    reader = csv.reader(f)
+    header = next((row for row in reader if row), None)
+    if not header:
+        return []
+    return list(csv.DictReader(f, fieldnames=header))
+
+
+def _header(path: str) -> List[str]:
+    with open(path, newline='', encoding='utf-8') as f:
+        return next((row for row in csv.reader(f) if row), [])
+
+
+def _write_csv(path: str, fields: List[str], rows: Iterable[Dict]) -> None:
+    """Grava o arquivo inteiro de forma atômica (arquivo temporário + rename)."""
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w", newline='', encoding='utf-8') as f:
+        writer = csv.DictWriter(f, fieldnames=fields)
+        writer.writeheader()
+        for r in rows:
+            writer.writerow(_stored(fields, r))
+    os.replace(tmp, path)
+
+
+def _normalize(field: str, value) -> str:
+    if field == "mac":
+        # "0:11:22:..." e "00-11-22-..." indexam igual a "00:11:22:..."
+        return mac.normalize(value)
+    return "" if value is None else str(value).strip()
+
+
+class _CacheEntry:
+    """Linhas já lidas de uma entidade e seus índices, válidos enquanto o
+    arquivo mantiver o mesmo (mtime, tamanho). Não são alteradas depois de
+    publicadas em `_cache`: `patched` devolve uma nova entrada."""
+
+    def __init__(self, entity: str, rows: List[Dict[str, str]], stamp: Tuple[int, ...], journal_lines: int = 0):
+        self.stamp = stamp
+        self._rows: Optional[List[Dict[str, str]]] = rows
+        self.journal_lines = journal_lines
+        spec = ENTITIES[entity]
+        self.key = tuple(spec.get("key") or ())
+        self.by_key: Dict[Tuple[str, ...], Dict[str, str]] = {}
+        self.indexes: Dict[Tuple[str, ...], Dict[Tuple[str, ...], List[Dict[str, str]]]] = {
+            tuple(fields): {} for fields in spec.get("indexes", [])
+        }
+        for r in rows:
+            if self.key:
+                self.by_key[tuple(_normalize(f, r.get(f)) for f in self.key)] = r
+            for fields, index in self.indexes.items():
+                index.setdefault(tuple(_normalize(f, r.get(f)) for f in fields), []).append(r)
+
+    @property
+    def rows(self) -> List[Dict[str, str]]:
+        if self._rows is None:
+            # entrada corrigida por `patched`: a ordem segue a chave primária
+            self._rows = list(self.by_key.values())
+        return self._rows
+
+    def patched(self, upserts: List[Dict[str, str]], deletes: List[Tuple[str, ...]],
+                stamp: Tuple[int, ...], lines: int) -> '_CacheEntry':
+        """Nova entrada com o delta aplicado (mesma semântica de `_replay`),
+        sem reler os arquivos. Só para entidades com chave primária."""
+        new = _CacheEntry.__new__(_CacheEntry)
+        new.stamp = stamp
+        new._rows = None
+        new.journal_lines = self.journal_lines + lines
+        new.key = self.key
+        new.by_key = dict(self.by_key)
+        new.indexes = {fields: dict(index) for fields, index in self.indexes.items()}
+        for k in deletes:
+            new._unindex(new.by_key.pop(k, None))
+        for r in upserts:
+            k = _row_key(self.key, r)
+            new._unindex(new.by_key.get(k))
+            new.by_key[k] = r
+            for fields, index in new.indexes.items():
+                vals = tuple(_normalize(f, r.get(f)) for f in fields)
+                index[vals] = index.get(vals, []) + [r]
+        return new
+
+    def _unindex(self, row: Optional[Dict[str, str]]) -> None:
+        if row is None:
+            return
+        for fields, index in self.indexes.items():
+            vals = tuple(_normalize(f, row.get(f)) for f in fields)
+            # listas novas: as da entrada anterior continuam intactas
+            bucket = [r for r in index.get(vals, ()) if r is not row]
+            if bucket:
+                index[vals] = bucket
+            else:
+                index.pop(vals, None)
+
+
+_cache: Dict[str, _CacheEntry] = {}
+_cache_lock = threading.Lock()
+
+
+def _stamp(path: str) -> Tuple[int, int]:
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return (0, 0)
+    return (st.st_mtime_ns, st.st_size)
+
+
+def _row_key(key_fields, r: Dict) -> Tuple[str, ...]:
+    return tuple(_normalize(f, r.get(f)) for f in key_fields)
+
+
+def _replay(entity: str, rows: List[Dict[str, str]], jpath: str) -> Tuple[List[Dict[str, str]], int]:
+    """Aplica o diário sobre as linhas do snapshot. Retorna (linhas, nº de entradas)."""
+    key_fields = ENTITIES[entity]["key"]
+    state = {_row_key(key_fields, r): r for r in rows}
+    n = 0
+    with open(jpath, newline='', encoding='utf-8') as f:
+        for r in _read_csv(f):
+            n += 1
+            op = r.pop("op", "U")
+            k = _row_key(key_fields, r)
+            if op == "D":
+                state.pop(k, None)
+            else:
+                state[k] = r
+    return list(state.values()), n
+
+
+def invalidate(entity: Optional[str] = None) -> None:
+    """Descarta o cache de uma entidade (ou de todas)."""
+    with _cache_lock:
+        if entity is None:
+            _cache.clear()
+        else:
+            _cache.pop(entity, None)
+
+
+def _cached(entity: str) -> _CacheEntry:
     path = _get_path(entity)
     fields = ENTITIES[entity]["fields"]
     if not os.path.exists(path):
@@ -58,45 +266,309 @@ def load_all(entity: str) -> List[Dict[str, str]]:
         with open(path, "w", newline='', encoding='utf-8') as f:
             writer = csv.DictWriter(f, fieldnames=fields)
             writer.writeheader()
-        return []
+
+    jpath = _journal_path(entity)
+    stamp = _stamp(path) + (_stamp(jpath) if jpath else ())
+    with _cache_lock:
+        entry = _cache.get(entity)
+    if entry is not None and entry.stamp == stamp:
+        return entry
 
     with open(path, newline='', encoding='utf-8') as f:
-        reader = csv.DictReader(f)
-        return [row for row in reader]
+        rows = _read_csv(f)
+    metrics.REGISTRY.inc(metrics.storage_bytes_read, sum(stamp[1::2]), entity=entity)
+    journal_lines = 0
+    if jpath and os.path.exists(jpath):
+        rows, journal_lines = _replay(entity, rows, jpath)
+    entry = _CacheEntry(entity, rows, stamp, journal_lines)
+    with _cache_lock:
+        _cache[entity] = entry
+    return entry
+
+
+@storage_operation
+def version(entity: str) -> str:
+    """Identificador do estado atual da entidade: muda a cada gravação
+    (ETag das listagens da API). Nos CSVs vem de (mtime, tamanho) do arquivo
+    e do diário, sem lê-los."""
+    backend = _sqlite()
+    if backend:
+        return backend.version(entity)
+    path = _get_path(entity)
+    jpath = _journal_path(entity)
+    stamp = _stamp(path) + (_stamp(jpath) if jpath else ())
+    return "-".join(str(x) for x in stamp)
+
+
+@storage_operation
+def load_all(entity: str) -> List[Dict[str, str]]:
+    backend = _sqlite()
+    if backend:
+        rows = backend.load_all(entity)
+    else:
+        # cópias: os chamadores costumam alterar as linhas antes de save_all
+        rows = [dict(r) for r in _cached(entity).rows]
+    _rows_read(entity, len(rows))
+    return rows
+
+
+@storage_operation
+def get_by_key(entity: str, key: Union[str, int, Tuple]) -> Optional[Dict[str, str]]:
+    """Busca O(1) pela chave primária da entidade (valor ou tupla de valores)."""
+    backend = _sqlite()
+    if backend:
+        row = backend.get_by_key(entity, key)
+    else:
+        entry = _cached(entity)
+        if not entry.key:
+            raise ValueError(f"Entidade sem chave primária: {entity}")
+        values = key if isinstance(key, tuple) else (key,)
+        row = entry.by_key.get(tuple(_normalize(f, v) for f, v in zip(entry.key, values)))
+        row = dict(row) if row is not None else None
+    _rows_read(entity, 1 if row is not None else 0)
+    return row
+
 
+@storage_operation
+def find_by(entity: str, **criteria) -> List[Dict[str, str]]:
+    """Linhas cujos campos são iguais a `criteria`. Usa um índice secundário
+    (ou a chave primária) quando existe um para exatamente esses campos;
+    caso contrário percorre as linhas."""
+    backend = _sqlite()
+    rows = backend.find_by(entity, **criteria) if backend else _find_cached(entity, criteria)
+    _rows_read(entity, len(rows))
+    return rows
 
+
+def _find_cached(entity: str, criteria: Dict) -> List[Dict[str, str]]:
+    entry = _cached(entity)
+    fields = tuple(criteria)
+    wanted = tuple(_normalize(f, criteria[f]) for f in fields)
+    for idx_fields, index in entry.indexes.items():
+        if set(idx_fields) == set(fields):
+            ordered = tuple(_normalize(f, criteria[f]) for f in idx_fields)
+            return [dict(r) for r in index.get(ordered, [])]
+    if entry.key and set(entry.key) == set(fields):
+        row = entry.by_key.get(tuple(_normalize(f, criteria[f]) for f in entry.key))
+        return [dict(row)] if row is not None else []
+    return [dict(r) for r in entry.rows
+            if tuple(_normalize(f, r.get(f)) for f in fields) == wanted]
+
+
+@storage_operation
 def save_all(entity: str, rows: List[Dict[str, str]]) -> None:
+    backend = _sqlite()
+    if backend:
+        _rows_written(entity, len(rows))
+        return backend.save_all(entity, rows)
+    if _journal_path(entity):
+        # entidade com diário: gravar apenas as diferenças em relação ao estado atual
+        fields = ENTITIES[entity]["fields"]
+        key_fields = ENTITIES[entity]["key"]
+        current = _cached(entity).by_key
+        new = {_row_key(key_fields, r): r for r in rows}
+        upserts = [r for k, r in new.items()
+                   if k not in current or _stored(fields, current[k]) != _stored(fields, r)]
+        deletes = [k for k in current if k not in new]
+        apply_changes(entity, upserts, deletes)
+        return
     path = _get_path(entity)
     fields = ENTITIES[entity]["fields"]
-    with open(path, "w", newline='', encoding='utf-8') as f:
-        writer = csv.DictWriter(f, fieldnames=fields)
-        writer.writeheader()
-        for r in rows:
-            # garantir todas as chaves
-            row = {k: (str(r.get(k)) if r.get(k) is not None else "") for k in fields}
-            writer.writerow(row)
+    _write_csv(path, fields, rows)
+    _rows_written(entity, len(rows))
+    invalidate(entity)
+
 
+@storage_operation
+def apply_changes(entity: str, upserts: Iterable[Dict] = (), deletes: Iterable[Tuple] = ()) -> int:
+    """Aplica um delta: insere/substitui as linhas `upserts` (pela chave
+    primária) e remove as chaves em `deletes`. Em entidades com diário o custo
+    é proporcional ao número de alterações. Retorna o nº de alterações."""
+    backend = _sqlite()
+    if backend:
+        n = backend.apply_changes(entity, upserts, deletes)
+        _rows_written(entity, n)
+        return n
+    fields = ENTITIES[entity]["fields"]
+    key_fields = ENTITIES[entity].get("key")
+    if not key_fields:
+        raise ValueError(f"Entidade sem chave primária: {entity}")
+    upserts = list(upserts)
+    deletes = [k if isinstance(k, tuple) else (k,) for k in deletes]
+    if not upserts and not deletes:
+        return 0
 
+    jpath = _journal_path(entity)
+    if not jpath:
+        # ler e regravar sob a trava: linhas gravadas por outro processo no
+        # meio tempo (ex.: `append` da API) não se perdem
+        with _file_lock(_get_path(entity)):
+            state = {_row_key(key_fields, r): r for r in load_all(entity)}
+            for k in deletes:
+                state.pop(tuple(_normalize(f, v) for f, v in zip(key_fields, k)), None)
+            for r in upserts:
+                state[_row_key(key_fields, r)] = r
+            save_all(entity, list(state.values()))
+        return len(upserts) + len(deletes)
+
+    journal_fields = ["op"] + fields
+    path = _get_path(entity)
+    stored = [_stored(fields, r) for r in upserts]
+    with _file_lock(path):
+        before = _stamp(path) + _stamp(jpath)
+        exists = os.path.exists(jpath)
+        with open(jpath, "a", newline='', encoding='utf-8') as f:
+            writer = csv.DictWriter(f, fieldnames=journal_fields)
+            if not exists:
+                writer.writeheader()
+            for k in deletes:
+                writer.writerow(dict(zip(key_fields, k), op="D"))
+            for r in stored:
+                writer.writerow(dict(r, op="U"))
+        after = _stamp(path) + _stamp(jpath)
+        with _cache_lock:
+            entry = _cache.get(entity)
+            if entry is not None and entry.stamp == before:
+                # ninguém gravou desde a última leitura: corrigir o cache com o
+                # delta em vez de reler snapshot + diário
+                keys = [tuple(_normalize(f, v) for f, v in zip(key_fields, k)) for k in deletes]
+                entry = _cache[entity] = entry.patched(stored, keys, after, len(deletes) + len(stored))
+            else:
+                _cache.pop(entity, None)
+                entry = None
+    _rows_written(entity, len(upserts) + len(deletes))
+
+    limit = getattr(config, "JOURNAL_COMPACT_LINES", 5000)
+    if (entry or _cached(entity)).journal_lines >= limit:
+        compact(entity)
+    return len(upserts) + len(deletes)
+
+
+@storage_operation
+def compact(entity: str) -> None:
+    """Incorpora o diário ao arquivo principal e o esvazia."""
+    jpath = _journal_path(entity)
+    if not jpath:
+        return
+    path = _get_path(entity)
+    with _file_lock(path):
+        entry = _cached(entity)
+        rows = entry.rows
+        _write_csv(path, ENTITIES[entity]["fields"], rows)
+        _rows_written(entity, len(rows))
+        # o snapshot já contém o diário: reaplicá-lo seria idempotente
+        if os.path.exists(jpath):
+            os.remove(jpath)
+        # as linhas em cache continuam valendo para o novo snapshot
+        with _cache_lock:
+            if _cache.get(entity) is entry:
+                entry = _cache[entity] = copy.copy(entry)
+                entry.stamp = _stamp(path) + _stamp(jpath)
+                entry.journal_lines = 0
+
+
+@storage_operation
 def append(entity: str, data: Dict[str, str]) -> None:
+    backend = _sqlite()
+    if backend:
+        _rows_written(entity, 1)
+        return backend.append(entity, data)
+    if _journal_path(entity):
+        apply_changes(entity, [data])
+        return
     path = _get_path(entity)
     fields = ENTITIES[entity]["fields"]
-    exists = os.path.exists(path)
-    with open(path, "a", newline='', encoding='utf-8') as f:
-        writer = csv.DictWriter(f, fieldnames=fields)
-        if not exists:
-            writer.writeheader()
-        row = {k: (str(data.get(k)) if data.get(k) is not None else "") for k in fields}
-        writer.writerow(row)
+    with _file_lock(path):
+        exists = os.path.exists(path)
+        if exists and _header(path) != fields:
+            # cabeçalho antigo (campos acrescentados depois): regravar no formato atual
+            save_all(entity, load_all(entity) + [data])
+            return
+        with open(path, "a", newline='', encoding='utf-8') as f:
+            writer = csv.DictWriter(f, fieldnames=fields)
+            if not exists:
+                writer.writeheader()
+            row = {k: (str(data.get(k)) if data.get(k) is not None else "") for k in fields}
+            writer.writerow(row)
+    _rows_written(entity, 1)
+    invalidate(entity)
 
 
-def next_id(entity: str, id_field: str) -> int:
+@storage_operation
+def update(entity: str, key: Union[str, int, Tuple], values: Dict[str, str]) -> bool:
+    """Altera os campos `values` das linhas com a chave primária `key`.
+    No SQLite é um único UPDATE indexado; em entidades com diário é uma
+    entrada no diário; nos demais CSVs o arquivo é regravado.
+    Retorna True se alguma linha foi alterada."""
+    backend = _sqlite()
+    if backend:
+        changed = backend.update(entity, key, values)
+        _rows_written(entity, 1 if changed else 0)
+        return changed
+    key_fields = ENTITIES[entity].get("key")
+    if not key_fields:
+        raise ValueError(f"Entidade sem chave primária: {entity}")
+    if _journal_path(entity):
+        row = get_by_key(entity, key)
+        if row is None:
+            return False
+        row.update(values)
+        apply_changes(entity, [row])
+        return True
+    keys = key if isinstance(key, tuple) else (key,)
+    wanted = tuple(_normalize(f, v) for f, v in zip(key_fields, keys))
     rows = load_all(entity)
-    max_id = 0
+    changed = False
     for r in rows:
+        if tuple(_normalize(f, r.get(f)) for f in key_fields) == wanted:
+            r.update(values)
+            changed = True
+    if changed:
+        save_all(entity, rows)
+    return changed
+
+
+def _max_id(entity: str, id_field: str) -> int:
+    max_id = 0
+    for r in load_all(entity):
         try:
             v = int(r.get(id_field) or 0)
             if v > max_id:
                 max_id = v
         except Exception:
             continue
-    return max_id + 1
+    return max_id
+
+
+@storage_operation
+def reserve_ids(entity: str, id_field: str, count: int = 1) -> range:
+    """Reserva `count` IDs consecutivos da sequência da entidade.
+
+    A sequência fica em `<entidade>.<campo>.seq` (ou na tabela de sequências
+    do SQLite) e é protegida por trava entre processos, então Flask,
+    Streamlit e scripts nunca recebem o mesmo ID. Só na criação da sequência
+    o arquivo da entidade é percorrido para achar o maior ID existente."""
+    if count < 1:
+        return range(0)
+    backend = _sqlite()
+    if backend:
+        return backend.reserve_ids(entity, id_field, count)
+    _get_path(entity)
+    seq_path = os.path.join(BASE_DIR, f"{entity}.{id_field}.seq")
+    with _file_lock(seq_path):
+        last = None
+        try:
+            with open(seq_path, encoding='utf-8') as f:
+                last = int(f.read().strip())
+        except (FileNotFoundError, ValueError):
+            last = _max_id(entity, id_field)
+        start = last + 1
+        tmp = f"{seq_path}.{os.getpid()}.tmp"
+        with open(tmp, "w", encoding='utf-8') as f:
+            f.write(str(last + count))
+        os.replace(tmp, seq_path)
+    return range(start, start + count)
+
+
+def next_id(entity: str, id_field: str) -> int:
+    return reserve_ids(entity, id_field, 1)[0]
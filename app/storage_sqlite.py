@@ -0,0 +1,300 @@
+"""
+Backend SQLite com o mesmo contrato de `app.storage`
+(load_all/save_all/append/next_id/reserve_ids, além de get_by_key/find_by/update/apply_changes/version).
+
+Cada entidade de `storage.ENTITIES` vira uma tabela com colunas TEXT (os
+valores continuam strings, como nos CSVs) e índices na chave primária e nos
+índices secundários declarados. O banco usa WAL, então leitores (Flask,
+Streamlit, cron) não bloqueiam uns aos outros nem o escritor.
+
+Migração única dos CSVs existentes:
+
+    python -m app.storage_sqlite migrate [--overwrite]
+"""
+import argparse
+import os
+import sqlite3
+import threading
+from typing import Dict, Iterable, List, Optional, Tuple, Union
+
+import config
+from . import mac, storage
+
+_local = threading.local()
+_schema_lock = threading.Lock()
+_schema_ready = set()
+
+
+def _db_path() -> str:
+    return getattr(config, 'SQLITE_PATH', os.path.join(storage.BASE_DIR, 'ogmr.sqlite3'))
+
+
+def _expr(field: str) -> str:
+    # MACs são comparadas normalizadas (como no backend CSV); índice por expressão
+    return f'UPPER(TRIM("{field}"))' if field == 'mac' else f'"{field}"'
+
+
+def _value(field: str, value) -> str:
+    if field == 'mac':
+        return mac.normalize(value)
+    return "" if value is None else str(value)
+
+
+def _values(fields, r: Dict) -> Tuple[str, ...]:
+    # MACs gravadas já na forma canônica, que é a usada nas consultas
+    return tuple(_value(f, r.get(f)) if r.get(f) is not None else "" for f in fields)
+
+
+def _connect() -> sqlite3.Connection:
+    path = _db_path()
+    conn = getattr(_local, 'conn', None)
+    if conn is not None and getattr(_local, 'path', None) == path:
+        return conn
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    conn = sqlite3.connect(path, timeout=30, isolation_level=None)
+    conn.row_factory = sqlite3.Row
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('PRAGMA synchronous=NORMAL')
+    conn.execute('PRAGMA busy_timeout=30000')
+    _local.conn = conn
+    _local.path = path
+    return conn
+
+
+def _ensure_schema(conn: sqlite3.Connection, entity: str) -> None:
+    key = (_db_path(), entity)
+    if key in _schema_ready:
+        return
+    with _schema_lock:
+        if key in _schema_ready:
+            return
+        spec = storage.ENTITIES[entity]
+        cols = ", ".join(f'"{f}" TEXT NOT NULL DEFAULT \'\'' for f in spec['fields'])
+        conn.execute(f'CREATE TABLE IF NOT EXISTS "{entity}" ({cols})')
+        # colunas acrescentadas ao ENTITIES depois da criação da tabela
+        existing = {r['name'] for r in conn.execute(f'PRAGMA table_info("{entity}")')}
+        for f in spec['fields']:
+            if f not in existing:
+                conn.execute(f'ALTER TABLE "{entity}" ADD COLUMN "{f}" TEXT NOT NULL DEFAULT \'\'')
+        indexes = ([spec['key']] if spec.get('key') else []) + list(spec.get('indexes', []))
+        for fields in indexes:
+            name = f"ix_{entity}_{'_'.join(fields)}"
+            exprs = ", ".join(_expr(f) for f in fields)
+            conn.execute(f'CREATE INDEX IF NOT EXISTS "{name}" ON "{entity}" ({exprs})')
+        # contador de gravações por entidade (storage.version)
+        conn.execute('CREATE TABLE IF NOT EXISTS "_versions" (entity TEXT PRIMARY KEY, version INTEGER NOT NULL)')
+        _schema_ready.add(key)
+
+
+def _conn(entity: str) -> sqlite3.Connection:
+    if entity not in storage.ENTITIES:
+        raise ValueError(f"Entidade desconhecida: {entity}")
+    conn = _connect()
+    _ensure_schema(conn, entity)
+    return conn
+
+
+def _row(r: sqlite3.Row) -> Dict[str, str]:
+    return {k: r[k] for k in r.keys()}
+
+
+def _where(fields) -> str:
+    return " AND ".join(f"{_expr(f)} = ?" for f in fields)
+
+
+def _bump(conn: sqlite3.Connection, entity: str) -> None:
+    # na mesma transação da gravação: quem vê a versão nova vê os dados novos
+    conn.execute('INSERT INTO "_versions" (entity, version) VALUES (?, 1) '
+                 'ON CONFLICT(entity) DO UPDATE SET version = version + 1', (entity,))
+
+
+def version(entity: str) -> str:
+    r = _conn(entity).execute('SELECT version FROM "_versions" WHERE entity = ?', (entity,)).fetchone()
+    return str(r[0] if r is not None else 0)
+
+
+def load_all(entity: str) -> List[Dict[str, str]]:
+    fields = storage.ENTITIES[entity]['fields']
+    cols = ", ".join(f'"{f}"' for f in fields)
+    return [_row(r) for r in _conn(entity).execute(f'SELECT {cols} FROM "{entity}" ORDER BY rowid')]
+
+
+def save_all(entity: str, rows: List[Dict[str, str]]) -> None:
+    conn = _conn(entity)
+    fields = storage.ENTITIES[entity]['fields']
+    cols = ", ".join(f'"{f}"' for f in fields)
+    marks = ", ".join("?" for _ in fields)
+    data = [_values(fields, r) for r in rows]
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        conn.execute(f'DELETE FROM "{entity}"')
+        conn.executemany(f'INSERT INTO "{entity}" ({cols}) VALUES ({marks})', data)
+        _bump(conn, entity)
+        conn.execute('COMMIT')
+    except Exception:
+        conn.execute('ROLLBACK')
+        raise
+
+
+def append(entity: str, data: Dict[str, str]) -> None:
+    conn = _conn(entity)
+    fields = storage.ENTITIES[entity]['fields']
+    cols = ", ".join(f'"{f}"' for f in fields)
+    marks = ", ".join("?" for _ in fields)
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        conn.execute(f'INSERT INTO "{entity}" ({cols}) VALUES ({marks})',
+                     _values(fields, data))
+        _bump(conn, entity)
+        conn.execute('COMMIT')
+    except Exception:
+        conn.execute('ROLLBACK')
+        raise
+
+
+def reserve_ids(entity: str, id_field: str, count: int = 1) -> range:
+    """Reserva `count` IDs consecutivos na tabela `_sequences` (transação
+    IMMEDIATE: seguro entre processos)."""
+    conn = _conn(entity)
+    conn.execute('CREATE TABLE IF NOT EXISTS "_sequences" (name TEXT PRIMARY KEY, value INTEGER NOT NULL)')
+    name = f"{entity}.{id_field}"
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        row = conn.execute('SELECT value FROM "_sequences" WHERE name = ?', (name,)).fetchone()
+        if row is None:
+            row = conn.execute(f'SELECT MAX(CAST("{id_field}" AS INTEGER)) FROM "{entity}"').fetchone()
+        last = int(row[0] or 0)
+        conn.execute('INSERT OR REPLACE INTO "_sequences" (name, value) VALUES (?, ?)', (name, last + count))
+        conn.execute('COMMIT')
+    except Exception:
+        conn.execute('ROLLBACK')
+        raise
+    return range(last + 1, last + 1 + count)
+
+
+def next_id(entity: str, id_field: str) -> int:
+    return reserve_ids(entity, id_field, 1)[0]
+
+
+def get_by_key(entity: str, key: Union[str, int, Tuple]) -> Optional[Dict[str, str]]:
+    key_fields = storage.ENTITIES[entity].get('key')
+    if not key_fields:
+        raise ValueError(f"Entidade sem chave primária: {entity}")
+    values = key if isinstance(key, tuple) else (key,)
+    r = _conn(entity).execute(
+        f'SELECT * FROM "{entity}" WHERE {_where(key_fields)} ORDER BY rowid DESC LIMIT 1',
+        tuple(_value(f, v) for f, v in zip(key_fields, values)),
+    ).fetchone()
+    return _row(r) if r is not None else None
+
+
+def find_by(entity: str, **criteria) -> List[Dict[str, str]]:
+    if not criteria:
+        return load_all(entity)
+    fields = list(criteria)
+    return [_row(r) for r in _conn(entity).execute(
+        f'SELECT * FROM "{entity}" WHERE {_where(fields)} ORDER BY rowid',
+        tuple(_value(f, criteria[f]) for f in fields),
+    )]
+
+
+def update(entity: str, key: Union[str, int, Tuple], values: Dict[str, str]) -> bool:
+    """UPDATE indexado das linhas com a chave primária `key`."""
+    key_fields = storage.ENTITIES[entity].get('key')
+    if not key_fields:
+        raise ValueError(f"Entidade sem chave primária: {entity}")
+    fields = [f for f in values if f in storage.ENTITIES[entity]['fields']]
+    if not fields:
+        return False
+    keys = key if isinstance(key, tuple) else (key,)
+    sets = ", ".join(f'"{f}" = ?' for f in fields)
+    params = _values(fields, values)
+    params += tuple(_value(f, v) for f, v in zip(key_fields, keys))
+    conn = _conn(entity)
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        cur = conn.execute(f'UPDATE "{entity}" SET {sets} WHERE {_where(key_fields)}', params)
+        if cur.rowcount > 0:
+            _bump(conn, entity)
+        conn.execute('COMMIT')
+    except Exception:
+        conn.execute('ROLLBACK')
+        raise
+    return cur.rowcount > 0
+
+
+def apply_changes(entity: str, upserts: Iterable[Dict] = (), deletes: Iterable[Tuple] = ()) -> int:
+    """Aplica um delta (substitui/insere pela chave primária e remove chaves)
+    em uma única transação."""
+    key_fields = storage.ENTITIES[entity].get('key')
+    if not key_fields:
+        raise ValueError(f"Entidade sem chave primária: {entity}")
+    fields = storage.ENTITIES[entity]['fields']
+    cols = ", ".join(f'"{f}"' for f in fields)
+    marks = ", ".join("?" for _ in fields)
+    where = _where(key_fields)
+    n = 0
+    conn = _conn(entity)
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        for k in deletes:
+            k = k if isinstance(k, tuple) else (k,)
+            conn.execute(f'DELETE FROM "{entity}" WHERE {where}', tuple(_value(f, v) for f, v in zip(key_fields, k)))
+            n += 1
+        for r in upserts:
+            values = _values(fields, r)
+            key = tuple(_value(f, r.get(f)) for f in key_fields)
+            sets = ", ".join(f'"{f}" = ?' for f in fields)
+            cur = conn.execute(f'UPDATE "{entity}" SET {sets} WHERE {where}', values + key)
+            if cur.rowcount == 0:
+                conn.execute(f'INSERT INTO "{entity}" ({cols}) VALUES ({marks})', values)
+            n += 1
+        if n:
+            _bump(conn, entity)
+        conn.execute('COMMIT')
+    except Exception:
+        conn.execute('ROLLBACK')
+        raise
+    return n
+
+
+def migrate_from_csv(csv_dir: Optional[str] = None, overwrite: bool = False) -> Dict[str, int]:
+    """Importa `app/data/*.csv` para o banco. Tabelas que já têm dados são
+    mantidas, a menos que `overwrite` seja verdadeiro. Retorna linhas importadas por entidade."""
+    csv_dir = csv_dir or storage.BASE_DIR
+    imported = {}
+    for entity, spec in storage.ENTITIES.items():
+        path = os.path.join(csv_dir, spec['file'])
+        if not os.path.exists(path):
+            continue
+        conn = _conn(entity)
+        has_rows = conn.execute(f'SELECT 1 FROM "{entity}" LIMIT 1').fetchone() is not None
+        if has_rows and not overwrite:
+            continue
+        with open(path, newline='', encoding='utf-8') as f:
+            rows = storage._read_csv(f)
+        jname = spec.get('journal')
+        if jname and os.path.exists(os.path.join(csv_dir, jname)):
+            rows, _ = storage._replay(entity, rows, os.path.join(csv_dir, jname))
+        save_all(entity, rows)
+        imported[entity] = len(rows)
+    return imported
+
+
+def main():
+    p = argparse.ArgumentParser(description="Backend SQLite do OGMR")
+    sub = p.add_subparsers(dest="cmd", required=True)
+    mig = sub.add_parser("migrate", help="importa os CSVs de app/data para o SQLite")
+    mig.add_argument("--csv-dir", default=None, help="diretório dos CSVs (padrão: app/data)")
+    mig.add_argument("--overwrite", action="store_true", help="substitui tabelas que já têm dados")
+    args = p.parse_args()
+
+    if args.cmd == "migrate":
+        imported = migrate_from_csv(args.csv_dir, args.overwrite)
+        for entity, n in imported.items():
+            print(f"{entity}: {n} linhas")
+        print(f"Banco: {_db_path()}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,351 @@
+"""
+Sincronização de `maquinas_conectadas_switch` com o estado real dos switches.
+
+O ciclo completo (`run_cycle`) é executado pelo processo `run_poller.py`, que
+publica o resultado em `config.POLLER_STATE_FILE`; a interface só lê o estado
+publicado. O ciclo é incremental: só switches com mudanças desde a coleta
+anterior (ver `app.changes`) têm conexões e `status_portas` regravados.
+
+Switches cujos marcadores de mudança (sysUpTime, ifTableLastChange, FDB)
+não mudaram reaproveitam a coleta anterior (ver `poller.PollGate`).
+
+Por switch são feitas apenas duas consultas: um walk da FDB e um walk de
+ifAdminStatus. O cruzamento com as máquinas conhecidas é feito em memória
+usando um índice MAC -> máquina montado a partir de `maquinas.csv`, de modo
+que o número de consultas SNMP cresce com o número de switches e não com
+switches × máquinas.
+"""
+import json
+import os
+import time
+from dataclasses import dataclass, field
+from datetime import datetime
+from functools import partial
+from typing import Dict, List, Optional, Tuple
+
+import config
+from . import jobs, metrics, poller, profiling, storage
+from .changes import FleetTracker, bus
+from .mac import MAC, index as mac_index_of
+from .poller import map_switches
+from .snmp import manager_for_switch
+
+
+@dataclass
+class SwitchPorts:
+    id_switch: str
+    ip: str
+    fdb: Dict[MAC, int] = field(default_factory=dict)
+    admin: Dict[int, object] = field(default_factory=dict)
+    errors: List[str] = field(default_factory=list)
+
+
+def admin_is_up(admin) -> bool:
+    """Interpreta ifAdminStatus (1 ou 'up') como porta habilitada."""
+    if admin is None:
+        return False
+    return str(admin) == '1' or str(admin).lower().startswith('up')
+
+
+def mac_index(maquinas: List[dict]) -> Dict[MAC, dict]:
+    """Índice MAC -> máquina."""
+    return mac_index_of(maquinas)
+
+
+def collect_switch_ports(sw: dict) -> SwitchPorts:
+    """Lê a FDB (MAC -> porta) e o ifAdminStatus de um switch."""
+    ip = sw.get('ip')
+    id_switch = sw.get('id_switch')
+    res = SwitchPorts(id_switch=id_switch, ip=ip)
+    try:
+        snmp = manager_for_switch(sw)
+    except Exception as e:
+        res.errors.append(f"Falha conectar switch {id_switch} ({ip}): {e}")
+        return res
+
+    try:
+        res.fdb = snmp.get_fdb()
+    except Exception as e:
+        res.errors.append(f"Falha ao ler FDB do switch {id_switch} ({ip}): {e}")
+        return res
+
+    try:
+        res.admin = snmp.get_admin_status()
+    except Exception as e:
+        res.errors.append(f"Falha ao ler ifAdminStatus do switch {id_switch} ({ip}): {e}")
+    return res
+
+
+def ports_from_poll(res: poller.SwitchPollResult) -> SwitchPorts:
+    """FDB e ifAdminStatus a partir de uma coleta completa do poller."""
+    sp = SwitchPorts(id_switch=res.id_switch, ip=res.ip, errors=list(res.errors))
+    for port, macs in (res.macs_by_port or {}).items():
+        for mac in macs:
+            mac = MAC.parse(mac)
+            if mac is not None:
+                sp.fdb[mac] = port
+    sp.admin = {s.get('port'): s.get('administrative') for s in res.statuses}
+    return sp
+
+
+def join_conexoes(collected: List[SwitchPorts], maquinas: List[dict], conexoes: List[dict]) -> Tuple[int, int, List[dict]]:
+    """Atualiza `conexoes` (in-place) a partir das FDBs coletadas.
+    Retorna (atualizadas, adicionadas, linhas efetivamente alteradas)."""
+    by_mac = mac_index(maquinas)
+    conex_idx = {(str(c.get('id_maquina')), str(c.get('id_switch'))): c for c in conexoes}
+    updated = 0
+    added = 0
+    changed = []
+    for sp in collected:
+        for mac, port in sp.fdb.items():
+            m = by_mac.get(mac)
+            if m is None or not port:
+                continue
+            status = 'True' if admin_is_up(sp.admin.get(port)) else 'False'
+            key = (str(m.get('id_maquina')), str(sp.id_switch))
+            reg = conex_idx.get(key)
+            if reg is not None:
+                if reg.get('porta') != str(port) or reg.get('status') != status:
+                    changed.append(reg)
+                reg['porta'] = str(port)
+                reg['status'] = status
+                updated += 1
+            else:
+                reg = {'id_maquina': m.get('id_maquina'), 'id_switch': sp.id_switch, 'status': status, 'porta': str(port)}
+                conexoes.append(reg)
+                conex_idx[key] = reg
+                changed.append(reg)
+                added += 1
+    return updated, added, changed
+
+
+@profiling.profiled()
+def auto_sync_switches(max_workers: Optional[int] = None) -> Tuple[int, int, List[str]]:
+    """Sincroniza `maquinas_conectadas_switch` consultando todos os switches
+    em paralelo. Retorna (atualizadas, adicionadas, erros)."""
+    switches = storage.load_all('switches')
+    maquinas = storage.load_all('maquinas')
+    conexoes = storage.load_all('maquinas_conectadas_switch')
+
+    collected = map_switches(collect_switch_ports, switches, max_workers)
+    errors = [err for sp in collected for err in sp.errors]
+    updated, added, _ = join_conexoes(collected, maquinas, conexoes)
+
+    try:
+        storage.save_all('maquinas_conectadas_switch', conexoes)
+    except Exception as e:
+        errors.append(f"Falha ao salvar conexões: {e}")
+    return updated, added, errors
+
+
+@profiling.profiled()
+def generate_status_portas(max_workers: Optional[int] = None) -> Tuple[int, List[str], dict]:
+    """Consulta todos os switches em paralelo e grava `status_portas` de uma
+    vez. Retorna (linhas gravadas, erros, resumo da coleta)."""
+    results = poller.poll_switches(storage.load_all('switches'), max_workers)
+    errors = [err for res in results for err in res.errors]
+
+    # máquinas conhecidas e conexões pré-existentes mantêm portas mesmo sem MAC aprendida
+    rows = poller.build_status_rows(
+        results,
+        storage.load_all('maquinas'),
+        storage.load_all('maquinas_conectadas_switch'),
+    )
+    try:
+        storage.save_all('status_portas', rows)
+    except Exception as e:
+        errors.append(f"Falha gravar snapshots (save_all) para status_portas: {e}")
+    return len(rows), errors, poller.summarize(results)
+
+
+@profiling.profiled()
+def sync_csvs_from_status_portas() -> dict:
+    """Garante máquina e conexão para cada MAC presente em `status_portas`."""
+    # montar mapa mac -> registro (estado atual por switch+port, campo 'mac' único)
+    mac_map = {}
+    for rec in storage.load_all('status_portas'):
+        mac_val = MAC.parse(rec.get('mac'))
+        if mac_val is not None:
+            mac_map[mac_val] = rec
+
+    maquinas = storage.load_all('maquinas')
+    conexoes = storage.load_all('maquinas_conectadas_switch')
+    by_mac = mac_index(maquinas)
+    conex_idx = {(str(c.get('id_maquina')), str(c.get('id_switch'))): c for c in conexoes}
+    errors = []
+
+    # reservar de uma vez os IDs das máquinas novas (sequência persistente)
+    new_macs = [mac for mac in mac_map if mac not in by_mac]
+    new_ids = iter(storage.reserve_ids('maquinas', 'id_maquina', len(new_macs)))
+    for mac in new_macs:
+        machine = {'id_maquina': str(next(new_ids)), 'nome': '', 'ip': '', 'tipo_maquina': '', 'id_sala': '', 'mac': str(mac), 'access_allowed': 'True'}
+        maquinas.append(machine)
+        by_mac[mac] = machine
+
+    modified_conex = False
+    for mac, rec in mac_map.items():
+        machine = by_mac[mac]
+        status = 'True' if admin_is_up(rec.get('administrative')) else 'False'
+        key = (str(machine.get('id_maquina')), str(rec.get('id_switch')))
+        reg = conex_idx.get(key)
+        if reg is None:
+            reg = {'id_maquina': machine.get('id_maquina'), 'id_switch': rec.get('id_switch')}
+            conexoes.append(reg)
+            conex_idx[key] = reg
+        if reg.get('porta') != str(rec.get('port')) or reg.get('status') != status:
+            reg['porta'] = str(rec.get('port'))
+            reg['status'] = status
+            modified_conex = True
+
+    if new_macs:
+        try:
+            storage.save_all('maquinas', maquinas)
+        except Exception as e:
+            errors.append(f"Falha ao salvar maquinas: {e}")
+    if modified_conex:
+        try:
+            storage.save_all('maquinas_conectadas_switch', conexoes)
+        except Exception as e:
+            errors.append(f"Falha ao salvar conexões: {e}")
+
+    return {'maquinas_added': bool(new_macs), 'conex_updated': modified_conex, 'errors': errors}
+
+
+def _state_path() -> str:
+    return getattr(config, 'POLLER_STATE_FILE', os.path.join(storage.BASE_DIR, 'poller_state.json'))
+
+
+def publish_state(state: dict) -> None:
+    """Grava o estado publicado pelo poller (arquivo JSON, troca atômica)."""
+    path = _state_path()
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w", encoding='utf-8') as f:
+        json.dump(state, f, ensure_ascii=False)
+    os.replace(tmp, path)
+
+
+def read_state() -> Optional[dict]:
+    """Último estado publicado pelo poller (ou None se nunca rodou)."""
+    try:
+        with open(_state_path(), encoding='utf-8') as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+@profiling.profiled()
+def write_status_delta(results: List[poller.SwitchPollResult], maquinas: List[dict], conexoes: List[dict]) -> int:
+    """Regrava em `status_portas` apenas as linhas que mudaram nos switches
+    de `results`. Retorna o número de linhas gravadas/removidas."""
+    rows = poller.build_status_rows(results, maquinas, conexoes)
+    fields = storage.ENTITIES['status_portas']['fields']
+    existing = {}
+    for res in results:
+        for r in storage.find_by('status_portas', id_switch=res.id_switch):
+            existing[(str(r.get('id_switch')), str(r.get('port')))] = r
+    upserts = []
+    for r in rows:
+        old = existing.pop((str(r['id_switch']), str(r['port'])), None)
+        if old is None or any(str(old.get(f) or '') != str(r.get(f) if r.get(f) is not None else '') for f in fields):
+            upserts.append(r)
+    deletes = list(existing)
+    return storage.apply_changes('status_portas', upserts, deletes)
+
+
+def submit_refresh(switches: List[dict]) -> jobs.Job:
+    """Coleta sob demanda de `switches` em um job assíncrono (uma parte por
+    switch); ao final grava em `status_portas` o que mudou."""
+    parts = {str(sw.get('id_switch')): partial(poller.poll_switch, sw) for sw in switches}
+
+    def finish(results: Dict[str, object]) -> dict:
+        polled = [r for r in results.values() if isinstance(r, poller.SwitchPollResult)]
+        ok = [r for r in polled if r.ok]
+        written = 0
+        if ok:
+            written = write_status_delta(ok, storage.load_all('maquinas'),
+                                         storage.load_all('maquinas_conectadas_switch'))
+        return {
+            'gravadas': written,
+            'por_switch': [
+                {'id_switch': i, 'latencia': round(r.latency, 3), 'portas': len(r.statuses), 'erros': r.errors}
+                if isinstance(r, poller.SwitchPollResult) else {'id_switch': i, 'erros': [str(r)]}
+                for i, r in results.items()
+            ],
+        }
+
+    return jobs.submit('atualizacao', parts, finish)
+
+
+# último estado conhecido de cada switch (vive enquanto o processo do poller roda)
+gate = poller.PollGate()
+tracker = FleetTracker()
+_known_macs: Optional[frozenset] = None
+
+
+@profiling.profiled()
+def run_cycle(max_workers: Optional[int] = None) -> dict:
+    """Um ciclo de atualização incremental: coleta todos os switches,
+    calcula o delta em relação à coleta anterior, grava somente o que mudou
+    (conexões e `status_portas`) e publica os eventos de mudança no `bus`.
+    Publica e retorna o estado resultante."""
+    global _known_macs
+    inicio = time.monotonic()
+
+    results = gate.poll(storage.load_all('switches'), max_workers)
+    errors = [err for res in results for err in res.errors]
+    profiling.lap('coleta')
+    events = tracker.update(results)
+    profiling.lap('diff')
+
+    maquinas = storage.load_all('maquinas')
+    known = frozenset(mac_index(maquinas))
+    if known != _known_macs:
+        # cadastro de máquinas mudou: reavaliar todos os switches
+        touched = [r for r in results if r.ok]
+        _known_macs = known
+    else:
+        changed_ids = {e.id_switch for e in events}
+        touched = [r for r in results if r.ok and str(r.id_switch) in changed_ids]
+
+    updated = added = written = 0
+    res = {'maquinas_added': False, 'conex_updated': False, 'errors': []}
+    if touched:
+        conexoes = storage.load_all('maquinas_conectadas_switch')
+        updated, added, changed = join_conexoes([ports_from_poll(r) for r in touched], maquinas, conexoes)
+        profiling.lap('join_conexoes')
+        try:
+            storage.apply_changes('maquinas_conectadas_switch', changed)
+            written = write_status_delta(touched, maquinas, conexoes)
+        except Exception as e:
+            errors.append(f"Falha ao gravar alterações: {e}")
+        res = sync_csvs_from_status_portas()
+        errors.extend(res['errors'])
+
+    bus.publish(events)
+    profiling.lap('eventos')
+
+    state = {
+        'timestamp': time.time(),
+        'updated_at': datetime.now().isoformat(timespec='seconds'),
+        'duration': round(time.monotonic() - inicio, 3),
+        'conexoes_atualizadas': updated,
+        'conexoes_adicionadas': added,
+        'status_portas': written,
+        'maquinas_adicionadas': res['maquinas_added'],
+        'eventos': len(events),
+        'switches_alterados': len(touched),
+        'n_errors': len(errors),
+        'errors': errors[:50],
+        'report': poller.summarize(results),
+    }
+    publish_state(state)
+
+    metrics.REGISTRY.observe(metrics.sync_cycle_seconds, state['duration'])
+    metrics.REGISTRY.inc(metrics.sync_events, len(events))
+    metrics.REGISTRY.inc(metrics.sync_errors, len(errors))
+    metrics.REGISTRY.set(metrics.sync_last_cycle, state['timestamp'])
+    try:
+        metrics.export()
+    except OSError:
+        pass
+    return state
@@ -0,0 +1,420 @@
+"""
+Receptor de traps/informs SNMP (v1 e v2c) para atualização imediata de
+`status_portas`.
+
+Tratados:
+- linkDown/linkUp (ifOperStatus e, se presente, ifAdminStatus da porta);
+- cmnMacChangedNotification (CISCO-MAC-NOTIFICATION-MIB): MAC aprendida em
+  uma porta atualiza a linha da porta e a conexão da máquina.
+
+O switch é identificado pelo IP de origem do pacote (ou, se não houver
+correspondência, pelo agent-addr do trap v1 / snmpTrapAddress.0) em
+`switches.csv`. Informs são confirmados com uma resposta. Cada trap aplicado
+vira `ChangeEvent`s publicados em `app.changes.bus`.
+
+A decodificação BER é mínima e cobre apenas o que os traps usam.
+"""
+import logging
+import socket
+import time
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+import config
+from . import storage
+from .discovery import SwitchDiscovery, get_cache
+from .mac import MAC
+from .changes import (MAC_APPEARED, MAC_DISAPPEARED, PORT_ADMIN, PORT_OPER,
+                      ChangeEvent, bus)
+
+logger = logging.getLogger(__name__)
+
+# tipos BER/SNMP
+INTEGER, OCTET_STRING, NULL, OID, SEQUENCE = 0x02, 0x04, 0x05, 0x06, 0x30
+IP_ADDRESS, COUNTER32, GAUGE32, TIMETICKS, OPAQUE, COUNTER64 = 0x40, 0x41, 0x42, 0x43, 0x44, 0x46
+GET_RESPONSE, TRAP_V1, INFORM, TRAP_V2 = 0xA2, 0xA4, 0xA6, 0xA7
+
+SNMP_TRAP_OID = '.1.3.6.1.6.3.1.1.4.1.0'
+SNMP_TRAP_ADDRESS = '.1.3.6.1.6.3.18.1.3.0'
+SYS_UPTIME = '.1.3.6.1.2.1.1.3.0'
+LINK_DOWN = '.1.3.6.1.6.3.1.1.5.3'
+LINK_UP = '.1.3.6.1.6.3.1.1.5.4'
+IF_INDEX = '.1.3.6.1.2.1.2.2.1.1'
+IF_ADMIN = '.1.3.6.1.2.1.2.2.1.7'
+IF_OPER = '.1.3.6.1.2.1.2.2.1.8'
+CMN_MAC_CHANGED = '.1.3.6.1.4.1.9.9.215.2.0.1'
+CMN_HIST_MSG = '.1.3.6.1.4.1.9.9.215.1.1.8.1.2'
+
+
+# --- BER ------------------------------------------------------------------
+
+def _tlv(data: bytes, pos: int) -> Tuple[int, bytes, int]:
+    """Lê um TLV em `pos`. Retorna (tag, conteúdo, posição seguinte)."""
+    if pos + 2 > len(data):
+        raise ValueError("TLV truncado")
+    tag = data[pos]
+    length = data[pos + 1]
+    pos += 2
+    if length & 0x80:
+        n = length & 0x7F
+        if n == 0 or n > 4 or pos + n > len(data):
+            raise ValueError("comprimento BER inválido")
+        length = int.from_bytes(data[pos:pos + n], 'big')
+        pos += n
+    if pos + length > len(data):
+        raise ValueError("TLV truncado")
+    return tag, data[pos:pos + length], pos + length
+
+
+def _children(content: bytes) -> List[Tuple[int, bytes]]:
+    items = []
+    pos = 0
+    while pos < len(content):
+        tag, value, pos = _tlv(content, pos)
+        items.append((tag, value))
+    return items
+
+
+def _decode_oid(raw: bytes) -> str:
+    if not raw:
+        return ''
+    arcs = list(divmod(raw[0], 40)) if raw[0] < 80 else [2, raw[0] - 80]
+    n = 0
+    for b in raw[1:]:
+        n = (n << 7) | (b & 0x7F)
+        if not b & 0x80:
+            arcs.append(n)
+            n = 0
+    return '.' + '.'.join(str(a) for a in arcs)
+
+
+def _expect(item: Tuple[int, bytes], *tags: int):
+    """Valor decodificado de `item`, que deve ter um dos tipos `tags`."""
+    tag, raw = item
+    if tag not in tags:
+        raise ValueError(f"tipo BER inesperado: 0x{tag:02x}")
+    return _decode_value(tag, raw)
+
+
+def _decode_value(tag: int, raw: bytes):
+    if tag == INTEGER:
+        return int.from_bytes(raw, 'big', signed=True)
+    if tag in (COUNTER32, GAUGE32, TIMETICKS, COUNTER64):
+        return int.from_bytes(raw, 'big')
+    if tag == OID:
+        return _decode_oid(raw)
+    if tag == IP_ADDRESS:
+        return '.'.join(str(b) for b in raw)
+    if tag in (OCTET_STRING, OPAQUE):
+        return raw
+    return None
+
+
+def _encode_length(n: int) -> bytes:
+    if n < 0x80:
+        return bytes([n])
+    raw = n.to_bytes((n.bit_length() + 7) // 8, 'big')
+    return bytes([0x80 | len(raw)]) + raw
+
+
+def _encode(tag: int, content: bytes) -> bytes:
+    return bytes([tag]) + _encode_length(len(content)) + content
+
+
+def _encode_int(value: int, tag: int = INTEGER) -> bytes:
+    signed = tag == INTEGER
+    size = max(1, (value.bit_length() + 8) // 8) if signed else max(1, (value.bit_length() + 7) // 8)
+    raw = value.to_bytes(size, 'big', signed=signed)
+    if not signed and raw[0] & 0x80:
+        raw = b'\x00' + raw
+    return _encode(tag, raw)
+
+
+def _encode_oid(oid: str) -> bytes:
+    arcs = [int(a) for a in oid.strip('.').split('.')]
+    raw = bytearray([arcs[0] * 40 + arcs[1]])
+    for a in arcs[2:]:
+        chunk = [a & 0x7F]
+        a >>= 7
+        while a:
+            chunk.append(0x80 | (a & 0x7F))
+            a >>= 7
+        raw.extend(reversed(chunk))
+    return _encode(OID, bytes(raw))
+
+
+# --- mensagens --------------------------------------------------------------
+
+@dataclass
+class TrapMessage:
+    version: int
+    community: str
+    pdu_type: int
+    trap_oid: str = ''
+    request_id: int = 0
+    agent_addr: str = ''
+    varbinds: List[Tuple[str, object]] = field(default_factory=list)
+    raw_varbinds: bytes = b''
+
+
+def parse_message(data: bytes) -> TrapMessage:
+    """Decodifica um trap v1, trap v2c ou inform. Levanta ValueError em
+    pacotes malformados ou de outros tipos."""
+    tag, content, _ = _tlv(data, 0)
+    if tag != SEQUENCE:
+        raise ValueError("mensagem SNMP inválida")
+    parts = _children(content)
+    if len(parts) != 3:
+        raise ValueError("mensagem SNMP inválida")
+    version = _expect(parts[0], INTEGER)
+    community = _expect(parts[1], OCTET_STRING).decode('latin-1')
+    pdu_type, pdu = parts[2]
+    fields = _children(pdu)
+
+    msg = TrapMessage(version=version, community=community, pdu_type=pdu_type)
+    if pdu_type == TRAP_V1 and len(fields) == 6:
+        enterprise = _expect(fields[0], OID)
+        msg.agent_addr = _expect(fields[1], IP_ADDRESS)
+        generic = _expect(fields[2], INTEGER)
+        specific = _expect(fields[3], INTEGER)
+        vb_tag, vb_raw = fields[5]
+        # RFC 3584: traps genéricos viram snmpTraps.(generic+1)
+        msg.trap_oid = f".1.3.6.1.6.3.1.1.5.{generic + 1}" if 0 <= generic < 6 else f"{enterprise}.0.{specific}"
+    elif pdu_type in (TRAP_V2, INFORM) and len(fields) == 4:
+        msg.request_id = _expect(fields[0], INTEGER)
+        vb_tag, vb_raw = fields[3]
+    else:
+        raise ValueError(f"PDU não suportada: 0x{pdu_type:02x}")
+    if vb_tag != SEQUENCE:
+        raise ValueError("lista de variáveis inválida")
+
+    msg.raw_varbinds = _encode(vb_tag, vb_raw)
+    for _, vb in _children(vb_raw):
+        items = _children(vb)
+        if len(items) != 2 or items[0][0] != OID:
+            continue
+        oid = _decode_oid(items[0][1])
+        if oid == SNMP_TRAP_OID:
+            msg.trap_oid = value = _expect(items[1], OID)
+        elif oid == SNMP_TRAP_ADDRESS:
+            value = _expect(items[1], IP_ADDRESS)
+            msg.agent_addr = msg.agent_addr or value
+        else:
+            value = _decode_value(*items[1])
+        msg.varbinds.append((oid, value))
+    return msg
+
+
+def inform_response(msg: TrapMessage) -> bytes:
+    """Resposta (GetResponse) que confirma um inform."""
+    pdu = _encode_int(msg.request_id) + _encode_int(0) + _encode_int(0) + msg.raw_varbinds
+    body = _encode_int(msg.version) + _encode(OCTET_STRING, msg.community.encode('latin-1')) + _encode(GET_RESPONSE, pdu)
+    return _encode(SEQUENCE, body)
+
+
+def build_link_trap(if_index: int, up: bool, community: str = 'public', agent_addr: str = '',
+                    inform: bool = False, request_id: int = 1) -> bytes:
+    """Monta um linkUp/linkDown v2c (ou inform), usado em testes."""
+    status = 1 if up else 2
+    varbinds = [
+        (SYS_UPTIME, _encode_int(int(time.monotonic() * 100) & 0xFFFFFFFF, TIMETICKS)),
+        (SNMP_TRAP_OID, _encode_oid(LINK_UP if up else LINK_DOWN)),
+        (f"{IF_INDEX}.{if_index}", _encode_int(if_index)),
+        (f"{IF_ADMIN}.{if_index}", _encode_int(1)),
+        (f"{IF_OPER}.{if_index}", _encode_int(status)),
+    ]
+    if agent_addr:
+        varbinds.append((SNMP_TRAP_ADDRESS, _encode(IP_ADDRESS, socket.inet_aton(agent_addr))))
+    vbs = b''.join(_encode(SEQUENCE, _encode_oid(oid) + value) for oid, value in varbinds)
+    pdu = _encode_int(request_id) + _encode_int(0) + _encode_int(0) + _encode(SEQUENCE, vbs)
+    body = _encode_int(1) + _encode(OCTET_STRING, community.encode('latin-1')) + _encode(INFORM if inform else TRAP_V2, pdu)
+    return _encode(SEQUENCE, body)
+
+
+def send_test_trap(target: Tuple[str, int], if_index: int, up: bool, community: str = 'public',
+                   agent_addr: str = '', inform: bool = False, timeout: float = 2.0) -> bool:
+    """Envia um linkUp/linkDown para `target`. Em modo inform, espera a
+    confirmação e retorna se ela chegou."""
+    data = build_link_trap(if_index, up, community, agent_addr, inform, request_id=int(time.time()) & 0x7FFFFFFF)
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+        sock.settimeout(timeout)
+        sock.sendto(data, target)
+        if not inform:
+            return True
+        try:
+            reply, _ = sock.recvfrom(65535)
+        except socket.timeout:
+            return False
+    tag, content, _ = _tlv(reply, 0)
+    return tag == SEQUENCE and _children(content)[2][0] == GET_RESPONSE
+
+
+# --- interpretação ----------------------------------------------------------
+
+def _format_mac(raw: bytes) -> str:
+    return str(MAC.from_octets(raw))
+
+
+def trap_events(msg: TrapMessage, id_switch: str, discovery: Optional[SwitchDiscovery] = None) -> List[ChangeEvent]:
+    """Converte um trap em eventos de mudança do switch `id_switch`.
+    linkUp/linkDown trazem o ifIndex; com a descoberta do switch ele é
+    convertido na porta da bridge (interfaces fora da bridge são ignoradas)."""
+    id_switch = str(id_switch)
+    events = []
+    if msg.trap_oid in (LINK_UP, LINK_DOWN):
+        port = None
+        oper = 1 if msg.trap_oid == LINK_UP else 2
+        admin = None
+        for oid, value in msg.varbinds:
+            # valores de outro tipo (ex.: OCTET STRING no lugar de INTEGER) são ignorados
+            if not isinstance(value, int):
+                continue
+            if oid.startswith(IF_INDEX + '.'):
+                port = value
+            elif oid.startswith(IF_OPER + '.'):
+                port = port or int(oid.rsplit('.', 1)[1])
+                oper = value
+            elif oid.startswith(IF_ADMIN + '.'):
+                port = port or int(oid.rsplit('.', 1)[1])
+                admin = value
+        if port and port > 0 and discovery is not None:
+            port = discovery.port_for_ifindex(int(port))
+        if port:
+            events.append(ChangeEvent(PORT_OPER, id_switch, int(port), '', None, str(oper)))
+            if admin is not None:
+                events.append(ChangeEvent(PORT_ADMIN, id_switch, int(port), '', None, str(admin)))
+    elif msg.trap_oid == CMN_MAC_CHANGED:
+        for oid, value in msg.varbinds:
+            if not oid.startswith(CMN_HIST_MSG + '.') or not isinstance(value, bytes):
+                continue
+            # registros de 11 bytes: operação, VLAN (2), MAC (6), dot1dBasePort (2); 0 encerra
+            for i in range(0, len(value) - 10, 11):
+                op = value[i]
+                if op == 0:
+                    break
+                mac = _format_mac(value[i + 3:i + 9])
+                port = int.from_bytes(value[i + 9:i + 11], 'big')
+                if op == 1:
+                    events.append(ChangeEvent(MAC_APPEARED, id_switch, port, mac, None, port))
+                elif op == 2:
+                    events.append(ChangeEvent(MAC_DISAPPEARED, id_switch, port, mac, port, None))
+    return events
+
+
+def apply_events(events: List[ChangeEvent], sw: dict) -> int:
+    """Aplica os eventos de um trap em `status_portas` (e na conexão da
+    máquina, quando uma MAC conhecida muda de porta). Retorna o nº de linhas
+    alteradas. MACs que somem por aging não alteram nada."""
+    id_switch = str(sw.get('id_switch'))
+    rows: Dict[Tuple[str, str], dict] = {}
+    deletes = []
+    conexoes = []
+
+    def row_for(port) -> Optional[dict]:
+        key = (id_switch, str(port))
+        if key not in rows:
+            cur = storage.get_by_key('status_portas', key)
+            if cur is None:
+                return None
+            rows[key] = dict(cur)
+        return rows[key]
+
+    for ev in events:
+        if ev.kind in (PORT_OPER, PORT_ADMIN):
+            row = row_for(ev.port)
+            # só portas acompanhadas (com máquina conhecida) têm linha
+            if row is not None:
+                row['operational' if ev.kind == PORT_OPER else 'administrative'] = ev.new
+        elif ev.kind == MAC_APPEARED:
+            maquinas = storage.find_by('maquinas', mac=ev.mac)
+            if not maquinas:
+                continue
+            previous = [r for r in storage.find_by('status_portas', id_switch=id_switch, mac=ev.mac)
+                        if str(r.get('port')) != str(ev.port)]
+            row = row_for(ev.port)
+            if row is None:
+                # MAC aprendida implica enlace ativo; o restante vem da próxima coleta
+                row = {'id_switch': id_switch, 'switch_ip': sw.get('ip'), 'port': str(ev.port),
+                       'operational': '1', 'administrative': '',
+                       'bridge_mac': previous[0].get('bridge_mac', '') if previous else ''}
+                rows[(id_switch, str(ev.port))] = row
+            row['mac'] = ev.mac
+            deletes.extend((id_switch, str(r.get('port'))) for r in previous)
+            reg = storage.get_by_key('maquinas_conectadas_switch', (maquinas[0].get('id_maquina'), id_switch))
+            if reg is not None and str(reg.get('porta')) != str(ev.port):
+                conexoes.append(dict(reg, porta=str(ev.port)))
+
+    n = storage.apply_changes('status_portas', list(rows.values()), deletes) if rows or deletes else 0
+    if conexoes:
+        storage.apply_changes('maquinas_conectadas_switch', conexoes)
+    return n
+
+
+# --- serviço ----------------------------------------------------------------
+
+class TrapReceiver:
+    """Escuta traps/informs em UDP e aplica cada um assim que chega."""
+
+    def __init__(self, host: Optional[str] = None, port: Optional[int] = None, community: Optional[str] = None,
+                 on_switch_event=None):
+        self.host = host if host is not None else getattr(config, 'TRAP_LISTEN_HOST', '0.0.0.0')
+        self.port = port if port is not None else getattr(config, 'TRAP_PORT', 162)
+        self.community = community if community is not None else getattr(config, 'TRAP_COMMUNITY', '')
+        # chamado com o id_switch após cada trap aplicado (ex.: invalidar a coleta em cache)
+        self.on_switch_event = on_switch_event
+        self.sock: Optional[socket.socket] = None
+
+    def switch_for(self, msg: TrapMessage, source_ip: str) -> Optional[dict]:
+        for ip in (source_ip, msg.agent_addr):
+            if ip:
+                found = storage.find_by('switches', ip=ip)
+                if found:
+                    return found[0]
+        return None
+
+    def handle(self, data: bytes, addr: Tuple[str, int]) -> List[ChangeEvent]:
+        try:
+            msg = parse_message(data)
+        except ValueError as e:
+            logger.debug("Pacote ignorado de %s: %s", addr[0], e)
+            return []
+        if self.community and msg.community != self.community:
+            logger.warning("Trap de %s com community inválida", addr[0])
+            return []
+        if msg.pdu_type == INFORM and self.sock is not None:
+            self.sock.sendto(inform_response(msg), addr)
+
+        sw = self.switch_for(msg, addr[0])
+        if sw is None:
+            logger.warning("Trap de switch desconhecido: %s (agent %s)", addr[0], msg.agent_addr or '-')
+            return []
+        try:
+            events = trap_events(msg, sw.get('id_switch'), get_cache().lookup(sw.get('ip')))
+            if not events:
+                return []
+            n = apply_events(events, sw)
+        except Exception:
+            logger.exception("Falha ao aplicar trap do switch %s", sw.get('id_switch'))
+            return []
+        logger.info("Trap %s do switch %s: %d eventos, %d linhas", msg.trap_oid, sw.get('id_switch'), len(events), n)
+        if self.on_switch_event is not None:
+            self.on_switch_event(sw.get('id_switch'))
+        bus.publish(events)
+        return events
+
+    def serve_forever(self) -> None:
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.sock.bind((self.host, self.port))
+        logger.info("Recebendo traps em %s:%d", self.host, self.port)
+        try:
+            while True:
+                data, addr = self.sock.recvfrom(65535)
+                try:
+                    self.handle(data, addr)
+                except Exception:
+                    # um pacote inesperado não pode derrubar o receptor
+                    logger.exception("Falha ao tratar pacote de %s", addr[0])
+        finally:
+            self.sock.close()
+            self.sock = None
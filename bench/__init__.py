@@ -0,0 +1 @@
+"""Benchmarks com switches simulados (ver `bench.run_bench`)."""
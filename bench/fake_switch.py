@@ -0,0 +1,265 @@
+"""
+Frota simulada de switches para benchmarks: uma `Session` falsa, compatível
+com a parte do easysnmp usada em `app.snmp`, respondendo a partir de tabelas
+em memória.
+
+Cada switch tem portas, FDB, latência por PDU e taxa de timeouts
+configuráveis. Os pacotes (PDUs de requisição) são contados por tipo em
+`FakeFleet.stats`, de modo que os benchmarks medem também o tráfego SNMP.
+
+    fleet = FakeFleet(switches=200, ports=48, fdb_size=40)
+    install(fleet)          # antes de importar app.snmp
+"""
+import bisect
+import math
+import random
+import sys
+import threading
+import time
+import types
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+
+IF_INDEX = '.1.3.6.1.2.1.2.2.1.1'
+IF_OPER = '.1.3.6.1.2.1.2.2.1.8'
+IF_ADMIN = '.1.3.6.1.2.1.2.2.1.7'
+IF_PHYS = '.1.3.6.1.2.1.2.2.1.6'
+FDB_PORT = '.1.3.6.1.2.1.17.4.3.1.2'
+BASE_PORT_IFINDEX = '.1.3.6.1.2.1.17.1.4.1.2'
+BRIDGE_ADDRESS = '.1.3.6.1.2.1.17.1.1.0'
+SYS_UPTIME = '.1.3.6.1.2.1.1.3.0'
+IF_TABLE_LAST_CHANGE = '.1.3.6.1.2.1.31.1.5.0'
+FDB_DISCARDS = '.1.3.6.1.2.1.17.4.1.0'
+FDB_DYNAMIC_COUNT = '.1.3.6.1.2.1.17.7.1.2.1.1.2.1'
+
+
+class EasySNMPTimeoutError(Exception):
+    pass
+
+
+class SNMPVariable:
+    def __init__(self, oid: str, oid_index: str, value, snmp_type: str):
+        self.oid = oid
+        self.oid_index = oid_index
+        self.value = value
+        self.snmp_type = snmp_type
+
+    def __repr__(self):
+        return f"<SNMPVariable {self.oid}.{self.oid_index}={self.value!r}>"
+
+
+def _oid_key(oid: str) -> Tuple[int, ...]:
+    return tuple(int(p) for p in oid.strip('.').split('.') if p)
+
+
+# ifIndex = IFINDEX_BASE + porta da bridge (como em vários switches Cisco),
+# para que a tradução via dot1dBasePortIfIndex seja exercitada; o ifIndex 1
+# é uma interface de VLAN, que não é porta da bridge
+IFINDEX_BASE = 10100
+VLAN_IFINDEX = 1
+
+
+class FakeSwitch:
+    """Tabelas SNMP de um switch simulado."""
+
+    def __init__(self, index: int, ports: int, fdb_size: int, rng: random.Random):
+        self.index = index
+        self.ip = f"10.200.{index // 250}.{index % 250 + 1}"
+        self.ports = ports
+        self.bridge_mac = bytes([0x02, 0xFF, 0, 0, index >> 8 & 0xFF, index & 0xFF])
+        self.admin = {p: 1 for p in range(1, ports + 1)}
+        self.oper = {p: 1 if rng.random() < 0.7 else 2 for p in range(1, ports + 1)}
+        # MACs das máquinas nas portas de acesso (a última porta é o uplink)
+        access = max(1, ports - 1)
+        self.fdb: Dict[bytes, int] = {}
+        for n in range(fdb_size):
+            mac = bytes([0x02, 0x00, index >> 8 & 0xFF, index & 0xFF, n >> 8 & 0xFF, n & 0xFF])
+            self.fdb[mac] = n % access + 1
+        self.boot = time.monotonic()
+        self._rows: Optional[List[Tuple[Tuple[int, ...], str, str, object, str]]] = None
+        self._keys: List[Tuple[int, ...]] = []
+
+    def macs(self) -> List[str]:
+        return [':'.join(f'{b:02X}' for b in mac) for mac in self.fdb]
+
+    def set_admin(self, ifindex: int, value: int) -> None:
+        port = ifindex - IFINDEX_BASE
+        if port in self.admin:
+            self.admin[port] = int(value)
+            self._rows = None
+
+    def _scalars(self) -> Dict[str, Tuple[object, str]]:
+        return {
+            SYS_UPTIME: (int((time.monotonic() - self.boot) * 100), 'TICKS'),
+            IF_TABLE_LAST_CHANGE: (0, 'TICKS'),
+            FDB_DISCARDS: (0, 'COUNTER'),
+            FDB_DYNAMIC_COUNT: (len(self.fdb), 'GAUGE'),
+            BRIDGE_ADDRESS: (self.bridge_mac.decode('latin-1'), 'OCTETSTR'),
+        }
+
+    def rows(self):
+        """Linhas ordenadas por OID: (chave, coluna, índice, valor, tipo)."""
+        if self._rows is None:
+            rows = [(IF_INDEX, str(VLAN_IFINDEX), str(VLAN_IFINDEX), 'INTEGER'),
+                    (IF_OPER, str(VLAN_IFINDEX), '1', 'INTEGER'),
+                    (IF_ADMIN, str(VLAN_IFINDEX), '1', 'INTEGER'),
+                    (IF_PHYS, str(VLAN_IFINDEX), self.bridge_mac.decode('latin-1'), 'OCTETSTR')]
+            for p in range(1, self.ports + 1):
+                i = str(IFINDEX_BASE + p)
+                rows.append((IF_INDEX, i, i, 'INTEGER'))
+                rows.append((IF_OPER, i, str(self.oper[p]), 'INTEGER'))
+                rows.append((IF_ADMIN, i, str(self.admin[p]), 'INTEGER'))
+                phys = self.bridge_mac[:5] + bytes([p & 0xFF])
+                rows.append((IF_PHYS, i, phys.decode('latin-1'), 'OCTETSTR'))
+                rows.append((BASE_PORT_IFINDEX, str(p), i, 'INTEGER'))
+            for mac, port in self.fdb.items():
+                rows.append((FDB_PORT, '.'.join(str(b) for b in mac), str(port), 'INTEGER'))
+            full = sorted((_oid_key(f"{c}.{i}"), c, i, v, t) for c, i, v, t in rows)
+            self._rows = full
+            self._keys = [r[0] for r in full]
+        return self._rows
+
+    def column(self, base: str) -> List[SNMPVariable]:
+        rows = self.rows()
+        prefix = _oid_key(base)
+        start = bisect.bisect_right(self._keys, prefix)
+        out = []
+        for key, col, idx, value, typ in rows[start:]:
+            if key[:len(prefix)] != prefix:
+                break
+            out.append(SNMPVariable(col, idx, value, typ))
+        return out
+
+    def get(self, oid: str) -> SNMPVariable:
+        scalars = self._scalars()
+        for candidate in (oid, oid + '.0'):
+            if candidate in scalars:
+                value, typ = scalars[candidate]
+                return SNMPVariable(candidate, '', str(value) if typ != 'OCTETSTR' else value, typ)
+        key = _oid_key(oid)
+        self.rows()
+        i = bisect.bisect_left(self._keys, key)
+        if i < len(self._keys) and self._keys[i] == key:
+            _, col, idx, value, typ = self._rows[i]
+            return SNMPVariable(col, idx, value, typ)
+        return SNMPVariable(oid, '', 'NOSUCHINSTANCE', 'NOSUCHINSTANCE')
+
+
+class FakeFleet:
+    """Conjunto de switches simulados e contadores de pacotes."""
+
+    def __init__(self, switches: int = 100, ports: int = 48, fdb_size: int = 40, latency: float = 0.002,
+                 timeout_rate: float = 0.0, timeout_delay: float = 0.05, seed: int = 1):
+        self.latency = latency
+        self.timeout_rate = timeout_rate
+        self.timeout_delay = timeout_delay
+        self._rng = random.Random(seed)
+        self.switches = [FakeSwitch(i, ports, fdb_size, self._rng) for i in range(switches)]
+        self.by_ip = {sw.ip: sw for sw in self.switches}
+        self.stats: Counter = Counter()
+        self._lock = threading.Lock()
+
+    def reset_stats(self) -> None:
+        with self._lock:
+            self.stats.clear()
+
+    def packets(self) -> int:
+        return sum(self.stats.values())
+
+    def exchange(self, kind: str, n: int = 1) -> None:
+        """Contabiliza `n` PDUs e simula a latência (ou um timeout)."""
+        with self._lock:
+            self.stats[kind] += n
+            timed_out = self.timeout_rate and self._rng.random() < self.timeout_rate
+        if timed_out:
+            time.sleep(self.timeout_delay)
+            raise EasySNMPTimeoutError("timed out while connecting to remote host")
+        if self.latency:
+            time.sleep(self.latency * n)
+
+    # linhas para os CSVs do benchmark
+    def switch_rows(self) -> List[dict]:
+        return [{'id_switch': str(i + 1), 'numero_portas': str(sw.ports), 'ip': sw.ip,
+                 'mac': ':'.join(f'{b:02X}' for b in sw.bridge_mac), 'versao_snmp': '2',
+                 'porta_uplink': str(sw.ports), 'chave_community': 'public'}
+                for i, sw in enumerate(self.switches)]
+
+    def machine_rows(self, known_ratio: float = 1.0) -> List[dict]:
+        rows = []
+        for sw in self.switches:
+            macs = sw.macs()
+            for mac in macs[:int(len(macs) * known_ratio)]:
+                rows.append({'id_maquina': str(len(rows) + 1), 'nome': f'pc{len(rows) + 1}', 'ip': '',
+                             'tipo_maquina': 'aluno', 'id_sala': '', 'mac': mac, 'access_allowed': 'True'})
+        return rows
+
+
+_fleet: Optional[FakeFleet] = None
+
+
+class Session:
+    """`easysnmp.Session` simulada, ligada à frota instalada."""
+
+    def __init__(self, hostname: str = None, community: str = 'public', version: int = 2,
+                 timeout: int = 2, retries: int = 1, **kwargs):
+        self.hostname = hostname
+        self.community = community
+        self.version = version
+        self.fleet = _fleet
+
+    def _switch(self) -> FakeSwitch:
+        sw = self.fleet.by_ip.get(self.hostname)
+        if sw is None:
+            time.sleep(self.fleet.timeout_delay)
+            raise EasySNMPTimeoutError("timed out while connecting to remote host")
+        return sw
+
+    def get(self, oids):
+        sw = self._switch()
+        self.fleet.exchange('get')
+        if isinstance(oids, (list, tuple)):
+            return [sw.get(o) for o in oids]
+        return sw.get(oids)
+
+    def walk(self, oids):
+        sw = self._switch()
+        columns = [sw.column(o) for o in ([oids] if isinstance(oids, str) else oids)]
+        # GETNEXT: uma PDU por linha, mais a que sai da coluna
+        self.fleet.exchange('getnext', sum(len(c) + 1 for c in columns))
+        return [v for c in columns for v in c]
+
+    def bulkwalk(self, oids, non_repeaters: int = 0, max_repetitions: int = 10):
+        sw = self._switch()
+        columns = [sw.column(o) for o in ([oids] if isinstance(oids, str) else oids)]
+        rows = max((len(c) for c in columns), default=0)
+        self.fleet.exchange('getbulk', max(1, math.ceil((rows + 1) / max(1, max_repetitions))))
+        return [v for c in columns for v in c]
+
+    def set(self, oid: str, value, snmp_type: str = None):
+        sw = self._switch()
+        self.fleet.exchange('set')
+        sw.set_admin(int(oid.rsplit('.', 1)[1]), value)
+        return True
+
+    def set_multiple(self, oid_values):
+        sw = self._switch()
+        self.fleet.exchange('set')
+        for oid, value, *_ in oid_values:
+            sw.set_admin(int(oid.rsplit('.', 1)[1]), value)
+        return True
+
+
+def install(fleet: FakeFleet) -> None:
+    """Instala a frota como módulo `easysnmp` (substituindo o real, se
+    houver) e religa `app.snmp` caso já tenha sido importado."""
+    global _fleet
+    _fleet = fleet
+    module = types.ModuleType('easysnmp')
+    module.Session = Session
+    module.SNMPVariable = SNMPVariable
+    module.EasySNMPTimeoutError = EasySNMPTimeoutError
+    sys.modules['easysnmp'] = module
+    snmp = sys.modules.get('app.snmp')
+    if snmp is not None:
+        snmp.Session = Session
+        snmp.get_pool().clear()
@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+"""Benchmarks de ponta a ponta contra uma frota simulada (`bench.fake_switch`).
+
+Mede tempo de parede, PDUs SNMP e pico de memória (tracemalloc) de:
+sincronização completa, geração de `status_portas`, ciclo do poller (frio e
+incremental), bloqueio/desbloqueio em lote e carga na API Flask (`/porta` e
+`/portas/batch`, omitida se o Flask não estiver instalado).
+
+    python -m bench.run_bench --switches 200 --ports 48 --fdb 40
+    python -m bench.run_bench --json atual.json --baseline anterior.json
+"""
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from bench.fake_switch import FakeFleet, install
+
+
+def parse_args():
+    p = argparse.ArgumentParser(description="Benchmarks do OGMR com switches simulados")
+    p.add_argument("--switches", type=int, default=100, help="Número de switches simulados")
+    p.add_argument("--ports", type=int, default=48, help="Portas por switch")
+    p.add_argument("--fdb", type=int, default=40, help="MACs aprendidas por switch")
+    p.add_argument("--latency", type=float, default=0.002, help="Latência simulada por PDU (s)")
+    p.add_argument("--timeout-rate", type=float, default=0.0, help="Fração de requisições que expiram")
+    p.add_argument("--workers", type=int, default=None, help="Switches consultados em paralelo")
+    p.add_argument("--storage", choices=["csv", "sqlite"], default="csv", help="Backend de armazenamento")
+    p.add_argument("--api-requests", type=int, default=200, help="Requisições no cenário da API")
+    p.add_argument("--only", nargs="*", help="Roda só os cenários indicados")
+    p.add_argument("--json", help="Grava os resultados neste arquivo")
+    p.add_argument("--baseline", help="Compara com resultados gravados anteriormente")
+    p.add_argument("--tolerance", type=float, default=0.2, help="Piora aceita em relação ao baseline (fração)")
+    return p.parse_args()
+
+
+def prepare_data(fleet: FakeFleet, data_dir: str) -> None:
+    from app import storage
+    storage.save_all("switches", fleet.switch_rows())
+    storage.save_all("maquinas", fleet.machine_rows())
+    for entity in ("maquinas_conectadas_switch", "status_portas", "salas", "ligacao_sala_switch", "agendamento_sala_switch"):
+        storage.save_all(entity, [])
+
+
+def measure(name: str, fleet: FakeFleet, fn) -> dict:
+    fleet.reset_stats()
+    tracemalloc.start()
+    inicio = time.perf_counter()
+    detail = fn()
+    wall = time.perf_counter() - inicio
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        "cenario": name,
+        "tempo_s": round(wall, 4),
+        "pdus": fleet.packets(),
+        "pdus_por_tipo": dict(fleet.stats),
+        "pico_mem_kb": round(peak / 1024, 1),
+        "detalhe": detail,
+    }
+
+
+def scenarios(args, fleet: FakeFleet):
+    from app import scheduler, storage, sync
+    from app.snmp import PortState
+
+    def full_sync():
+        updated, added, errors = sync.auto_sync_switches(args.workers)
+        return {"atualizadas": updated, "adicionadas": added, "erros": len(errors)}
+
+    def status_portas():
+        n, errors, _ = sync.generate_status_portas(args.workers)
+        return {"linhas": n, "erros": len(errors)}
+
+    def cycle():
+        state = sync.run_cycle(args.workers)
+        return {"eventos": state["eventos"], "gravadas": state["status_portas"], "erros": state["n_errors"]}
+
+    def bulk(state):
+        def run():
+            plan = {sw["id_switch"]: {p: state for p in range(1, int(sw["numero_portas"]))}
+                    for sw in storage.load_all("switches")}
+            results = scheduler.execute_plan(plan, args.workers)
+            return {"portas": sum(len(r) for r in results.values()),
+                    "falhas": sum(1 for r in results.values() for ok in r.values() if not ok)}
+        return run
+
+    def api_client():
+        from flask import Flask
+        from app.routes.routes import api
+        app = Flask(__name__)
+        app.register_blueprint(api)
+        return app.test_client()
+
+    def api_load():
+        client = api_client()
+        conexoes = storage.load_all("maquinas_conectadas_switch")
+        codes = {}
+        for i in range(args.api_requests):
+            c = conexoes[i % len(conexoes)] if conexoes else {"id_maquina": "1", "id_switch": "1", "porta": "1"}
+            resp = client.post("/porta?sync=1", json={"id_switch": c["id_switch"], "id_maquina": c["id_maquina"],
+                                               "porta": int(c.get("porta") or 1), "status": 2 - i % 2})
+            codes[resp.status_code] = codes.get(resp.status_code, 0) + 1
+        return {"requisicoes": args.api_requests, "status": codes}
+
+    def api_batch():
+        ops = [{"id_switch": c["id_switch"], "id_maquina": c["id_maquina"], "porta": int(c.get("porta") or 1),
+                "status": 2 - i % 2}
+               for i, c in enumerate(storage.load_all("maquinas_conectadas_switch")[:args.api_requests])]
+        resp = api_client().post("/portas/batch?sync=1", json=ops)
+        body = resp.get_json() or {}
+        return {"operacoes": len(ops), "status": resp.status_code, "falhas": body.get("falhas")}
+
+    yield "sync_completo", full_sync
+    yield "status_portas", status_portas
+    yield "ciclo_frio", cycle
+    yield "ciclo_incremental", cycle
+    yield "bloqueio_lote", bulk(PortState.DISABLED)
+    yield "desbloqueio_lote", bulk(PortState.ENABLED)
+    try:
+        import flask  # noqa: F401
+    except ImportError:
+        print("Flask não instalado: cenário da API omitido", file=sys.stderr)
+    else:
+        yield "api_porta", api_load
+        yield "api_lote", api_batch
+
+
+def compare(results, baseline_path: str, tolerance: float) -> list:
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = {r["cenario"]: r for r in json.load(f)["resultados"]}
+    regressions = []
+    for r in results:
+        old = baseline.get(r["cenario"])
+        if not old:
+            continue
+        for metric in ("tempo_s", "pdus", "pico_mem_kb"):
+            if old[metric] and r[metric] > old[metric] * (1 + tolerance):
+                regressions.append(f"{r['cenario']}: {metric} {old[metric]} -> {r[metric]}")
+    return regressions
+
+
+def main():
+    args = parse_args()
+    fleet = FakeFleet(args.switches, args.ports, args.fdb, args.latency, args.timeout_rate)
+    install(fleet)
+
+    import config
+    from app import storage
+    data_dir = tempfile.mkdtemp(prefix="ogmr-bench-")
+    storage.BASE_DIR = data_dir
+    config.POLLER_STATE_FILE = os.path.join(data_dir, "poller_state.json")
+    config.DISCOVERY_CACHE_FILE = os.path.join(data_dir, "discovery_cache.json")
+    config.STORAGE_BACKEND = args.storage
+    config.SQLITE_PATH = os.path.join(data_dir, "ogmr.sqlite3")
+    # métricas, perfil e marcas de SET também: nada do benchmark vai para app/data
+    config.METRICS_DIR = data_dir
+    config.POLL_MARKS_DIR = os.path.join(data_dir, "poll_marks")
+    config.PROFILE_LOG = os.path.join(data_dir, "profile.log")
+    try:
+        prepare_data(fleet, data_dir)
+        results = []
+        for name, fn in scenarios(args, fleet):
+            if args.only and name not in args.only:
+                continue
+            r = measure(name, fleet, fn)
+            results.append(r)
+            print(f"{name:<20} {r['tempo_s']:>9.3f}s {r['pdus']:>9} PDUs {r['pico_mem_kb']:>10.1f} KB  {r['detalhe']}")
+    finally:
+        shutil.rmtree(data_dir, ignore_errors=True)
+
+    if args.json:
+        params = {k: getattr(args, k) for k in ("switches", "ports", "fdb", "latency", "timeout_rate", "workers", "storage")}
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"parametros": params, "resultados": results}, f, ensure_ascii=False, indent=2)
+
+    if args.baseline:
+        regressions = compare(results, args.baseline, args.tolerance)
+        for line in regressions:
+            print(f"REGRESSÃO {line}")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
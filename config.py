@@ -1,6 +1,7 @@
 """
 Configuração mínima: não usamos mais SQLAlchemy nem PostgreSQL.
-Os dados são mantidos em CSVs em `app/data` e acessados por `app.storage`.
+Os dados são mantidos em CSVs em `app/data` (ou em SQLite, ver
+`STORAGE_BACKEND`) e acessados por `app.storage`.
 """
 import os
 
@@ -9,3 +10,95 @@ CSV_DATA_DIR = os.path.join(BASE_DIR, "app", "data")
 
 # DEBUG flag para desenvolvimento local
 DEBUG = True
+
+# Perfil por fases (desligado por padrão; OGMR_PROFILE=1/0 tem precedência)
+PROFILE = False
+# log rotativo do resumo de cada sessão de perfil
+PROFILE_LOG = os.path.join(CSV_DATA_DIR, "profile.log")
+PROFILE_LOG_MAX_BYTES = 1_000_000
+PROFILE_LOG_BACKUPS = 3
+
+# Número máximo de switches consultados em paralelo durante a coleta
+POLL_MAX_WORKERS = 32
+
+# SNMP: walks com GETBULK (v2c/v3) e número de linhas pedidas por PDU
+SNMP_USE_BULK = True
+SNMP_MAX_REPETITIONS = 25
+# buscar ifOperStatus e ifAdminStatus na mesma sequência de GETBULK
+SNMP_COMBINED_STATUS = True
+
+# SETs em lote: tamanho máximo de mensagem aceito pelos agentes (bytes)
+# e limite opcional de varbinds por PDU (0 = apenas pelo tamanho)
+SNMP_MAX_MSG_SIZE = 1472
+SNMP_MAX_SET_VARBINDS = 0
+
+# Pool de sessões SNMP: tamanho máximo, descarte por ociosidade (s) e
+# intervalo (s) a partir do qual uma sessão é verificada antes do reuso
+SNMP_POOL_MAX_SIZE = 256
+SNMP_POOL_IDLE_TIMEOUT = 300
+SNMP_POOL_HEALTH_INTERVAL = 60
+
+# Backend de armazenamento: "csv" (arquivos em app/data) ou "sqlite".
+# Para migrar os CSVs existentes: python -m app.storage_sqlite migrate
+STORAGE_BACKEND = os.environ.get("OGMR_STORAGE", "csv")
+SQLITE_PATH = os.environ.get("OGMR_SQLITE_PATH", os.path.join(CSV_DATA_DIR, "ogmr.sqlite3"))
+
+# status_portas: nº de entradas no diário que dispara a compactação
+JOURNAL_COMPACT_LINES = 5000
+
+# Coleta incremental: switches sem mudança nos marcadores (sysUpTime,
+# ifTableLastChange, FDB) reaproveitam a coleta anterior; a cada N ciclos a
+# coleta é completa (1 = sempre completa). Os marcadores não mudam quando uma
+# porta cai/sobe: sem traps, isso aparece em até POLL_FULL_EVERY *
+# POLL_INTERVAL segundos (10 min no padrão). SETs feitos pelo app (API,
+# interface, agendador) e traps marcam o switch em POLL_MARKS_DIR e forçam a
+# coleta completa dele no ciclo seguinte.
+POLL_FULL_EVERY = 10
+POLL_MARKS_DIR = os.path.join(CSV_DATA_DIR, "poll_marks")
+
+# Cache de descoberta (porta da bridge -> ifIndex, ifIndex, ifPhysAddress e
+# MAC da bridge): arquivo persistido e idade máxima (s) de um sysUpTime já
+# lido para verificar se o switch reiniciou sem um novo GET
+DISCOVERY_CACHE_FILE = os.path.join(CSV_DATA_DIR, "discovery_cache.json")
+DISCOVERY_CHECK_INTERVAL = 300
+
+# Coletor em segundo plano (run_poller.py): intervalo entre ciclos (s) e
+# arquivo onde o estado publicado é gravado para a interface
+POLL_INTERVAL = 60
+POLLER_STATE_FILE = os.path.join(CSV_DATA_DIR, "poller_state.json")
+
+# Receptor de traps (run_trap_receiver.py): endereço/porta UDP, community
+# aceita ("" = qualquer) e intervalo (s) da coleta de reconciliação
+TRAP_LISTEN_HOST = "0.0.0.0"
+TRAP_PORT = 162
+TRAP_COMMUNITY = ""
+TRAP_RECONCILE_INTERVAL = 900
+
+# API: tamanho padrão e máximo (linhas) das páginas das listagens
+API_PAGE_SIZE = 500
+API_MAX_PAGE_SIZE = 5000
+# POST /portas/batch: máximo de operações por requisição
+API_MAX_BATCH_OPERATIONS = 5000
+
+# Jobs assíncronos da API (POST /jobs/...): threads, máximo de partes
+# (switch x job) na fila e por quanto tempo (s) um job terminado é mantido
+JOBS_MAX_WORKERS = 16
+JOBS_MAX_PENDING = 1000
+JOBS_RETENTION = 3600
+
+# Métricas (rota /metrics): diretório onde cada processo (coletor, receptor
+# de traps) grava o instantâneo das suas métricas
+METRICS_DIR = CSV_DATA_DIR
+# instantâneos mais antigos que isto (s) são ignorados pela rota (processo
+# parado, benchmark ou teste); os serviços regravam o seu a cada ciclo
+METRICS_MAX_AGE = 5 * POLL_INTERVAL
+
+# Agendador (run_scheduler.py): tolerância (s) para ações atrasadas e
+# intervalo (s) de releitura de agendamento_sala_switch
+SCHEDULER_MISFIRE_GRACE = 300
+SCHEDULER_RELOAD_INTERVAL = 30
+# ações que disparam dentro desta janela (s) são agrupadas em um SET em lote
+# por switch; conflitos na mesma porta: "last" (mais recente vence) ou
+# "priority" (bloqueio vence desbloqueio)
+SCHEDULER_COALESCE_WINDOW = 5
+SCHEDULER_CONFLICT_POLICY = "last"
@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+"""Processo de coleta em segundo plano.
+
+Atualiza periodicamente o estado dos switches (conexões, `status_portas`,
+máquinas descobertas) e publica o resultado em `config.POLLER_STATE_FILE`.
+A interface Streamlit apenas lê o estado publicado.
+
+    python run_poller.py              # roda continuamente
+    python run_poller.py --once       # um único ciclo
+"""
+import argparse
+import logging
+import time
+
+import config
+from app import profiling, sync
+
+
+def parse_args():
+    p = argparse.ArgumentParser(description="Coleta periódica do estado dos switches")
+    p.add_argument("--interval", type=float, default=getattr(config, "POLL_INTERVAL", 60), help="Intervalo entre ciclos (segundos)")
+    p.add_argument("--workers", type=int, default=None, help="Switches consultados em paralelo")
+    p.add_argument("--once", action="store_true", help="Executa um único ciclo e sai")
+    return p.parse_args()
+
+
+def main():
+    args = parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+
+    while True:
+        inicio = time.monotonic()
+        try:
+            with profiling.session("ciclo"):
+                state = sync.run_cycle(args.workers)
+            logging.info("Ciclo concluído em %.2fs: %d eventos, %d portas gravadas, %d erros",
+                         state["duration"], state["eventos"], state["status_portas"], state["n_errors"])
+            for err in state["errors"][:10]:
+                logging.warning(err)
+        except Exception:
+            logging.exception("Falha no ciclo de coleta")
+
+        if args.once:
+            break
+        time.sleep(max(0.0, args.interval - (time.monotonic() - inicio)))
+
+
+if __name__ == '__main__':
+    try:
+        main()
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,24 @@
+#!/usr/bin/env python3
+"""Serviço de agendamento de bloqueio/desbloqueio de portas.
+
+Lê os agendamentos de `agendamento_sala_switch`, mantém os jobs em memória
+(APScheduler) e executa as ações no próprio processo, reaproveitando as
+sessões SNMP. Substitui as entradas de crontab criadas por versões antigas.
+
+    python run_scheduler.py
+"""
+import logging
+
+from app.scheduler import AgendamentoScheduler
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    AgendamentoScheduler().start()
+
+
+if __name__ == '__main__':
+    try:
+        main()
+    except KeyboardInterrupt:
+        pass
@@ -3,21 +3,53 @@ import argparse
 import sys
 import logging
 
-from app.snmp import SNMPManager, PortState
+from app.snmp import PortState, get_manager
 
 
 def parse_args():
-    p = argparse.ArgumentParser(description="Executa ação SNMP em portas especificadas")
+    p = argparse.ArgumentParser(description="Executa ação SNMP em portas especificadas, ou em salas inteiras")
     p.add_argument("--action", choices=["enable", "disable"], required=True, help="enable ou disable")
-    p.add_argument("--ip", required=True, help="IP do switch")
-    p.add_argument("--community", required=True, help="Community string")
-    p.add_argument("--ports", required=True, help="Lista de portas separadas por vírgula, ex: 1,2,3")
+    p.add_argument("--ip", help="IP do switch")
+    p.add_argument("--community", help="Community string")
+    p.add_argument("--ports", help="Lista de portas separadas por vírgula, ex: 1,2,3")
     p.add_argument("--version", type=int, default=2, help="Versão SNMP (1 ou 2)")
-    return p.parse_args()
+    p.add_argument("--sala", action="append", help="id da sala (pode repetir): todas as máquinas da sala, "
+                                                   "exceto a do professor e as portas de uplink")
+    p.add_argument("--bloco", help="todas as salas do bloco")
+    args = p.parse_args()
+    if not (args.sala or args.bloco) and not (args.ip and args.community and args.ports):
+        p.error("informe --ip, --community e --ports, ou --sala/--bloco")
+    return args
+
+
+def run_rooms(args, state):
+    from app import room_ops
+
+    salas = list(args.sala or [])
+    if args.bloco:
+        salas += room_ops.rooms_in_block(args.bloco)
+    if not salas:
+        logging.error("Nenhuma sala encontrada")
+        sys.exit(2)
+    resumo = room_ops.apply_rooms(salas, state)
+    for r in resumo["resultados"]:
+        print(f"switch {r['id_switch']} porta {r['porta']}: {'OK' if r['sucesso'] else 'FALHA'}")
+    for r in resumo["ignoradas"]:
+        print(f"máquina {r['id_maquina']}: ignorada ({r['motivo']})")
+    if resumo["falhas"] == 0:
+        print("SUCCESS")
+        sys.exit(0)
+    else:
+        print("FAIL")
+        sys.exit(4)
 
 
 def main():
     args = parse_args()
+    state = PortState.ENABLED if args.action == "enable" else PortState.DISABLED
+    if args.sala or args.bloco:
+        run_rooms(args, state)
+
     ports = []
     for part in args.ports.split(','):
         part = part.strip()
@@ -30,14 +62,15 @@ def main():
             sys.exit(2)
 
     try:
-        snmp = SNMPManager(host=args.ip, community_read=args.community, community_write=args.community, version=args.version)
+        snmp = get_manager(args.ip, args.community, args.community, args.version)
     except Exception as e:
         logging.error("Falha ao criar SNMPManager: %s", e)
         sys.exit(3)
 
-    state = PortState.ENABLED if args.action == "enable" else PortState.DISABLED
-    ok = snmp.set_ports(ports, state)
-    if ok:
+    results = snmp.set_ports_batch(ports, state)
+    for port, ok in results.items():
+        print(f"porta {port}: {'OK' if ok else 'FALHA'}")
+    if all(results.values()):
         print("SUCCESS")
         sys.exit(0)
     else:
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""Receptor de traps SNMP (linkUp/linkDown e notificações de MAC).
+
+Aplica cada trap em `status_portas` assim que chega e, em segundo plano,
+roda um ciclo de coleta lento (`config.TRAP_RECONCILE_INTERVAL`) para
+corrigir traps perdidos.
+
+    python run_trap_receiver.py                       # porta 162 (requer root)
+    python run_trap_receiver.py --port 1162 --reconcile 0
+    python run_trap_receiver.py --send-test 10.90.90.90:3 --down --target 127.0.0.1:1162
+"""
+import argparse
+import logging
+import threading
+import time
+
+import config
+from app import metrics, storage, sync
+from app.snmp import mark_ports_changed
+from app.traps import TrapReceiver, send_test_trap
+
+
+def parse_args():
+    p = argparse.ArgumentParser(description="Receptor de traps SNMP do OGMR")
+    p.add_argument("--host", default=getattr(config, "TRAP_LISTEN_HOST", "0.0.0.0"), help="Endereço de escuta")
+    p.add_argument("--port", type=int, default=getattr(config, "TRAP_PORT", 162), help="Porta UDP de escuta")
+    p.add_argument("--reconcile", type=float, default=getattr(config, "TRAP_RECONCILE_INTERVAL", 900),
+                   help="Intervalo (s) da coleta de reconciliação; 0 desliga")
+    p.add_argument("--send-test", metavar="IP_SWITCH:PORTA", help="Envia um linkUp/linkDown de teste e sai")
+    p.add_argument("--down", action="store_true", help="Com --send-test: envia linkDown (padrão: linkUp)")
+    p.add_argument("--inform", action="store_true", help="Com --send-test: envia como inform e espera a confirmação")
+    p.add_argument("--target", default="127.0.0.1:162", help="Com --send-test: destino HOST:PORTA")
+    p.add_argument("--community", default="public", help="Com --send-test: community")
+    return p.parse_args()
+
+
+def reconcile_loop(interval: float):
+    while True:
+        time.sleep(interval)
+        try:
+            state = sync.run_cycle()
+            logging.info("Reconciliação: %d eventos, %d erros", state["eventos"], state["n_errors"])
+        except Exception:
+            logging.exception("Falha na coleta de reconciliação")
+
+
+def metrics_loop(interval: float):
+    # os traps não passam por sync.run_cycle: exportar as métricas periodicamente
+    while True:
+        time.sleep(interval)
+        try:
+            metrics.export()
+        except OSError:
+            logging.exception("Falha ao gravar métricas")
+
+
+def on_switch_event(id_switch):
+    # coleta completa do switch aqui e no coletor (run_poller.py)
+    sync.gate.invalidate(id_switch)
+    sw = storage.get_by_key("switches", id_switch)
+    if sw is not None:
+        mark_ports_changed(sw.get("ip"))
+
+
+def main():
+    args = parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+
+    if args.send_test:
+        agent, _, port = args.send_test.rpartition(":")
+        host, _, tport = args.target.rpartition(":")
+        ok = send_test_trap((host, int(tport)), int(port), not args.down, args.community, agent, args.inform)
+        print("Trap enviado" if ok else "Sem confirmação do inform")
+        return
+
+    if args.reconcile > 0:
+        threading.Thread(target=reconcile_loop, args=(args.reconcile,), daemon=True).start()
+    threading.Thread(target=metrics_loop, args=(getattr(config, "POLL_INTERVAL", 60),), daemon=True).start()
+    TrapReceiver(args.host, args.port, on_switch_event=on_switch_event).serve_forever()
+
+
+if __name__ == '__main__':
+    try:
+        main()
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,34 @@
+import os
+import sys
+
+import pytest
+
+# permite `pytest` a partir de qualquer diretório
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import config  # noqa: E402
+from app import storage  # noqa: E402
+
+
+@pytest.fixture
+def data_dir(tmp_path, monkeypatch):
+    """Armazenamento CSV isolado em um diretório temporário."""
+    monkeypatch.setattr(storage, "BASE_DIR", str(tmp_path))
+    monkeypatch.setattr(config, "STORAGE_BACKEND", "csv", raising=False)
+    monkeypatch.setattr(config, "DISCOVERY_CACHE_FILE", str(tmp_path / "discovery_cache.json"), raising=False)
+    monkeypatch.setattr(config, "POLLER_STATE_FILE", str(tmp_path / "poller_state.json"), raising=False)
+    monkeypatch.setattr(config, "METRICS_DIR", str(tmp_path), raising=False)
+    monkeypatch.setattr(config, "POLL_MARKS_DIR", str(tmp_path / "poll_marks"), raising=False)
+    storage.invalidate()
+    yield tmp_path
+    storage.invalidate()
+
+
+@pytest.fixture
+def fleet(data_dir):
+    """Dois switches simulados (bench.fake_switch) cadastrados no armazenamento."""
+    from bench.fake_switch import FakeFleet, install
+    f = FakeFleet(2, 8, 4, latency=0)
+    install(f)
+    storage.save_all("switches", f.switch_rows())
+    return f
@@ -0,0 +1,46 @@
+import json
+import os
+import time
+
+from app import metrics
+
+
+def _write_export(directory, process, timestamp):
+    registry = metrics.Registry()
+    registry.inc(registry.counter('ogmr_teste_total', 'teste'), 3)
+    with open(os.path.join(str(directory), f"metrics_{process}.json"), 'w', encoding='utf-8') as f:
+        json.dump({'timestamp': timestamp, 'metrics': registry.snapshot()}, f)
+
+
+def test_render_all_skips_stale_exports(data_dir, monkeypatch):
+    import config
+    monkeypatch.setattr(config, 'METRICS_MAX_AGE', 300, raising=False)
+    _write_export(data_dir, 'run_poller', time.time())
+    _write_export(data_dir, 'run_bench', time.time() - 3600)
+    text = metrics.render_all()
+    assert 'process="run_poller"' in text
+    assert 'process="run_bench"' not in text
+
+
+def test_profile_is_opt_in(monkeypatch):
+    import config
+    from app import profiling
+    monkeypatch.delenv('OGMR_PROFILE', raising=False)
+    monkeypatch.setattr(config, 'DEBUG', True)
+    monkeypatch.setattr(config, 'PROFILE', False)
+    assert not profiling.enabled()
+    monkeypatch.setenv('OGMR_PROFILE', '1')
+    assert profiling.enabled()
+
+
+def test_profile_counts_only_outer_storage_calls(data_dir, monkeypatch):
+    from app import profiling, storage
+    monkeypatch.setenv('OGMR_PROFILE', '1')
+    # sem log rotativo no teste
+    monkeypatch.setattr(profiling, '_handler_ready', True)
+    rows = [{'id_maquina': '1', 'id_switch': '1', 'status': 'ativo', 'porta': '1'}]
+    with profiling.session('teste') as prof:
+        # save_all passa por apply_changes e load_all internamente
+        storage.save_all('maquinas_conectadas_switch', rows)
+        storage.load_all('maquinas_conectadas_switch')
+    assert prof.storage_calls == 2
@@ -0,0 +1,25 @@
+from app import storage
+
+
+def test_gate_reuses_unchanged_switches(fleet):
+    from app import poller
+    gate = poller.PollGate(full_every=100)
+    switches = storage.load_all('switches')
+    assert [r.reused for r in gate.poll(switches)] == [False, False]
+    assert [r.reused for r in gate.poll(switches)] == [True, True]
+
+
+def test_set_forces_full_poll_of_that_switch(fleet):
+    from app import poller
+    from app.snmp import PortState, manager_for_switch
+    gate = poller.PollGate(full_every=100)
+    switches = storage.load_all('switches')
+    gate.poll(switches)
+    # SET feito por outro processo (API/interface): só a marca no disco é compartilhada
+    manager_for_switch(switches[0]).set_port_states({3: PortState.DISABLED})
+    results = {r.id_switch: r for r in gate.poll(switches)}
+    assert not results['1'].reused
+    assert results['2'].reused
+    assert {s['port']: s['administrative'] for s in results['1'].statuses}[3] == '2'
+    # a marca já foi absorvida pela coleta seguinte
+    assert all(r.reused for r in gate.poll(switches))
@@ -0,0 +1,148 @@
+import pytest
+
+pytest.importorskip("flask")
+
+from app import storage  # noqa: E402
+
+
+@pytest.fixture
+def client(fleet):
+    from flask import Flask
+    from app.routes.routes import api
+    app = Flask(__name__)
+    app.register_blueprint(api)
+    return app.test_client()
+
+
+@pytest.fixture
+def conexoes(data_dir):
+    storage.save_all('maquinas_conectadas_switch', [
+        {'id_maquina': '1', 'id_switch': '1', 'status': 'True', 'porta': '1'},
+        {'id_maquina': '2', 'id_switch': '1', 'status': 'True', 'porta': '2'},
+    ])
+
+
+def _job(client, resp):
+    from app import jobs
+    assert resp.status_code == 202
+    assert resp.headers['Location'] == f"/jobs/{resp.json['id']}"
+    jobs.get(resp.json['id']).wait(5)
+    return client.get(resp.headers['Location']).json
+
+
+def test_porta_runs_as_job(client, conexoes, fleet):
+    job = _job(client, client.post('/porta', json={'id_switch': '1', 'id_maquina': '1', 'porta': 1, 'status': 2}))
+    assert job['status'] == 'concluido'
+    assert job['resultado']['sucesso'] == 1
+    assert fleet.switches[0].admin[1] == 2
+    assert storage.get_by_key('maquinas_conectadas_switch', ('1', '1'))['status'] == 'False'
+
+
+def test_porta_sync(client, conexoes, fleet):
+    resp = client.post('/porta?sync=1', json={'id_switch': '1', 'id_maquina': '2', 'porta': 2, 'status': 2})
+    assert resp.status_code == 200
+    assert resp.json == {'sucesso': True, 'porta': 2, 'status': 2}
+    assert fleet.switches[0].admin[2] == 2
+    assert client.post('/porta', json={'id_switch': '9', 'porta': 1, 'status': 1}).status_code == 404
+    assert client.post('/porta', json={'id_switch': '1', 'porta': 1, 'status': 'x'}).status_code == 400
+
+
+def test_portas_batch(client, conexoes, fleet):
+    ops = [{'id_switch': '1', 'porta': 1, 'status': 2}, {'id_switch': '2', 'porta': 3, 'status': 2}]
+    job = _job(client, client.post('/portas/batch', json=ops))
+    assert job['resultado']['sucesso'] == 2
+    assert fleet.switches[1].admin[3] == 2
+
+    ops.append({'id_switch': '1', 'porta': 'x', 'status': 1})
+    assert client.post('/portas/batch', json=ops).status_code == 400
+    resp = client.post('/portas/batch?sync=1', json=ops)
+    assert resp.status_code == 200
+    assert [r['sucesso'] for r in resp.json['resultados']] == [True, True, False]
+    assert resp.json['resultados'][2]['indice'] == 2
+
+
+def test_room_block(client, fleet):
+    storage.save_all('salas', [{'id_sala': '1', 'numero': '101', 'bloco': 'A'}])
+    storage.save_all('ligacao_sala_switch', [{'id_sala': '1', 'id_switch': '1'}])
+    storage.save_all('maquinas', [
+        {'id_maquina': '1', 'id_sala': '1', 'tipo_maquina': 'True'},
+        {'id_maquina': '2', 'id_sala': '1', 'tipo_maquina': 'False'},
+        {'id_maquina': '3', 'id_sala': '1', 'tipo_maquina': 'False'},
+    ])
+    uplink = fleet.switches[0].ports
+    storage.save_all('maquinas_conectadas_switch', [
+        {'id_maquina': '1', 'id_switch': '1', 'status': 'True', 'porta': '1'},
+        {'id_maquina': '2', 'id_switch': '1', 'status': 'True', 'porta': '2'},
+        {'id_maquina': '3', 'id_switch': '1', 'status': 'True', 'porta': str(uplink)},
+    ])
+    job = _job(client, client.post('/salas/1/bloquear'))
+    assert [(r['porta'], r['sucesso']) for r in job['resultado']['resultados']] == [(2, True)]
+    assert {r['motivo'] for r in job['resultado']['ignoradas']} == {'professor', 'porta de uplink'}
+    assert fleet.switches[0].admin[1] == 1
+    assert fleet.switches[0].admin[2] == 2
+
+    resp = client.post('/blocos/A/desbloquear?sync=1')
+    assert resp.status_code == 200
+    assert resp.json['sucesso'] == 1
+    assert fleet.switches[0].admin[2] == 1
+    assert client.post('/salas/9/bloquear').status_code == 404
+    assert client.post('/salas/1/trancar').status_code == 404
+
+
+@pytest.fixture
+def maquinas(data_dir):
+    storage.save_all('maquinas', [
+        {'id_maquina': str(i), 'nome': f'pc{i}', 'ip': f'10.0.0.{i}', 'tipo_maquina': 'False',
+         'id_sala': '1' if i <= 6 else '2', 'mac': f'00:11:22:33:44:{i:02x}', 'access_allowed': 'True'}
+        for i in range(1, 13)
+    ])
+
+
+def test_listar_cursor_round_trip(client, maquinas):
+    ids, url, pages = [], '/maquinas?limit=5', 0
+    while url:
+        resp = client.get(url)
+        assert resp.status_code == 200
+        ids += [r['id_maquina'] for r in resp.json]
+        pages += 1
+        link = resp.headers.get('Link')
+        url = link[1:link.index('>')] if link else None
+        if link:
+            assert resp.headers['X-Next-Cursor'] in url
+    # ordem numérica da chave, sem repetir nem perder linhas entre as páginas
+    assert ids == [str(i) for i in range(1, 13)]
+    assert pages == 3
+    assert len(client.get('/maquinas').json) == 12
+
+
+def test_listar_invalid_params(client, maquinas):
+    assert client.get('/maquinas?limit=abc').status_code == 400
+    resp = client.get('/maquinas?cursor=nao-e-cursor')
+    assert resp.status_code == 400
+    assert resp.json == {'erro': 'cursor inválido'}
+    assert client.get('/maquinas?foo=1').json == {'erro': 'filtro desconhecido: foo'}
+    assert client.get('/maquinas?fields=nome,x').json == {'erro': 'campos desconhecidos: x'}
+
+
+def test_listar_etag(client, maquinas):
+    resp = client.get('/maquinas')
+    etag = resp.headers['ETag']
+    cached = client.get('/maquinas', headers={'If-None-Match': etag})
+    assert cached.status_code == 304
+    assert cached.data == b''
+    storage.append('maquinas', {'id_maquina': '13', 'nome': 'pc13', 'ip': '10.0.0.13',
+                                'tipo_maquina': 'False', 'id_sala': '2', 'mac': '', 'access_allowed': 'True'})
+    resp = client.get('/maquinas', headers={'If-None-Match': etag})
+    assert resp.status_code == 200
+    assert resp.headers['ETag'] != etag
+    assert len(resp.json) == 13
+
+
+def test_listar_fields_and_mac_filter(client, maquinas):
+    resp = client.get('/maquinas?fields=id_maquina,nome&id_sala=2')
+    assert resp.json[0] == {'id_maquina': '7', 'nome': 'pc7'}
+    assert len(resp.json) == 6
+    # o filtro de MAC aceita outras grafias do mesmo endereço
+    for mac in ('00-11-22-33-44-0A', '0:11:22:33:44:a', '0011.2233.440a'):
+        resp = client.get('/maquinas', query_string={'mac': mac, 'fields': 'id_maquina'})
+        assert resp.json == [{'id_maquina': '10'}], mac
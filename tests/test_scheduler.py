@@ -0,0 +1,136 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from app import storage
+
+
+class FakeScheduler:
+    """Só o que o AgendamentoScheduler usa do APScheduler."""
+
+    def __init__(self):
+        self.jobs = {}
+        self.options = {}
+
+    def add_job(self, func, trigger, id=None, args=(), **kwargs):
+        self.jobs[id] = (func, list(args))
+        self.options[id] = kwargs
+
+    def get_job(self, job_id):
+        return self.jobs.get(job_id)
+
+    def remove_job(self, job_id):
+        del self.jobs[job_id]
+
+    def run(self, job_id):
+        func, args = self.jobs.pop(job_id)
+        func(*args)
+
+
+@pytest.fixture
+def agendador(fleet, monkeypatch):
+    import config
+    from app.scheduler import AgendamentoScheduler
+    monkeypatch.setattr(config, 'SCHEDULER_COALESCE_WINDOW', 0, raising=False)
+    return AgendamentoScheduler(FakeScheduler(), misfire_grace=60)
+
+
+def _agendamento(uid, portas, inicio, fim, id_switch='1'):
+    return {'uid': uid, 'id_switch': id_switch, 'portas': portas,
+            'data_inicio': inicio.isoformat(), 'data_fim': fim.isoformat()}
+
+
+def test_reconcile_deletes_only_expired_rows(agendador, monkeypatch):
+    now = datetime.now()
+    storage.save_all('agendamento_sala_switch', [
+        _agendamento('velho', '1', now - timedelta(hours=2), now - timedelta(hours=1)),
+        _agendamento('futuro', '2', now + timedelta(hours=1), now + timedelta(hours=2)),
+        {'uid': 'externo', 'id_sala': '3'},
+    ])
+    load_all = storage.load_all
+
+    # agendamento criado pela API logo depois da leitura do agendador
+    def load_then_append(entity):
+        monkeypatch.setattr(storage, 'load_all', load_all)
+        rows = load_all(entity)
+        storage.append(entity, _agendamento('novo', '3', now + timedelta(hours=1), now + timedelta(hours=3)))
+        return rows
+
+    monkeypatch.setattr(storage, 'load_all', load_then_append)
+    assert agendador.reconcile(now)['expirados'] == 1
+    assert {r['uid'] for r in storage.load_all('agendamento_sala_switch')} == {'futuro', 'externo', 'novo'}
+
+
+def test_overdue_unblock_runs_before_delete(agendador, fleet):
+    now = datetime.now()
+    sw = fleet.switches[0]
+    sw.admin[3] = sw.admin[4] = 2
+    storage.save_all('agendamento_sala_switch', [
+        # desbloqueio perdido (agendador parado)
+        _agendamento('perdido', '3,4', now - timedelta(hours=2), now - timedelta(hours=1)),
+        # ainda ativo e cobrindo a porta 4
+        _agendamento('ativo', '4', now - timedelta(minutes=30), now + timedelta(minutes=30)),
+    ])
+    agendador.reconcile(now)
+    assert sw.admin[3] == 1
+    assert sw.admin[4] == 2
+    assert [r['uid'] for r in storage.load_all('agendamento_sala_switch')] == ['ativo']
+
+
+def test_fired_unblock_is_not_repeated(agendador, fleet):
+    now = datetime.now()
+    sw = fleet.switches[0]
+    storage.save_all('agendamento_sala_switch', [
+        _agendamento('aula', '5', now + timedelta(seconds=1), now + timedelta(seconds=2)),
+    ])
+    agendador.reconcile(now)
+    agendador.scheduler.run('aula_start')
+    assert sw.admin[5] == 2
+    agendador.scheduler.run('aula_end')
+    assert sw.admin[5] == 1
+    # bloqueio manual depois do fim: a limpeza não o desfaz
+    sw.admin[5] = 2
+    assert agendador.reconcile(now + timedelta(hours=1))['expirados'] == 1
+    assert sw.admin[5] == 2
+    assert storage.load_all('agendamento_sala_switch') == []
+
+
+def _coalescer():
+    from app.scheduler import ActionCoalescer
+    return ActionCoalescer(FakeScheduler(), window=5)
+
+
+def test_dropped_flush_is_rescheduled(fleet):
+    from app.scheduler import FLUSH_JOB
+    coalescer = _coalescer()
+    sw = fleet.switches[0]
+    coalescer.submit('a', '1', '1', 2, datetime.now().isoformat())
+    assert coalescer.scheduler.options[FLUSH_JOB]['misfire_grace_time'] is None
+    # job descartado pelo APScheduler (misfire ou instância já em execução)
+    coalescer.scheduler.jobs.pop(FLUSH_JOB)
+    coalescer.submit('b', '1', '2', 2, datetime.now().isoformat())
+    coalescer.scheduler.run(FLUSH_JOB)
+    assert sw.admin[1] == sw.admin[2] == 2
+    assert coalescer._pending == []
+
+
+def test_action_during_flush_is_rescheduled(fleet, monkeypatch):
+    from app import scheduler
+    coalescer = _coalescer()
+    sw = fleet.switches[0]
+    execute_plan = scheduler.execute_plan
+
+    # ação que chega durante um flush lento; o job dela dispara e é pulado
+    def slow_execute(plan):
+        monkeypatch.setattr(scheduler, 'execute_plan', execute_plan)
+        coalescer.submit('b', '1', '4', 2, datetime.now().isoformat())
+        coalescer.scheduler.jobs.pop(scheduler.FLUSH_JOB)
+        return execute_plan(plan)
+
+    monkeypatch.setattr(scheduler, 'execute_plan', slow_execute)
+    coalescer.submit('a', '1', '3', 2, datetime.now().isoformat())
+    coalescer.scheduler.run(scheduler.FLUSH_JOB)
+    assert sw.admin[3] == 2
+    coalescer.scheduler.run(scheduler.FLUSH_JOB)
+    assert sw.admin[4] == 2
+    assert coalescer._pending == []
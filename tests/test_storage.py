@@ -0,0 +1,94 @@
+import os
+
+from app import storage
+
+
+def _port(sw, port, oper='1', mac=''):
+    return {'id_switch': str(sw), 'port': str(port), 'operational': oper, 'administrative': '1', 'mac': mac}
+
+
+def _reread(entity):
+    """Estado lido do disco, sem o cache do processo."""
+    storage.invalidate(entity)
+    return {(r['id_switch'], r['port']): r for r in storage.load_all(entity)}
+
+
+def test_journal_replay(data_dir):
+    storage.save_all('status_portas', [_port(1, p) for p in range(1, 5)])
+    storage.apply_changes('status_portas', [_port(1, 2, oper='2')])
+    storage.apply_changes('status_portas', [_port(1, 2, oper='1', mac='00:11:22:33:44:55'), _port(2, 1)])
+    assert os.path.exists(os.path.join(str(data_dir), 'status_portas.journal.csv'))
+
+    cached = {(r['id_switch'], r['port']): r for r in storage.load_all('status_portas')}
+    state = _reread('status_portas')
+    assert cached == state
+    assert len(state) == 5
+    assert state[('1', '2')]['mac'] == '00:11:22:33:44:55'
+    assert state[('2', '1')]['operational'] == '1'
+
+
+def test_delete_tombstones(data_dir):
+    storage.save_all('status_portas', [_port(1, p) for p in range(1, 4)])
+    storage.apply_changes('status_portas', deletes=[('1', '2')])
+    assert storage.get_by_key('status_portas', ('1', '2')) is None
+    assert set(_reread('status_portas')) == {('1', '1'), ('1', '3')}
+    # apagar e recriar na mesma sequência
+    storage.apply_changes('status_portas', deletes=[('1', '3')])
+    storage.apply_changes('status_portas', [_port(1, 3, oper='2')])
+    assert _reread('status_portas')[('1', '3')]['operational'] == '2'
+
+
+def test_patched_cache_matches_disk(data_dir):
+    storage.save_all('status_portas', [_port(1, p, mac=f'00:00:00:00:00:0{p}') for p in range(1, 6)])
+    storage.load_all('status_portas')
+    storage.apply_changes('status_portas', [_port(1, 1, mac='00:00:00:00:00:09')], deletes=[('1', '5')])
+    assert storage.find_by('status_portas', mac='00:00:00:00:00:01') == []
+    assert [r['port'] for r in storage.find_by('status_portas', mac='0:0:0:0:0:9')] == ['1']
+    assert len(storage.find_by('status_portas', id_switch='1')) == 4
+    cached = {(r['id_switch'], r['port']): r for r in storage.load_all('status_portas')}
+    assert cached == _reread('status_portas')
+
+
+def test_write_does_not_reparse(data_dir, monkeypatch):
+    storage.save_all('status_portas', [_port(1, p) for p in range(1, 50)])
+    storage.load_all('status_portas')
+    calls = []
+    read_csv = storage._read_csv
+    monkeypatch.setattr(storage, '_read_csv', lambda f: calls.append(1) or read_csv(f))
+    for i in range(10):
+        storage.apply_changes('status_portas', [_port(1, i + 1, oper='2')])
+        storage.get_by_key('status_portas', ('1', '3'))
+    assert calls == []
+
+
+def test_compaction(data_dir, monkeypatch):
+    import config
+    monkeypatch.setattr(config, 'JOURNAL_COMPACT_LINES', 5, raising=False)
+    jpath = os.path.join(str(data_dir), 'status_portas.journal.csv')
+    storage.save_all('status_portas', [_port(1, p) for p in range(1, 4)])
+    storage.compact('status_portas')
+    assert not os.path.exists(jpath)
+    for i in range(4):
+        storage.apply_changes('status_portas', [_port(1, 1, oper=str(i))])
+    assert os.path.exists(jpath)
+    storage.apply_changes('status_portas', deletes=[('1', '3')])
+    # a 5ª linha do diário dispara a compactação
+    assert not os.path.exists(jpath)
+    state = _reread('status_portas')
+    assert set(state) == {('1', '1'), ('1', '2')}
+    assert state[('1', '1')]['operational'] == '3'
+    # o diário recomeça do zero
+    storage.apply_changes('status_portas', [_port(1, 2, oper='2')])
+    assert os.path.exists(jpath)
+    assert _reread('status_portas')[('1', '2')]['operational'] == '2'
+
+
+def test_write_from_another_process_is_seen(data_dir):
+    storage.save_all('status_portas', [_port(1, 1)])
+    storage.load_all('status_portas')
+    # outro processo acrescenta ao diário: o carimbo muda e o cache é descartado
+    with open(os.path.join(str(data_dir), 'status_portas.journal.csv'), 'a', newline='', encoding='utf-8') as f:
+        f.write('U,1,,7,1,1,,,\n')
+    storage.apply_changes('status_portas', [_port(1, 8)])
+    assert set(_reread('status_portas')) == {('1', '1'), ('1', '7'), ('1', '8')}
+    assert {r['port'] for r in storage.load_all('status_portas')} == {'1', '7', '8'}
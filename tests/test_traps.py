@@ -0,0 +1,143 @@
+import pytest
+
+from app import traps
+from app.traps import (INFORM, IP_ADDRESS, LINK_DOWN, LINK_UP, OCTET_STRING, SEQUENCE, TRAP_V1,
+                       TRAP_V2, _encode, _encode_int, _encode_oid, build_link_trap, parse_message, trap_events)
+
+IF_OPER = traps.IF_OPER
+
+
+def _varbinds(pairs):
+    return _encode(SEQUENCE, b''.join(_encode(SEQUENCE, _encode_oid(oid) + value) for oid, value in pairs))
+
+
+def _message(pdu_type, pdu, community=b'public', version=0):
+    return _encode(SEQUENCE, _encode_int(version) + _encode(OCTET_STRING, community) + _encode(pdu_type, pdu))
+
+
+def v1_trap(generic, if_index=5, generic_field=None, agent=b'\x0a\x00\x00\x01'):
+    pdu = (_encode_oid('.1.3.6.1.4.1.9') + _encode(IP_ADDRESS, agent)
+           + (generic_field if generic_field is not None else _encode_int(generic))
+           + _encode_int(0) + _encode_int(1234, traps.TIMETICKS)
+           + _varbinds([(f"{traps.IF_INDEX}.{if_index}", _encode_int(if_index))]))
+    return _message(TRAP_V1, pdu)
+
+
+def test_v2c_link_down():
+    msg = parse_message(build_link_trap(7, up=False, community='c1'))
+    assert msg.pdu_type == TRAP_V2
+    assert msg.community == 'c1'
+    assert msg.trap_oid == LINK_DOWN
+    events = trap_events(msg, '3')
+    assert [(e.kind, e.port, e.new) for e in events] == [('port_oper', 7, '2'), ('port_admin', 7, '1')]
+
+
+def test_inform_link_up_and_response():
+    data = build_link_trap(4, up=True, inform=True, request_id=99, agent_addr='10.1.2.3')
+    msg = parse_message(data)
+    assert msg.pdu_type == INFORM
+    assert msg.trap_oid == LINK_UP
+    assert msg.request_id == 99
+    assert msg.agent_addr == '10.1.2.3'
+    reply = traps._children(traps._tlv(traps.inform_response(msg), 0)[1])
+    assert reply[2][0] == traps.GET_RESPONSE
+
+
+@pytest.mark.parametrize("generic,oid", [(2, LINK_DOWN), (3, LINK_UP)])
+def test_v1_generic_traps(generic, oid):
+    msg = parse_message(v1_trap(generic))
+    assert msg.pdu_type == TRAP_V1
+    assert msg.trap_oid == oid
+    assert msg.agent_addr == '10.0.0.1'
+    assert [e.port for e in trap_events(msg, '1')] == [5]
+
+
+def test_v1_enterprise_specific():
+    msg = parse_message(v1_trap(6))
+    assert msg.trap_oid == '.1.3.6.1.4.1.9.0.0'
+
+
+def test_ifindex_translated_by_discovery():
+    from app.discovery import SwitchDiscovery
+    disc = SwitchDiscovery('10.0.0.1', base_port_ifindex={1: 10101, 2: 10102})
+    assert [e.port for e in trap_events(parse_message(build_link_trap(10102, up=True)), '1', disc)] == [2, 2]
+    # interface fora da bridge (VLAN)
+    assert trap_events(parse_message(build_link_trap(1, up=True)), '1', disc) == []
+
+
+@pytest.mark.parametrize("cut", [1, 2, 5, 10, 20, 40])
+def test_truncated_packets(cut):
+    data = build_link_trap(7, up=False)
+    with pytest.raises(ValueError):
+        parse_message(data[:-cut])
+
+
+def test_generic_trap_as_octet_string():
+    with pytest.raises(ValueError):
+        parse_message(v1_trap(2, generic_field=_encode(OCTET_STRING, b'\x02')))
+
+
+def test_wrong_types_in_header():
+    pdu = _encode_int(1) + _encode_int(0) + _encode_int(0) + _varbinds([])
+    with pytest.raises(ValueError):
+        parse_message(_encode(SEQUENCE, _encode(OCTET_STRING, b'1') + _encode(OCTET_STRING, b'p') + _encode(TRAP_V2, pdu)))
+    with pytest.raises(ValueError):
+        parse_message(_encode(SEQUENCE, _encode_int(1) + _encode_int(5) + _encode(TRAP_V2, pdu)))
+    bad_id = _encode(OCTET_STRING, b'x') + _encode_int(0) + _encode_int(0) + _varbinds([])
+    with pytest.raises(ValueError):
+        parse_message(_message(TRAP_V2, bad_id))
+    with pytest.raises(ValueError):
+        parse_message(_message(0xA0, pdu))
+
+
+def test_trap_oid_with_wrong_type():
+    pdu = _encode_int(1) + _encode_int(0) + _encode_int(0) + _varbinds([(traps.SNMP_TRAP_OID, _encode_int(3))])
+    with pytest.raises(ValueError):
+        parse_message(_message(TRAP_V2, pdu, version=1))
+
+
+def test_non_integer_ifindex_is_ignored():
+    pdu = _encode_int(1) + _encode_int(0) + _encode_int(0) + _varbinds([
+        (traps.SNMP_TRAP_OID, _encode_oid(LINK_DOWN)),
+        (f"{traps.IF_INDEX}.7", _encode(OCTET_STRING, b'sete')),
+        (f"{IF_OPER}.7", _encode(OCTET_STRING, b'x')),
+    ])
+    msg = parse_message(_message(TRAP_V2, pdu, version=1))
+    assert trap_events(msg, '1') == []
+
+
+def test_receiver_survives_malformed_packets(data_dir):
+    from app import storage
+    storage.save_all('switches', [{'id_switch': '1', 'ip': '10.0.0.1', 'community': 'public'}])
+    receiver = traps.TrapReceiver(community='')
+    bad_ifindex = _message(TRAP_V2, _encode_int(1) + _encode_int(0) + _encode_int(0) + _varbinds([
+        (traps.SNMP_TRAP_OID, _encode_oid(LINK_UP)),
+        (f"{traps.IF_INDEX}.7", _encode(OCTET_STRING, b'7')),
+    ]), version=1)
+    for data in (b'', b'\x30\x03\x02\x01', v1_trap(2, generic_field=_encode(OCTET_STRING, b'\x02')), bad_ifindex):
+        assert receiver.handle(data, ('10.0.0.1', 162)) == []
+
+
+def test_receiver_sees_discovery_stored_by_poller(data_dir):
+    from app.discovery import DiscoveryCache, SwitchDiscovery
+    receiver_cache = DiscoveryCache()
+    # receptor iniciado antes da primeira descoberta
+    assert receiver_cache.lookup('10.0.0.1') is None
+    DiscoveryCache().store(SwitchDiscovery('10.0.0.1', base_port_ifindex={1: 10101, 2: 10102}))
+    msg = parse_message(build_link_trap(10101, up=False))
+    assert {e.port for e in trap_events(msg, '1', receiver_cache.lookup('10.0.0.1'))} == {1}
+    # interfaces renumeradas após um reboot do switch
+    DiscoveryCache().store(SwitchDiscovery('10.0.0.1', base_port_ifindex={1: 101}))
+    assert receiver_cache.lookup('10.0.0.1').port_for_ifindex(101) == 1
+    assert receiver_cache.lookup('10.0.0.1').port_for_ifindex(10101) is None
+
+
+def test_discovery_invalidate_rereads_disk(data_dir):
+    from app.discovery import DiscoveryCache, SwitchDiscovery
+    cache = DiscoveryCache()
+    cache.store(SwitchDiscovery('10.0.0.1', boot_time=1000.0))
+    # reboot observado: a entrada sai da memória, mas continua no disco
+    assert cache.lookup('10.0.0.1', boot=5000.0) is None
+    assert cache.lookup('10.0.0.1') is None
+    cache.invalidate('10.0.0.1')
+    assert cache.lookup('10.0.0.1').boot_time == 1000.0